@@ -326,16 +326,25 @@ def apply_reference_corrections(df: pd.DataFrame) -> pd.DataFrame:
     Aplica correcciones basadas en datos de referencia conocidos.
     """
     corrected_df = df.copy()
+    if 'OPERACION_1' not in corrected_df.columns:
+        return corrected_df
     
-    for idx, row in corrected_df.iterrows():
-        operacion = str(row.get('OPERACION_1', '')).strip()
+    # Una máscara por operación conocida en vez de recorrer fila a fila, y sólo
+    # para las operaciones de referencia que aparecen (cada una una vez)
+    operaciones = corrected_df['OPERACION_1'].astype(str).str.strip()
+    presentes = operaciones[operaciones.isin(REFERENCE_DATA.keys())].unique()
+    for operacion in presentes:
+        ref_data = REFERENCE_DATA[operacion]
+        mask = operaciones == operacion
+        logging.info(f"📋 Aplicando correcciones de referencia para operación {operacion} ({int(mask.sum())} filas)")
         
-        if operacion in REFERENCE_DATA:
-            ref_data = REFERENCE_DATA[operacion]
-            logging.info(f"📋 Aplicando correcciones de referencia para operación {operacion}")
-            
-            for field, value in ref_data.items():
-                if field in corrected_df.columns:
-                    corrected_df.at[idx, field] = value # type: ignore
+        for field, value in ref_data.items():
+            if field in corrected_df.columns:
+                corrected_df.loc[mask, field] = value
     
-    return corrected_df
\ No newline at end of file
+    return corrected_df
+
+def count_missing(df, fields):
+    """Cuenta, por columna, las celdas vacías (o sólo espacios) del DataFrame."""
+    return {k: int(df[k].astype(str).str.strip().eq("").sum()) if k in df.columns else len(df)
+            for k in fields}
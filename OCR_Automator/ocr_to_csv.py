@@ -875,7 +875,7 @@ class OCRToCSV:
         return output_file
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description="OCR to CSV - Genera CSV para process_itau_auto_v2.py")
     parser.add_argument("--client", required=True, help="Nombre del cliente (ej: Itau, Santander)")
     parser.add_argument("--pdfs-dir", type=Path, help="Directorio con archivos PDF")
@@ -884,7 +884,7 @@ def main():
     parser.add_argument("-v", "--verbose", action="store_true", help="Modo verboso")
     parser.add_argument("--debug", action="store_true", help="Habilitar sistema de debug detallado")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
@@ -36,6 +36,7 @@ try:
         fix_comuna_ocr,
         apply_reference_corrections,
         validate_rut_dv,
+        count_missing,
     )
     GEO_UTILS_AVAILABLE = True
 except Exception:
@@ -44,6 +45,7 @@ except Exception:
     def fix_comuna_ocr(comuna): return comuna
     def apply_reference_corrections(df): return df
     def validate_rut_dv(rut: str, dv: str) -> Tuple[str, str, bool]: return rut, dv, True
+    def count_missing(df, fields): return {}
 
 # ---------------- CONFIG ----------------
 TESSERACT_EXE = r"C:\Users\cdiaz\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
@@ -288,11 +290,7 @@ def process_pdf_files(pdf_paths: List[str], geocode: bool = False, output_dir: s
             df = apply_reference_corrections(df)
 
         # Breve verificador
-        miss = {k: 0 for k in ["RUT","DV","NOMBRE","MONTO_CREDITO_1"]}
-        for _, r in df.iterrows():
-            for k in miss:
-                if not str(r.get(k, "")).strip():
-                    miss[k] += 1
+        miss = count_missing(df, ["RUT","DV","NOMBRE","MONTO_CREDITO_1"])
         write_debug("\n==== VERIFICADOR DE CAMPOS (Indisa) ====")
         for k, v in miss.items():
             write_debug(f"Faltantes {k}: {v}")
@@ -30,16 +30,19 @@ Requisitos opcionales:
 from __future__ import annotations
 
 import argparse
+import codecs
 import csv
 import datetime as dt
 import io
 import logging
+import mmap
 import os
 import re
 import sys
 import unicodedata
-from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Tuple
 
 # Dependencias opcionales
 try:
@@ -52,13 +55,6 @@ try:
 except Exception:
     chardet = None
 
-try:
-    import openpyxl  # type: ignore
-    from openpyxl.styles import Font, PatternFill, Alignment  # type: ignore
-    from openpyxl.utils import get_column_letter  # type: ignore
-except Exception:
-    openpyxl = None
-
 # Constantes separadas
 try:
     from constants import (
@@ -97,23 +93,45 @@ except ImportError:
         COMMON_FIXES = {}
         VALID_COMUNAS = set()
 
-APODERADO_PATTERNS = [re.compile(pat, re.I) for pat in APODERADO_PATTERN_STRS]
+# Todos los patrones de apoderado en una sola alternación (una búsqueda por valor).
+# Cada patrón aporta un único grupo de captura; m.lastindex indica cuál coincidió.
+APODERADO_ANY_RE = (
+    re.compile("|".join(f"(?:{pat})" for pat in APODERADO_PATTERN_STRS), re.I)
+    if APODERADO_PATTERN_STRS else None
+)
 
-# Importaciones de geolocalización y limpieza
-try:
-    from geocoding_utils import (
-        enhance_dataframe_with_geolocation, 
-        cleanup_temp_files,
-        apply_reference_corrections,
-        validate_rut_dv,
-        clean_and_fix_address,
-        fix_comuna_ocr
-    )
-    GEOCODING_AVAILABLE = True
-    print("✅ Módulo de geolocalización cargado")
-except ImportError:
-    GEOCODING_AVAILABLE = False
-    logging.warning("⚠️ Módulo de geolocalización no disponible")
+# Caracteres que clean_text_value elimina en una sola pasada (str.translate)
+_STRIP_CHARS_TABLE = str.maketrans("", "", "\u200b\"\u201c\u201d")
+_WHITESPACE_RE = re.compile(r"\s+")
+_COMMA_TO_DOT = str.maketrans(",", ".")
+_NON_DIGIT_RE = re.compile(r"\D")
+
+# Importaciones de geolocalización y limpieza.
+# Se cargan bajo demanda (geocoding_utils arrastra pandas/requests), así
+# '--help' o un error de argumentos no pagan ese costo de importación.
+GEOCODING_AVAILABLE: Optional[bool] = None
+
+
+def load_geocoding() -> bool:
+    """
+    Importa geocoding_utils la primera vez que se necesita.
+    Retorna True si el módulo está disponible.
+    """
+    global GEOCODING_AVAILABLE
+    global enhance_dataframe_with_geolocation, cleanup_temp_files, apply_reference_corrections
+    if GEOCODING_AVAILABLE is None:
+        try:
+            from geocoding_utils import (
+                enhance_dataframe_with_geolocation,
+                cleanup_temp_files,
+                apply_reference_corrections,
+            )
+            GEOCODING_AVAILABLE = True
+            print("✅ Módulo de geolocalización cargado")
+        except ImportError:
+            GEOCODING_AVAILABLE = False
+            logging.warning("⚠️ Módulo de geolocalización no disponible")
+    return GEOCODING_AVAILABLE
 
 
 # ========================= Utilidades de texto/encoding =========================
@@ -144,16 +162,15 @@ def clean_text_value(s: Optional[str]) -> str:
     """
     if s is None:
         return ""
-    s = fix_text(s)
-    s = s.replace("\u200b", "")
-    s = s.replace('"', "").replace("“", "").replace("”", "")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = fix_text(s).translate(_STRIP_CHARS_TABLE)
+    return _WHITESPACE_RE.sub(" ", s).strip()
 
 
+@lru_cache(maxsize=256)
 def normalize_header(h: str) -> str:
     """
     Normaliza un encabezado de columna a su forma canónica usando HEADER_ALIASES.
+    Cacheada: el universo de encabezados es pequeño y se repite en cada fila.
     """
     h = fix_text((h or "").strip())
     return HEADER_ALIASES.get(h, h)
@@ -189,8 +206,7 @@ def normalize_int_digits(s: str) -> str:
     """
     if not s:
         return ""
-    s = clean_text_value(s)
-    return re.sub(r"[^\d]", "", s.replace(".", "").replace(" ", "").split(",")[0])
+    return _NON_DIGIT_RE.sub("", s.split(",", 1)[0])
 
 
 def format_int(value: str, thousand_sep: str) -> str:
@@ -202,10 +218,8 @@ def format_int(value: str, thousand_sep: str) -> str:
         return value
     if thousand_sep == "none":
         return value
-    sep = "." if thousand_sep == "dot" else ","
-    rev = value[::-1]
-    groups = [rev[i:i + 3] for i in range(0, len(rev), 3)]
-    return sep.join(groups)[::-1]
+    out = f"{int(value):,}"
+    return out.translate(_COMMA_TO_DOT) if thousand_sep == "dot" else out
 
 
 def parse_date_multi(s: str) -> Optional[dt.date]:
@@ -242,7 +256,15 @@ def clean_apoderado(value: str, which: int) -> str:
     Canoniza el nombre del apoderado (1 o 2) basándose en patrones frecuentes.
     Si está vacío, asigna el canónico por defecto.
     """
-    v = clean_text_value(value or "")
+    return _resolve_apoderado(clean_text_value(value or ""), which)
+
+
+@lru_cache(maxsize=4096)
+def _resolve_apoderado(v: str, which: int) -> str:
+    """
+    Resolución cacheada de clean_apoderado sobre el valor ya limpio
+    (los nombres de apoderados se repiten mucho entre filas).
+    """
     if not v:
         # Devolver un valor por defecto basado en which
         default_names = {1: "Apoderado Principal", 2: "Apoderado Suplente"}
@@ -256,10 +278,10 @@ def clean_apoderado(value: str, which: int) -> str:
         return APODERADO_2[rut_clean]
     
     # Buscar por patrones
-    for pat in APODERADO_PATTERNS:
-        match = pat.search(v)
-        if match:
-            return match.group(1).strip()
+    if APODERADO_ANY_RE is not None:
+        match = APODERADO_ANY_RE.search(v)
+        if match and match.lastindex:
+            return match.group(match.lastindex).strip()
     
     # Buscar nombres específicos
     if which == 1 and re.search(r"\byasna\b", v, re.I):
@@ -305,30 +327,60 @@ def normalize_rut_and_dv(rut: str, dv: str) -> Tuple[str, str, str, bool]:
 
 # ========================= Debug: parseo y merge =========================
 
+# Bloque completo en una sola pasada; el último bloque puede venir sin cierre
+_DEBUG_BLOCK_RE = re.compile(
+    r"---- FINAL ROW ----(.*?)(?:---- END FINAL ROW ----|(?=---- FINAL ROW ----)|\Z)",
+    re.DOTALL,
+)
+_DEBUG_BLOCK_RE_BYTES = re.compile(
+    rb"---- FINAL ROW ----(.*?)(?:---- END FINAL ROW ----|(?=---- FINAL ROW ----)|\Z)",
+    re.DOTALL,
+)
+_DEBUG_KV_RE = re.compile(r"^[ \t]*([^:\n]+):[ \t]*(.*)$", re.MULTILINE)
+_DEBUG_KEY_MAP = {"OPERACIÓN": "OPERACION", "OPERACION": "OPERACION", "FECHA_VENCIMIENTO_1°_CUOTA": "FECHA_VENCIMIENTO_1_CUOTA"}
+
+
 def parse_debug_final_rows(debug_text: str) -> Dict[str, Dict[str, str]]:
     """
     Parsea bloques '---- FINAL ROW ---- ... ---- END FINAL ROW ----' y construye un mapeo.
     Clave: OPERACION si existe; si no, RUT-DV-NOMBRE.
     Devuelve un dict: key -> {campo: valor normalizado}.
     """
+    return _build_debug_mapping(m.group(1) for m in _DEBUG_BLOCK_RE.finditer(debug_text))
+
+
+def parse_debug_file(debug_path: str, encoding: str) -> Dict[str, Dict[str, str]]:
+    """
+    Igual que parse_debug_final_rows pero leyendo el archivo vía mmap:
+    el regex recorre los bytes mapeados y solo se decodifica cada bloque encontrado.
+    Si el encoding no es compatible con ASCII (p.ej. UTF-16) se lee como texto.
+    """
+    if "---- FINAL ROW ----".encode(encoding, errors="ignore") != b"---- FINAL ROW ----":
+        with io.open(debug_path, "r", encoding=encoding, errors="ignore") as f:
+            return parse_debug_final_rows(f.read())
+    if os.path.getsize(debug_path) == 0:
+        return {}
+    with open(debug_path, "rb") as fb:
+        with mmap.mmap(fb.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _build_debug_mapping(
+                m.group(1).decode(encoding, errors="ignore") for m in _DEBUG_BLOCK_RE_BYTES.finditer(mm)
+            )
+
+
+def _build_debug_mapping(parts: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Construye el mapeo key -> fila a partir del contenido de cada bloque FINAL ROW.
+    """
     mapping: Dict[str, Dict[str, str]] = {}
-    blocks = debug_text.split("---- FINAL ROW ----")
-    if len(blocks) <= 1:
-        return mapping
-    for block in blocks[1:]:
-        part = block.split("---- END FINAL ROW ----")[0]
+    for part in parts:
         if not part:
             continue
         d: Dict[str, str] = {}
-        for line in part.strip().splitlines():
-            m = re.match(r"\s*([^:]+):\s*(.*)\s*$", line)
-            if not m:
-                continue
+        for m in _DEBUG_KV_RE.finditer(part):
             k = fix_text(m.group(1)).strip().upper()
             v = clean_text_value(m.group(2))
             d[k] = v
-        key_map = {"OPERACIÓN": "OPERACION", "OPERACION": "OPERACION", "FECHA_VENCIMIENTO_1°_CUOTA": "FECHA_VENCIMIENTO_1_CUOTA"}
-        norm = {key_map.get(k, k): v for k, v in d.items()}
+        norm = {_DEBUG_KEY_MAP.get(k, k): v for k, v in d.items()}
         op = norm.get("OPERACION", "").strip()
         if op:
             mapping[op] = norm
@@ -339,7 +391,7 @@ def parse_debug_final_rows(debug_text: str) -> Dict[str, Dict[str, str]]:
     return mapping
 
 
-def merge_from_debug(row: dict, debug_map: dict, mode: str, stats_fill: Dict[str, int], stats: dict) -> dict:
+def merge_from_debug(row: dict, debug_map: dict, mode: str, stats_fill: DefaultDict[str, int], stats: DefaultDict[str, Any]) -> dict:
     """
     Integra datos del debug en la fila según el modo:
       - 'none': no hace merge.
@@ -358,9 +410,9 @@ def merge_from_debug(row: dict, debug_map: dict, mode: str, stats_fill: Dict[str
         if cand:
             break
     if not cand:
-        stats["debug_merge_misses"] = stats.get("debug_merge_misses", 0) + 1
+        stats["debug_merge_misses"] += 1
         return row
-    stats["debug_merge_hits"] = stats.get("debug_merge_hits", 0) + 1
+    stats["debug_merge_hits"] += 1
     pairs = [
         ("NOMBRE", "NOMBRE"), ("DIRECCION", "DIRECCION"), ("COMUNA", "COMUNA"),
         ("FECHA_SUSCRIPCION", "FECHA_SUSCRIPCION"), ("MONTO_CREDITO", "MONTO_CREDITO"),
@@ -375,17 +427,17 @@ def merge_from_debug(row: dict, debug_map: dict, mode: str, stats_fill: Dict[str
         if mode == "only_blanks":
             if not v_csv and v_dbg:
                 row[f_csv] = v_dbg
-                stats_fill[f_csv] = stats_fill.get(f_csv, 0) + 1
+                stats_fill[f_csv] += 1
         elif mode == "prefer_debug":
             if v_dbg and v_dbg != v_csv:
                 row[f_csv] = v_dbg
-                stats_fill[f_csv] = stats_fill.get(f_csv, 0) + 1
+                stats_fill[f_csv] += 1
     return row
 
 
 # ========================= Proceso de filas =========================
 
-def clean_and_normalize_row(row: dict, date_format: str, thousand_sep: str, strict_dv: bool, stats: dict) -> dict:
+def clean_and_normalize_row(row: dict, date_format: str, thousand_sep: str, strict_dv: bool, stats: DefaultDict[str, Any]) -> dict:
     """
     Aplica todas las normalizaciones a una fila y actualiza estadísticas.
     """
@@ -398,27 +450,27 @@ def clean_and_normalize_row(row: dict, date_format: str, thousand_sep: str, stri
         before = row[k]
         row[k] = clean_text_value(row[k])
         if before != row[k]:
-            stats["fixed_encoding"] = stats.get("fixed_encoding", 0) + 1
+            stats["fixed_encoding"] += 1
 
     # Fixes comunes
     for k in ["NOMBRE", "DIRECCION", "COMUNA"]:
         before = row.get(k, "")
         after = apply_common_fixes(before)
         if after != before:
-            stats["fixed_common"] = stats.get("fixed_common", 0) + 1
+            stats["fixed_common"] += 1
             row[k] = after
 
     # Apoderados
     a1_before = row.get("NOMBRE_APODERADO", "")
     a1_after = clean_apoderado(a1_before, which=1)
     if a1_after != a1_before:
-        stats["apoderado1_fixed"] = stats.get("apoderado1_fixed", 0) + 1
+        stats["apoderado1_fixed"] += 1
         row["NOMBRE_APODERADO"] = a1_after
 
     a2_before = row.get("NOMBRE_APODERADO_2", "")
     a2_after = clean_apoderado(a2_before, which=2)
     if a2_after != a2_before:
-        stats["apoderado2_fixed"] = stats.get("apoderado2_fixed", 0) + 1
+        stats["apoderado2_fixed"] += 1
         row["NOMBRE_APODERADO_2"] = a2_after
 
     # Fechas
@@ -427,14 +479,14 @@ def clean_and_normalize_row(row: dict, date_format: str, thousand_sep: str, stri
         d = parse_date_multi(raw_date)
         if d:
             row[k] = format_date(d, date_format)
-            stats["normalized_dates"] = stats.get("normalized_dates", 0) + 1
+            stats["normalized_dates"] += 1
 
     # Tasa
     if row.get("TASA"):
         before = row["TASA"]
         row["TASA"] = normalize_percent(before)
         if row["TASA"] != before:
-            stats["normalized_percent"] = stats.get("normalized_percent", 0) + 1
+            stats["normalized_percent"] += 1
 
     # Montos/enteros
     for k in INT_FIELDS:
@@ -443,17 +495,17 @@ def clean_and_normalize_row(row: dict, date_format: str, thousand_sep: str, stri
         formatted = format_int(digits, thousand_sep)
         row[k] = formatted
         if row[k] != before:
-            stats["normalized_ints"] = stats.get("normalized_ints", 0) + 1
+            stats["normalized_ints"] += 1
 
     # RUT/DV
     rut_before, dv_before = row.get("RUT", ""), row.get("DV", "")
     rut_num, dv_clean, dv_calc, ok = normalize_rut_and_dv(rut_before, dv_before)
     if rut_num != rut_before or dv_clean != dv_before:
-        stats["normalized_rut"] = stats.get("normalized_rut", 0) + 1
+        stats["normalized_rut"] += 1
     row["RUT"] = rut_num
     row["DV"] = dv_clean
     if rut_num and dv_clean and not ok:
-        stats["rut_invalid"] = stats.get("rut_invalid", 0) + 1
+        stats["rut_invalid"] += 1
         if strict_dv and dv_calc:
             row["DV"] = dv_calc
 
@@ -461,7 +513,7 @@ def clean_and_normalize_row(row: dict, date_format: str, thousand_sep: str, stri
     if VALID_COMUNAS:
         comuna = row.get("COMUNA", "")
         if comuna and comuna not in VALID_COMUNAS:
-            stats["invalid_comunas"] = stats.get("invalid_comunas", 0) + 1
+            stats["invalid_comunas"] += 1
 
     return row
 
@@ -476,16 +528,28 @@ def row_is_incomplete(row: dict, required_fields: Iterable[str]) -> Tuple[bool,
 
 # ========================= Detecciones (encoding/delimiter) =========================
 
-def detect_encoding(path: Path, fallback: str = "utf-8") -> str:
+def detect_encoding(path: str, fallback: str = "utf-8") -> str:
     """
     Detecta encoding usando chardet si está disponible.
+    Si la muestra ya decodifica como UTF-8 (caso habitual) se evita chardet.
     Devuelve fallback si no se puede detectar.
     """
-    if not chardet:
-        return fallback
     try:
         with open(path, "rb") as fb:
             raw = fb.read(128 * 1024)
+    except Exception:
+        return fallback
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False tolera una secuencia multibyte cortada al final de la muestra
+        codecs.getincrementaldecoder("utf-8")().decode(raw, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if not chardet:
+        return fallback
+    try:
         res = chardet.detect(raw)
         enc = res.get("encoding") or fallback
         return enc
@@ -493,7 +557,7 @@ def detect_encoding(path: Path, fallback: str = "utf-8") -> str:
         return fallback
 
 
-def sniff_delimiter(path: Path, encoding: str) -> str:
+def sniff_delimiter(path: str, encoding: str) -> str:
     """
     Autodetecta el delimitador usando csv.Sniffer.
     Retorna ';' por defecto si no se detecta.
@@ -511,7 +575,11 @@ def write_to_excel(data_rows: List[Dict[str, str]], output_path: str) -> None:
     """
     Escribe los datos procesados a un archivo Excel con formato.
     """
-    if not openpyxl:
+    try:
+        import openpyxl  # type: ignore
+        from openpyxl.styles import Font, PatternFill, Alignment  # type: ignore
+        from openpyxl.utils import get_column_letter  # type: ignore
+    except Exception:
         raise ImportError("openpyxl no está disponible. Instala con: pip install openpyxl")
     
     # Crear workbook y worksheet
@@ -580,6 +648,10 @@ def write_to_excel(data_rows: List[Dict[str, str]], output_path: str) -> None:
 
 # ========================= Núcleo: proceso completo =========================
 
+# Extensiones que se escriben como Excel (comparar contra splitext(...)[1].lower())
+_EXCEL_EXTS = (".xlsx", ".xls")
+
+
 def process(
     input_csv: str,
     output_csv: str,
@@ -592,43 +664,43 @@ def process(
     delimiter: str = ";",
     required_fields: Optional[List[str]] = None,
     reject_incomplete: bool = False,
-) -> None:
+) -> bool:
     """
     Procesa el CSV de entrada y escribe el CSV limpio:
     - Autodetecta delimitador si se pasa 'auto'.
     - Lee y escribe en streaming.
     - Integra datos del debug según modo.
     - Genera reporte Markdown si se solicitó.
+    Retorna True si la salida se escribió como Excel (según su extensión).
     """
     required_fields = required_fields or []
 
-    stats = {
+    stats: DefaultDict[str, Any] = defaultdict(int)
+    stats.update({
         "rows": 0, "fixed_headers": 0, "fixed_encoding": 0, "fixed_common": 0,
         "normalized_dates": 0, "normalized_ints": 0, "normalized_percent": 0,
         "normalized_rut": 0, "rut_invalid": 0, "apoderado1_fixed": 0, "apoderado2_fixed": 0,
         "rut_invalid_examples": [], "debug_merge_hits": 0, "debug_merge_misses": 0,
         "rows_rejected": 0, "neg_amounts_detected": 0, "invalid_comunas": 0,
-    }
-    stats_fill: Dict[str, int] = {}
+    })
+    stats_fill: DefaultDict[str, int] = defaultdict(int)
 
     # Carga debug si existe
     debug_map = {}
     if debug_path and os.path.exists(debug_path):
         try:
-            enc_dbg = detect_encoding(Path(debug_path))
-            with io.open(debug_path, "r", encoding=enc_dbg, errors="ignore") as f:
-                debug_map = parse_debug_final_rows(f.read())
+            enc_dbg = detect_encoding(debug_path)
+            debug_map = parse_debug_file(debug_path, enc_dbg)
             logging.info("Debug FINAL ROWs cargados: %d", len(debug_map))
         except Exception as e:
             logging.error("No se pudo abrir el debug %s: %s", debug_path, e)
 
     # Detección de encoding y delimitador
-    input_path = Path(input_csv)
-    enc_in = detect_encoding(input_path)
-    delim = sniff_delimiter(input_path, enc_in) if delimiter == "auto" else delimiter
+    enc_in = detect_encoding(input_csv)
+    delim = sniff_delimiter(input_csv, enc_in) if delimiter == "auto" else delimiter
 
     # Determinar formato de salida
-    is_excel_output = output_csv.lower().endswith(('.xlsx', '.xls'))
+    is_excel_output = os.path.splitext(output_csv)[1].lower() in _EXCEL_EXTS
     
     # Abre entrada
     try:
@@ -674,7 +746,7 @@ def process(
 
     # ========================= GEOLOCALIZACIÓN Y CORRECCIONES =========================
     # Aplicar geolocalización y correcciones de referencia si está disponible
-    if GEOCODING_AVAILABLE and processed_rows:
+    if processed_rows and load_geocoding():
         try:
             import pandas as pd
             logging.info("🌍 Aplicando geolocalización y correcciones...")
@@ -684,17 +756,25 @@ def process(
             
             # 1. Aplicar correcciones de referencia basadas en datos conocidos
             df_corrected = apply_reference_corrections(df_temp)
-            corrected_count = sum(1 for i in range(len(df_temp)) 
-                                if df_temp.iloc[i].to_dict() != df_corrected.iloc[i].to_dict())
+            corrected_count = int(df_temp.ne(df_corrected).any(axis=1).sum())
             if corrected_count > 0:
                 logging.info(f"📋 Aplicadas {corrected_count} correcciones de referencia")
             
-            # 2. Aplicar geolocalización para mejorar direcciones/comunas
-            df_enhanced = enhance_dataframe_with_geolocation(
-                df_corrected, 
-                address_col='DIRECCION', 
+            # 2. Aplicar geolocalización para mejorar direcciones/comunas.
+            #    Se geocodifica una sola vez cada par (DIRECCION, COMUNA) distinto
+            #    y el resultado se vuelve a unir a todas las filas.
+            geo_keys = ['DIRECCION', 'COMUNA']
+            uniq = df_corrected[geo_keys].drop_duplicates()
+            uniq_enh = enhance_dataframe_with_geolocation(
+                uniq,
+                address_col='DIRECCION',
                 comuna_col='COMUNA'
             )
+            lookup = pd.concat([uniq, uniq_enh[geo_keys].add_suffix('_GEO')], axis=1)
+            df_enhanced = df_corrected.merge(lookup, on=geo_keys, how='left')
+            df_enhanced[geo_keys] = df_enhanced[['DIRECCION_GEO', 'COMUNA_GEO']].to_numpy()
+            df_enhanced = df_enhanced.drop(columns=['DIRECCION_GEO', 'COMUNA_GEO'])
+            logging.info(f"🌍 Geocodificados {len(uniq)} pares únicos para {len(df_corrected)} filas")
             
             # Actualizar las filas procesadas con la información mejorada
             processed_rows = df_enhanced.to_dict('records')
@@ -769,7 +849,7 @@ def process(
 
     # ========================= LIMPIEZA AUTOMÁTICA =========================
     # Limpiar archivos temporales después del procesamiento
-    if GEOCODING_AVAILABLE:
+    if load_geocoding():
         try:
             current_dir = os.path.dirname(output_csv) if output_csv else os.getcwd()
             cleanup_patterns = [
@@ -790,24 +870,77 @@ def process(
         except Exception as e:
             logging.warning(f"⚠️ Error en limpieza automática: {e}")
 
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Cache normalize_header: %s", normalize_header.cache_info())
+        logging.debug("Cache apoderados: %s", _resolve_apoderado.cache_info())
     logging.info("OK -> Salida: %s | Reporte: %s", output_csv, report_path or "(none)")
+    return is_excel_output
 
 
 # ========================= Autodetección de archivos cuando faltan args =========================
 
+DEFAULT_DEBUG_NAME = "Itau_auto_debug.txt"
+_PREFERRED_CSV = "itau_results_all.csv"  # comparado en minúsculas
+
+_NO_CSV_MSG = """\
+⚠️  No se encontró ningún CSV en la carpeta actual.
+💡 Opciones:
+   1. Arrastra tu archivo CSV a esta carpeta
+   2. Usa: python process_itau_auto_v2.py --input ruta/a/tu/archivo.csv
+   3. Ejecuta primero el OCR con: python ocr_to_csv.py
+"""
+
+
 def find_candidate_csvs(base_dir: str) -> List[str]:
     """
     Busca CSVs en la carpeta, priorizando 'Itau_results_ALL.csv'.
     """
-    names = []
-    for fn in os.listdir(base_dir):
-        if fn.lower().endswith(".csv"):
-            names.append(os.path.join(base_dir, fn))
-    preferred = [p for p in names if os.path.basename(p).lower() == "itau_results_all.csv"]
+    entries = _probe_base_dir(base_dir)[0]
+    preferred = [e for e in entries if e.name.lower() == _PREFERRED_CSV]
     if preferred:
-        return preferred + [p for p in names if p not in preferred]
-    names.sort(key=lambda p: os.path.getmtime(p), reverse=True)
-    return names
+        ordered = preferred + [e for e in entries if e not in preferred]
+    else:
+        ordered = sorted(entries, key=lambda e: e.stat().st_mtime, reverse=True)
+    return [os.path.join(base_dir, e.name) for e in ordered]
+
+
+def find_first_candidate_csv(base_dir: str) -> Optional[str]:
+    """
+    Igual que find_candidate_csvs(base_dir)[0] pero sin ordenar la lista:
+    corta en 'Itau_results_ALL.csv' o toma el más reciente de una pasada.
+    """
+    entries = _probe_base_dir(base_dir)[0]
+    if not entries:
+        return None
+    for e in entries:
+        if e.name.lower() == _PREFERRED_CSV:
+            return os.path.join(base_dir, e.name)
+    newest = max(entries, key=lambda e: e.stat().st_mtime)
+    return os.path.join(base_dir, newest.name)
+
+
+@lru_cache(maxsize=4)
+def _probe_base_dir(base_dir: str) -> Tuple[Tuple[os.DirEntry, ...], bool]:
+    """
+    Un solo os.scandir de la carpeta para resolver los defaults:
+    - Entradas *.csv en orden de listado (el orden lo deciden los llamadores).
+    - Si existe Itau_auto_debug.txt.
+    Las DirEntry traen el nombre y (en Windows) el stat en caché.
+    """
+    entries = []
+    has_debug = False
+    debug_name = os.path.normcase(DEFAULT_DEBUG_NAME)
+    with os.scandir(base_dir) as it:
+        for e in it:
+            name = e.name
+            if name.startswith("."):
+                continue  # ocultos / '._x.csv' de macOS
+            if name.lower().endswith(".csv"):
+                if e.is_file():  # d_type del listado: sin stat extra
+                    entries.append(e)
+            elif os.path.normcase(name) == debug_name:
+                has_debug = True
+    return tuple(entries), has_debug
 
 
 def infer_defaults(args) -> bool:
@@ -815,20 +948,21 @@ def infer_defaults(args) -> bool:
     Rellena --input/--output/--debug/--report cuando no se pasan por CLI.
     Retorna True si todo está bien, False si hay algún problema.
     """
-    base_dir = os.getcwd()
+    # La carpeta actual solo importa para autodetectar input/debug
+    base_dir = os.getcwd() if not (args.input and args.debug) else ""
+    has_debug = None  # se conoce sin stat extra si ya se listó la carpeta
+    msgs: List[str] = []  # líneas [auto] ...; se escriben de una vez al final
     # INPUT
     if not args.input:
-        cands = find_candidate_csvs(base_dir)
-        if not cands:
-            print("⚠️  No se encontró ningún CSV en la carpeta actual.")
-            print("💡 Opciones:")
-            print("   1. Arrastra tu archivo CSV a esta carpeta")
-            print("   2. Usa: python process_itau_auto_v2.py --input ruta/a/tu/archivo.csv")
-            print("   3. Ejecuta primero el OCR con: python ocr_to_csv.py")
+        has_debug = _probe_base_dir(base_dir)[1]
+        first = find_first_candidate_csv(base_dir)
+        if first is None:
+            sys.stdout.write(_NO_CSV_MSG)
             return False
-        args.input = cands[0]
-        print(f"[auto] --input: {args.input}")
+        args.input = first
+        msgs.append(f"[auto] --input: {args.input}")
     # OUTPUT
+    output_dir = None  # se reutiliza para --report sin re-parsear args.output
     if not args.output:
         root, _ = os.path.splitext(args.input)
         extension = ".xlsx" if args.format == "excel" else ".csv"
@@ -836,71 +970,146 @@ def infer_defaults(args) -> bool:
         # Si es Excel, guardarlo en outputs/Itau
         if args.format == "excel":
             # Crear directorio de salida
-            output_dir = Path("../outputs/Itau")
-            output_dir.mkdir(parents=True, exist_ok=True)
+            output_dir = os.path.join("..", "outputs", "Itau")
+            os.makedirs(output_dir, exist_ok=True)
             
             # Usar solo el nombre del archivo, sin la ruta completa
-            filename = Path(root).name
-            args.output = str(output_dir / f"{filename}.cleaned{extension}")
+            filename = os.path.basename(root)
+            args.output = output_dir + os.sep + filename + ".cleaned" + extension
         else:
+            output_dir = os.path.dirname(root)
             args.output = root + ".cleaned" + extension
         
-        print(f"[auto] --output: {args.output}")
+        msgs.append(f"[auto] --output: {args.output}")
     # DEBUG
     if not args.debug:
-        dbg = os.path.join(base_dir, "Itau_auto_debug.txt")
-        if os.path.exists(dbg):
+        dbg = base_dir + os.sep + DEFAULT_DEBUG_NAME
+        if has_debug if has_debug is not None else os.path.exists(dbg):
             args.debug = dbg
-            print(f"[auto] --debug: {args.debug}")
+            msgs.append(f"[auto] --debug: {args.debug}")
     # REPORT
     if not args.report:
-        args.report = os.path.join(os.path.dirname(args.output), "fix_report.md")
-        print(f"[auto] --report: {args.report}")
-    
+        if output_dir is None:
+            output_dir = os.path.dirname(args.output)
+        args.report = output_dir + os.sep + "fix_report.md" if output_dir else "fix_report.md"
+        msgs.append(f"[auto] --report: {args.report}")
+    if msgs:
+        sys.stdout.write("\n".join(msgs) + "\n")
     return True
 
 
 # ========================= CLI =========================
 
+# Opciones con valor: flag -> (destino, choices o None)
+_CLI_VALUE_OPTS = {
+    "--input": ("input", None),
+    "--output": ("output", None),
+    "--debug": ("debug", None),
+    "--report": ("report", None),
+    "--date-format": ("date_format", ("iso", "dmy")),
+    "--thousand-sep": ("thousand_sep", ("none", "dot", "comma")),
+    "--fill-from-debug": ("fill_from_debug", ("none", "only_blanks", "prefer_debug")),
+    "--delimiter": ("delimiter", None),
+    "--format": ("format", ("csv", "excel")),
+}
+_CLI_FLAG_OPTS = {"--strict-dv": "strict_dv", "--reject-incomplete": "reject_incomplete"}
+_CLI_DEFAULTS = {
+    "input": None, "output": None, "debug": None, "report": None,
+    "date_format": "iso", "thousand_sep": "none", "fill_from_debug": "only_blanks",
+    "strict_dv": False, "delimiter": ";", "required_fields": [], "reject_incomplete": False,
+    "format": "excel", "verbose": 0,
+}
+
+
+_PARSER: Optional[argparse.ArgumentParser] = None
+
+
 def build_arg_parser() -> argparse.ArgumentParser:
+    """Parser de la CLI, construido una sola vez por proceso."""
+    global _PARSER
+    if _PARSER is None:
+        _PARSER = _build_arg_parser()
+    return _PARSER
+
+
+def _build_arg_parser() -> argparse.ArgumentParser:
+    d = _CLI_DEFAULTS
     p = argparse.ArgumentParser(description="Procesa y limpia CSV Itaú con soporte de Itau_auto_debug.txt")
     p.add_argument("--input", required=False, help="Ruta al CSV de entrada (por defecto autodetecta en carpeta actual)")
     p.add_argument("--output", required=False, help="Ruta al archivo de salida (por defecto <input>.cleaned.xlsx para Excel)")
     p.add_argument("--debug", required=False, default=None, help="Ruta a Itau_auto_debug.txt (opcional)")
     p.add_argument("--report", required=False, default=None, help="Ruta al reporte Markdown (por defecto fix_report.md junto al output)")
-    p.add_argument("--date-format", choices=["iso", "dmy"], default="iso", help="Formato de fechas: iso (yyyy-mm-dd) o dmy (dd-mm-aaaa)")
-    p.add_argument("--thousand-sep", choices=["none", "dot", "comma"], default="none", help="Formato de miles para enteros/monedas")
-    p.add_argument("--fill-from-debug", choices=["none", "only_blanks", "prefer_debug"], default="only_blanks",
+    p.add_argument("--date-format", choices=_CLI_VALUE_OPTS["--date-format"][1], default=d["date_format"], help="Formato de fechas: iso (yyyy-mm-dd) o dmy (dd-mm-aaaa)")
+    p.add_argument("--thousand-sep", choices=_CLI_VALUE_OPTS["--thousand-sep"][1], default=d["thousand_sep"], help="Formato de miles para enteros/monedas")
+    p.add_argument("--fill-from-debug", choices=_CLI_VALUE_OPTS["--fill-from-debug"][1], default=d["fill_from_debug"],
                    help="Cómo usar los 'FINAL ROW' del debug para completar datos")
     p.add_argument("--strict-dv", action="store_true", help="Si se activa, sobreescribe DV con el calculado cuando no coincide")
-    p.add_argument("--delimiter", default=";", help="Delimitador del CSV de entrada ('auto' para autodetectar)")
+    p.add_argument("--delimiter", default=d["delimiter"], help="Delimitador del CSV de entrada ('auto' para autodetectar)")
     p.add_argument("--required-fields", nargs="*", default=[], help="Campos requeridos; si faltan se registra y opcionalmente se rechaza")
     p.add_argument("--reject-incomplete", action="store_true", help="No escribe filas con campos requeridos vacíos")
-    p.add_argument("--format", choices=["csv", "excel"], default="excel", help="Formato de salida: csv o excel (por defecto excel)")
+    p.add_argument("--format", choices=_CLI_VALUE_OPTS["--format"][1], default=d["format"], help="Formato de salida: csv o excel (por defecto excel)")
     p.add_argument("-v", "--verbose", action="count", default=0, help="Verboso (-v, -vv)")
     return p
 
 
-def main():
-    ap = build_arg_parser()
-    args = ap.parse_args()
-    # Autodetecta defaults cuando faltan
-    if not infer_defaults(args):
+def _fast_parse(argv: List[str]) -> Optional[argparse.Namespace]:
+    """
+    Parser mínimo para el caso común (opciones simples, sin ayuda).
+    Retorna None ante cualquier cosa que no reconozca (--help, abreviaturas,
+    --required-fields, valores inválidos...) para que decida argparse.
+    """
+    ns = dict(_CLI_DEFAULTS)
+    ns["required_fields"] = []
+    i, n = 0, len(argv)
+    while i < n:
+        tok = argv[i]
+        if tok in _CLI_FLAG_OPTS:
+            ns[_CLI_FLAG_OPTS[tok]] = True
+        elif tok == "--verbose" or (len(tok) > 1 and tok.strip("v") == "-"):
+            ns["verbose"] += 1 if tok == "--verbose" else len(tok) - 1
+        else:
+            flag, eq, value = tok.partition("=")
+            spec = _CLI_VALUE_OPTS.get(flag)
+            if spec is None:
+                return None
+            if not eq:
+                i += 1
+                if i >= n or argv[i].startswith("-"):
+                    return None
+                value = argv[i]
+            dest, choices = spec
+            if choices is not None and value not in choices:
+                return None
+            ns[dest] = value
+        i += 1
+    return argparse.Namespace(**ns)
+
+
+def main(argv: Optional[List[str]] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = _fast_parse(argv) or build_arg_parser().parse_args(argv)
+    # Validación de existencia de input antes de crear carpetas/defaults.
+    # Si se autodetecta, sale del listado de la carpeta y ya existe.
+    if args.input and not os.path.exists(args.input):
+        print(f"❌ El archivo de entrada no existe: {args.input}", file=sys.stderr)
+        print("💡 Verifica que el archivo exista o ejecuta primero el OCR.")
+        sys.exit(2)
+    # Autodetecta defaults cuando faltan (nada que hacer si vienen los 4)
+    needs_infer = not (args.input and args.output and args.debug and args.report)
+    if needs_infer and not infer_defaults(args):
         print("\n❌ No se pudo inicializar el procesamiento.")
         print("🚀 Intenta ejecutar primero: python ocr_to_csv.py --client Itau --pdfs-dir pdfs/Itau")
         sys.exit(1)
     
+    # Se configura siempre: logging.warning()/error() sin handlers llamarían a
+    # basicConfig() con el formato por defecto, y los errores deben verse.
     logging.basicConfig(
         level=logging.WARNING if args.verbose == 0 else (logging.INFO if args.verbose == 1 else logging.DEBUG),
         format="%(levelname)s: %(message)s"
     )
-    # Validación de existencia de input
-    if not os.path.exists(args.input):
-        print(f"❌ El archivo de entrada no existe: {args.input}", file=sys.stderr)
-        print("💡 Verifica que el archivo exista o ejecuta primero el OCR.")
-        sys.exit(2)
     # Ejecuta
-    process(
+    is_excel = process(
         input_csv=args.input,
         output_csv=args.output,
         report_path=args.report,
@@ -914,7 +1123,8 @@ def main():
         reject_incomplete=args.reject_incomplete,
     )
     print("\nOK. Procesamiento completado.")
-    format_name = "Excel" if args.output.lower().endswith(('.xlsx', '.xls')) else "CSV"
+    # process() ya decidió el formato por la extensión de --output
+    format_name = "Excel" if is_excel else "CSV"
     print(f"- Archivo {format_name}: {args.output}")
     if args.report:
         print(f"- Reporte: {args.report}")
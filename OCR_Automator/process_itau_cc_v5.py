@@ -12,26 +12,37 @@ Mejoras clave:
 - Debug en outputs/Itau_debug_cc.txt
 """
 
+import os
+import json
 import re
 import shutil
 import argparse
+import hashlib
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
-from PIL import Image
 import pytesseract
 from pdf2image import convert_from_path
 import difflib
 import requests
 
+# rapidfuzz (C++) para el fuzzy de comunas; difflib como respaldo
+try:
+    from rapidfuzz import fuzz, process as rf_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
 # Importar utilidades de geocodificación y corrección
 try:
     from geocoding_utils import (
         clean_and_fix_address,
         fix_comuna_ocr,
-        apply_reference_corrections,
-        validate_rut_dv
+        apply_reference_corrections
     )
     GEO_UTILS_AVAILABLE = True
     print("✅ Utilidades de geocodificación cargadas")
@@ -42,7 +53,6 @@ except ImportError:
     def clean_and_fix_address(addr): return addr
     def fix_comuna_ocr(comuna): return comuna
     def apply_reference_corrections(df): return df
-    def validate_rut_dv(rut, dv): return rut, dv, True
 
 # ---------------- CONFIG ----------------
 TESSERACT_EXE = r"C:\Users\cdiaz\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
@@ -57,17 +67,15 @@ NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 USER_AGENT = "OCR-Automator/1.0 (cdiaz@ejemplo.com)"
 # ----------------------------------------
 
-# Verificar si Tesseract está disponible
-try:
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_EXE
-    # Test básico
-    test_img = Image.new('RGB', (100, 100), color='white')
-    pytesseract.image_to_string(test_img, lang='spa')
-    TESSERACT_AVAILABLE = True
+# Verificar si Tesseract está disponible (solo el ejecutable: cada worker del
+# pool re-importa el módulo y lanzar Tesseract aquí costaría un arranque en frío).
+# Si igual falla, el primer OCR lo detecta y apaga el flag.
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_EXE
+TESSERACT_AVAILABLE = Path(TESSERACT_EXE).exists()
+if TESSERACT_AVAILABLE:
     print("✅ Tesseract disponible")
-except Exception as e:
-    TESSERACT_AVAILABLE = False
-    print(f"⚠️ Tesseract no disponible: {e}")
+else:
+    print(f"⚠️ Tesseract no disponible: no existe {TESSERACT_EXE}")
 
 COLUMNS = [
     "OPERACION_1","RUT","DV","NOMBRE","DIRECCION","COMUNA",
@@ -85,14 +93,82 @@ COMUNAS = [
     "PUNTA ARENAS","CURICO","CURICÓ","ILLAPEL","COQUIMBO","LINARES","IQUIQUE","SAN BERNARDO",
     "COLINA","VITACURA","PEDRO AGUIRRE CERDA","PUERTO VARAS"
 ]
+COMUNAS_SET = frozenset(COMUNAS)   # búsqueda exacta O(1)
+COMUNAS_TUPLE = tuple(COMUNAS)     # iteración/fuzzy sin overhead de lista
 
 MONTHS = {
     'enero':1,'febrero':2,'marzo':3,'abril':4,'mayo':5,'junio':6,
     'julio':7,'agosto':8,'septiembre':9,'setiembre':9,'octubre':10,'noviembre':11,'diciembre':12
 }
 
+# --------------- Regex precompiladas ---------------
+_RE_NON_DIGIT = re.compile(r'[^\d]')
+_RE_ADDR_NUM = re.compile(r'\d{1,5}')
+_RE_ADDR_WORDS = re.compile(r'\b(CALLE|AVENIDA|AVDA|AV|PJE|PAS|PASAJE|MARINA|CIRCUNVAL|BOULEVARD|BLVD|PROLONGACION|DEPARTAMENTO|DEPTO|DPTO|Nº|N°|LOCAL|EDIF|BLOCK|BLOQUE|BRISAS)\b', re.IGNORECASE)
+_RE_DATE_NUMERIC = re.compile(r'(\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b)')
+_RE_DATE_LONG = re.compile(r'\b(?:en\s+[A-Za-zÁÉÍÓÚÑáéíóúñ]+,?\s*)?a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})', re.IGNORECASE)
+_RE_DUE_BOTH = re.compile(r'primera\s+cuota\s+el\s+d[ií]a?\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})'
+                          r'.*?l[aá]\s+[úu]ltima(?:\s+cuota)?\s+el\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})',
+                          re.IGNORECASE)
+_RE_DUE_FIRST = re.compile(r'primera\s+cuota\s+el\s+d[ií]a?\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})', re.IGNORECASE)
+_RE_DUE_LAST = re.compile(r'[úu]ltima(?:\s+cuota)?\s+el\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})', re.IGNORECASE)
+_RE_OPERATION = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'N[°º\*]?\s*(?:Operaci[oó]n|Operación)[:\s]*([0-9]{6,})',
+    r'\bOperaci[oó]n\s*N[°º]?\s*([0-9]{6,})',
+    r'N[°º\*]?\s*Producto[:\s]*([0-9]{6,})',
+))
+_RE_RUT_CEDULA = re.compile(r'C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', re.IGNORECASE)
+_RE_RUT_LABEL = re.compile(r'(?:C\.I\.\/RUT|C\.L\/RUT|RUT)[^:\d]{0,10}[:\s]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', re.IGNORECASE)
+_RE_RUT_DOTTED = re.compile(r'([0-9]{1,3}(?:\.[0-9]{3}){1,2})\s*[-\s–—]*([0-9Kk])')
+_RE_RUT_PLAIN = re.compile(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])')
+# Las 4 anteriores en una sola pasada: cada rama es (?P<rama>(num)(dv)); m.lastindex
+# apunta al grupo de la rama y los dos siguientes son número y DV.
+_RUT_BRANCHES = (("cedula", _RE_RUT_CEDULA, 12), ("label", _RE_RUT_LABEL, 10),
+                 ("dotted", _RE_RUT_DOTTED, 3), ("plain", _RE_RUT_PLAIN, 2))
+_RE_RUTS = re.compile("|".join(f"(?P<{name}>{rx.pattern})" for name, rx, _ in _RUT_BRANCHES), re.IGNORECASE)
+_RUT_BASE = {name: base for name, _, base in _RUT_BRANCHES}
+_RE_SUSCRIPTOR = re.compile(r'(Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)', re.IGNORECASE)
+_RE_BANCO_CTX = re.compile(r'\bBanco\b|\bIta[uú]\b|Representado por', re.IGNORECASE)
+_RE_NOMBRE_CAND = re.compile(r'^[^\S\n]*(?:Suscriptor|Deudor|Cliente\/Deudor)[^\n]*', re.IGNORECASE | re.MULTILINE)
+_RE_NEXT_LINE = re.compile(r'[^\S\n]*\n\s*(\S[^\n]*)')
+_RE_NOMBRE_LINE = re.compile(r'^(?:Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)[:\.\s-]*(.+)$', re.IGNORECASE)
+# Bloque de identidad: una sola pasada por página; el grupo con nombre indica la etiqueta
+_RE_IDENT_LABEL = re.compile(
+    r'^\s*(?:(?P<name>Nombre\s+y\s+Apellidos\s+del\s+deudor)|(?P<rut>C[eé]dula\s+de\s+Identidad\s*N[°\*]?)'
+    r'|(?P<address>Domicilio)|(?P<comuna>Comuna)|(?P<ciudad>Ciudad))\s*[:]',
+    re.IGNORECASE | re.MULTILINE)
+_RE_IDENT_VALUE = re.compile(r'\s*(.+)$', re.MULTILINE)
+_RE_IDENT_RUT_VALUE = re.compile(r'\s*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])\s*$', re.MULTILINE)
+# Espacios al final de línea + salto(s) + líneas vacías + sangría -> un solo '\n'
+# (mismos separadores que str.splitlines)
+_RE_LINE_GAPS = re.compile(r'[^\S\n\r\v\f\x1c-\x1e\x85\u2028\u2029]*[\n\r\v\f\x1c-\x1e\x85\u2028\u2029]\s*')
+_RE_DOMICILIO_LINE = re.compile(r'^Domicilio[^\S\n]*[:][^\S\n]*', re.IGNORECASE | re.MULTILINE)
+_RE_ADDR_COMUNA = re.compile(r'([A-Za-z0-9\.\s\-]{4,200}?),\s*([A-Za-zÁÉÍÓÚÑáéíóúñ\s\-]{3,40})[\.]?', re.IGNORECASE)
+_RE_AMOUNT = re.compile(r'(?:la\s+suma\s+de|cantidad\s+de)?\s*\$\s*([0-9\.\,]+)', re.IGNORECASE)
+_RE_CUOTAS = re.compile(r'\ben\s+(\d{1,3})\s+cuotas\b', re.IGNORECASE)
+_RE_MONTO_CUOTA = re.compile(r'por\s+la\s+suma\s+de\s*\$\s*([\d\.\,]+)\s*(?:cada|cada\s+una|cada\s+una\s+de\s+ellas)?', re.IGNORECASE)
+_RE_MONTO_ULTIMA = re.compile(r'[y\s,]+(?:una\s+)?[úu]ltima(?:\s+cuota)?\s+de\s*\$\s*([\d\.\,]+)', re.IGNORECASE)
+_RE_TASA = re.compile(r'tasa[^%]{0,50}?(\d{1,2}[\.,]\d{1,2})\s*%', re.IGNORECASE)
+_RE_INTERES = re.compile(r'inter[eé]s(?:[^%]{0,50})?(\d{1,2}[\.,]\d{1,2})\s*%', re.IGNORECASE)
+_RE_CUOTA_MOROSA = re.compile(r'cuota\s+morosa\s*(\d{1,3})', re.IGNORECASE)
+_RE_CUOTA_MOROSA_FECHA = re.compile(r'cuota\s+morosa.*?(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})', re.IGNORECASE)
+_RE_NAME_CHARS = re.compile(r'[^A-Za-zÁÉÍÓÚÑñ\s]')
+_RE_NAME_ID_MARK = re.compile(r'C[eé]DULA|C\.L|C\.I|ID|CI\.|N[°\*]', re.IGNORECASE)
+_RE_REP1 = re.compile(r'Representante\s*1[:\s\.-]*(.+)', re.IGNORECASE)
+_RE_REP2 = re.compile(r'Representante\s*2[:\s\.-]*(.+)', re.IGNORECASE)
+_RE_REP2_LABEL = re.compile(r'Representante\s*2', re.IGNORECASE)
+_RE_REP_ANY = re.compile(r'Representante\s*[12]', re.IGNORECASE)
+
 # --------------- Debug helper ---------------
+# Mientras process_one_pdf corre (en un proceso hijo si hay varios workers), el
+# debug se junta en _DEBUG_CAPTURE y vuelve al padre junto con la fila: sólo el
+# padre escribe DEBUG_FILE, un bloque por PDF y en el orden de entrada
+_DEBUG_CAPTURE = None
+
 def write_debug(s: str):
+    if _DEBUG_CAPTURE is not None:
+        _DEBUG_CAPTURE.append(s)
+        return
     DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
     with open(DEBUG_FILE, "a", encoding="utf-8") as f:
         f.write(s + "\n")
@@ -110,19 +186,29 @@ def format_thousands_dot(n):
     if n is None: return ""
     return f"{n:,}".replace(",", ".")
 
+@lru_cache(maxsize=4096)
 def normalize_token(tok): return tok.strip().strip(" .,:;").upper()
 
+# Funciones puras str -> str: se repiten mucho entre páginas y PDFs
+@lru_cache(maxsize=4096)
 def fuzzy_comuna(s):
     su = normalize_token(s)
     if not su: return ""
+    # exacta
+    if su in COMUNAS_SET: return su
     # contains exact
-    for c in COMUNAS:
+    for c in COMUNAS_TUPLE:
         if c in su or su in c:
             return c
-    # fuzzy
-    best = difflib.get_close_matches(su, COMUNAS, n=1, cutoff=0.72)
+    # fuzzy: fuzz.ratio (Indel/LCS, 0-100) es comparable pero no idéntico a difflib
+    # (Ratcliff-Obershelp), así que con corte 72 pueden elegir comunas distintas
+    if RAPIDFUZZ_AVAILABLE:
+        best = rf_process.extractOne(su, COMUNAS_TUPLE, scorer=fuzz.ratio, score_cutoff=72)
+        return best[0] if best else su
+    best = difflib.get_close_matches(su, COMUNAS_TUPLE, n=1, cutoff=0.72)
     return best[0] if best else su
 
+@lru_cache(maxsize=4096)
 def is_bank_header_line(s: str) -> bool:
     if not s: return False
     su = s.upper()
@@ -130,45 +216,40 @@ def is_bank_header_line(s: str) -> bool:
         "EN SU OFICINA", "PRESIDENTE RIESCO", "BANCO ITA", "COMUNA DE LAS"
     ])
 
+@lru_cache(maxsize=4096)
 def looks_like_physical_address(s):
     if not s: return False
-    if re.search(r'\d{1,5}', s): return True
-    return bool(re.search(r'\b(CALLE|AVENIDA|AVDA|AV|PJE|PAS|PASAJE|MARINA|CIRCUNVAL|BOULEVARD|BLVD|PROLONGACION|DEPARTAMENTO|DEPTO|DPTO|Nº|N°|LOCAL|EDIF|BLOCK|BLOQUE|BRISAS)\b', s, re.IGNORECASE))
+    if _RE_ADDR_NUM.search(s): return True
+    return bool(_RE_ADDR_WORDS.search(s))
 
 # --------------- Dates parsing ---------------
 def parse_spanish_date(text):
     t = text.replace('\n',' ')
-    m = re.search(r'(\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b)', t)
+    m = _RE_DATE_NUMERIC.search(t)
     if m:
         s = m.group(1).replace('-', '/')
         for fmt in ("%d/%m/%Y","%d/%m/%y"):
             try: return datetime.strptime(s, fmt).strftime("%d-%m-%Y")
             except: pass
-    m = re.search(r'\b(?:en\s+[A-Za-zÁÉÍÓÚÑáéíóúñ]+,?\s*)?a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})', t, re.IGNORECASE)
+    m = _RE_DATE_LONG.search(t)
     if m: return fmt_date(m.group(1), m.group(2), m.group(3))
     return ""
 
 def parse_first_last_due_dates(text):
     t = text.replace('\n',' ')
-    m = re.search(r'primera\s+cuota\s+el\s+d[ií]a?\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})'
-                  r'.*?l[aá]\s+[úu]ltima(?:\s+cuota)?\s+el\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})',
-                  t, re.IGNORECASE)
+    m = _RE_DUE_BOTH.search(t)
     if m:
         return fmt_date(m.group(1), m.group(2), m.group(3)), fmt_date(m.group(4), m.group(5), m.group(6))
-    m1 = re.search(r'primera\s+cuota\s+el\s+d[ií]a?\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})', t, re.IGNORECASE)
-    m2 = re.search(r'[úu]ltima(?:\s+cuota)?\s+el\s+(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})', t, re.IGNORECASE)
+    m1 = _RE_DUE_FIRST.search(t)
+    m2 = _RE_DUE_LAST.search(t)
     f1 = fmt_date(*m1.groups()) if m1 else ""
     f2 = fmt_date(*m2.groups()) if m2 else ""
     return f1, f2
 
 # --------------- Operation / RUT / Name ---------------
 def extract_operation_from_text(text):
-    for pat in [
-        r'N[°º\*]?\s*(?:Operaci[oó]n|Operación)[:\s]*([0-9]{6,})',
-        r'\bOperaci[oó]n\s*N[°º]?\s*([0-9]{6,})',
-        r'N[°º\*]?\s*Producto[:\s]*([0-9]{6,})'
-    ]:
-        m = re.search(pat, text, re.IGNORECASE)
+    for rx in _RE_OPERATION:
+        m = rx.search(text)
         if m: return m.group(1).strip()
     return ""
 
@@ -178,30 +259,39 @@ def extract_operation_allpages(text_pages):
         if op: return op
     return ""
 
+@lru_cache(maxsize=4096)
+def _dv_mod11(n):
+    """Dígito verificador (módulo 11) del RUT numérico n."""
+    total, factor = 0, 2
+    while n:
+        total += (n % 10) * factor
+        n //= 10
+        factor = 2 if factor == 7 else factor + 1
+    r = 11 - total % 11
+    return "0" if r == 11 else "K" if r == 10 else str(r)
+
+def rut_dv_ok(rut, dv):
+    digits = _RE_NON_DIGIT.sub('', str(rut or ""))
+    return bool(digits) and _dv_mod11(int(digits)) == str(dv or "").strip().upper()
+
 def find_all_ruts(text):
     matches = []
-    # Etiquetados (Cédula / RUT)
-    for pat, base in [
-        (r'C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 12),
-        (r'(?:C\.I\.\/RUT|C\.L\/RUT|RUT)[^:\d]{0,10}[:\s]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 10)
-    ]:
-        for m in re.finditer(pat, text, re.IGNORECASE):
-            start = m.start(1)
-            matches.append((start, re.sub(r'[^\d]', '', m.group(1)), m.group(2).upper(), text[max(0,start-80):start+120], base))
-    # Genéricos
-    for m in re.finditer(r'([0-9]{1,3}(?:\.[0-9]{3}){1,2})\s*[-\s–—]*([0-9Kk])', text):
-        start = m.start(1)
-        matches.append((start, re.sub(r'[^\d]', '', m.group(1)), m.group(2).upper(), text[max(0,start-80):start+120], 3))
-    for m in re.finditer(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])', text):
-        start = m.start(1)
-        matches.append((start, m.group(1), m.group(2).upper(), text[max(0,start-80):start+120], 2))
+    for m in _RE_RUTS.finditer(text):
+        g = m.lastindex
+        start = m.start(g + 1)
+        matches.append((start, _RE_NON_DIGIT.sub('', m.group(g + 1)), m.group(g + 2).upper(), text[max(0,start-80):start+120], _RUT_BASE[m.lastgroup]))
+    # Mismo orden que las pasadas separadas (Cédula, RUT, genéricos): importa en empates
+    matches.sort(key=lambda x: -x[4])
     return matches
 
 def choose_rut_for_doc(text, ruts):
     if not ruts: return "", ""
-    sus = re.search(r'(Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)', text, re.IGNORECASE)
+    # Si algún candidato cumple el DV, los que no lo cumplen no compiten
+    valid = [r for r in ruts if rut_dv_ok(r[1], r[2])]
+    if valid: ruts = valid
+    sus = _RE_SUSCRIPTOR.search(text)
     sus_pos = sus.start() if sus else None
-    banco_pat = re.compile(r'\bBanco\b|\bIta[uú]\b|Representado por', re.IGNORECASE)
+    banco_pat = _RE_BANCO_CTX
     best = None; best_score = -1
     for (pos, rut, dv, ctx, base) in ruts:
         score = base
@@ -214,13 +304,16 @@ def choose_rut_for_doc(text, ruts):
     return best if best else ("","")
 
 def extract_nombre_generic(text):
-    # Fallback cuando no hay bloque identidad
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    for i, ln in enumerate(lines):
-        m = re.match(r'^(?:Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)[:\.\s-]*(.+)$', ln, re.IGNORECASE)
+    # Fallback cuando no hay bloque identidad. La regex multilínea ubica en C las
+    # líneas candidatas; la validación usa la misma regex de línea sobre la línea limpia.
+    for mc in _RE_NOMBRE_CAND.finditer(text):
+        m = _RE_NOMBRE_LINE.match(mc.group(0).strip())
         if m:
             name = (m.group(1) or "").strip()
-            return (name or (lines[i+1].strip() if i+1 < len(lines) else "")).upper()
+            if not name:
+                nxt = _RE_NEXT_LINE.match(text, mc.end())
+                name = nxt.group(1).strip() if nxt else ""
+            return name.upper()
     return ""
 
 # --------------- Identity block (pág. 3 típica) ---------------
@@ -235,31 +328,42 @@ def extract_cc_identity_block(text_pages):
     """
     ident = {"name":"","rut":"","dv":"","address":"","comuna":"","ok":False}
     for page_idx, text in enumerate(text_pages, start=1):
-        # Usar flags re.M para obedecer inicios de línea
+        # Primera etiqueta de cada tipo con valor válido en la página (re.M: inicios de línea)
+        found = {}
+        for m in _RE_IDENT_LABEL.finditer(text):
+            key = m.lastgroup
+            if key in found: continue
+            vm = (_RE_IDENT_RUT_VALUE if key == "rut" else _RE_IDENT_VALUE).match(text, m.end())
+            if vm:
+                found[key] = vm
+                if len(found) == 5: break
         # Nombre
-        mname = re.search(r'^\s*Nombre\s+y\s+Apellidos\s+del\s+deudor\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+        mname = found.get("name")
         if mname and not ident["name"]:
             ident["name"] = mname.group(1).strip().upper()
         # Cédula
-        mrut = re.search(r'^\s*C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*[:]\s*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])\s*$', text, re.IGNORECASE | re.MULTILINE)
+        mrut = found.get("rut")
         if mrut and not ident["rut"]:
-            ident["rut"] = re.sub(r'[^\d]', '', mrut.group(1))
+            ident["rut"] = _RE_NON_DIGIT.sub('', mrut.group(1))
             ident["dv"] = mrut.group(2).upper()
         # Domicilio
-        mdom = re.search(r'^\s*Domicilio\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+        mdom = found.get("address")
         if mdom and not ident["address"]:
             cand = mdom.group(1).strip()
             if not is_bank_header_line(cand):
                 ident["address"] = cand.upper()
         # Comuna
-        mcom = re.search(r'^\s*Comuna\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+        mcom = found.get("comuna")
         if mcom and not ident["comuna"]:
             ident["comuna"] = fuzzy_comuna(mcom.group(1))
         # Ciudad (respaldo)
         if not ident["comuna"]:
-            mciu = re.search(r'^\s*Ciudad\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+            mciu = found.get("ciudad")
             if mciu:
                 ident["comuna"] = fuzzy_comuna(mciu.group(1))
+        # Bloque completo: las páginas siguientes ya no pueden cambiar nada
+        if ident["name"] and ident["rut"] and ident["address"] and ident["comuna"]:
+            break
     # Marcar ok si dirección o comuna válidas
     if ident["address"] and not is_bank_header_line(ident["address"]):
         ident["ok"] = True
@@ -273,21 +377,26 @@ def extract_cc_identity_block(text_pages):
     return ident
 
 # --------------- Fallback domicilio/comuna (filtrado) ---------------
+def _line_at(text, pos):
+    """Línea de text que empieza en pos (sin el salto)."""
+    end = text.find("\n", pos)
+    return text[pos:] if end < 0 else text[pos:end]
+
 def extract_domicilio_and_comuna(text):
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    # Líneas limpias y sin vacías, unidas por '\n', en una sola sustitución en C
+    joined = _RE_LINE_GAPS.sub("\n", text).strip()
     # etiqueta 'Domicilio :'
-    for i, ln in enumerate(lines):
-        if re.search(r'^\s*Domicilio\s*[:]\s*', ln, re.IGNORECASE):
-            tail = re.split(r'[:]\s*', ln, maxsplit=1)[-1]
-            if not is_bank_header_line(tail) and looks_like_physical_address(tail):
-                return tail.strip().upper(), ""
-            if i+1 < len(lines):
-                nxt = lines[i+1]
-                if not is_bank_header_line(nxt) and looks_like_physical_address(nxt):
-                    return nxt.strip().upper(), ""
+    for m in _RE_DOMICILIO_LINE.finditer(joined):
+        tail = _line_at(joined, m.end())
+        if not is_bank_header_line(tail) and looks_like_physical_address(tail):
+            return tail.strip().upper(), ""
+        nl = m.end() + len(tail)
+        if nl < len(joined):
+            nxt = _line_at(joined, nl + 1)
+            if not is_bank_header_line(nxt) and looks_like_physical_address(nxt):
+                return nxt.strip().upper(), ""
     # patrón ', <COMUNA>' pero filtrando encabezado
-    joined = "\n".join(lines)
-    for m in re.finditer(r'([A-Za-z0-9\.\s\-]{4,200}?),\s*([A-Za-zÁÉÍÓÚÑáéíóúñ\s\-]{3,40})[\.]?', joined, re.IGNORECASE):
+    for m in _RE_ADDR_COMUNA.finditer(joined):
         addr = m.group(1).strip(); tail = m.group(2)
         if is_bank_header_line(addr) or "COMUNA DE " in tail.upper(): continue
         if looks_like_physical_address(addr):
@@ -297,8 +406,8 @@ def extract_domicilio_and_comuna(text):
 # --------------- Montos / Tasa / Cuotas ---------------
 def extract_amount(text):
     candidates = []
-    for m in re.finditer(r'(?:la\s+suma\s+de|cantidad\s+de)?\s*\$\s*([0-9\.\,]+)', text, re.IGNORECASE):
-        raw = m.group(1); clean = re.sub(r'[^\d]', '', raw)
+    for m in _RE_AMOUNT.finditer(text):
+        raw = m.group(1); clean = _RE_NON_DIGIT.sub('', raw)
         num = int(clean) if clean.isdigit() else None
         ctx = text[max(0, m.start()-80): m.end()+80].lower()
         score = 10 if ('la suma de' in ctx or 'cantidad de' in ctx) else 0
@@ -314,49 +423,53 @@ def extract_cuotas_and_montos(text):
     cuotas = ""
     monto_cuota = ""
     monto_ult_cuota = ""
-    m = re.search(r'\ben\s+(\d{1,3})\s+cuotas\b', t, re.IGNORECASE)
+    m = _RE_CUOTAS.search(t)
     if m: cuotas = m.group(1)
-    m = re.search(r'por\s+la\s+suma\s+de\s*\$\s*([\d\.\,]+)\s*(?:cada|cada\s+una|cada\s+una\s+de\s+ellas)?', t, re.IGNORECASE)
+    m = _RE_MONTO_CUOTA.search(t)
     if m:
-        clean = re.sub(r'[^\d]', '', m.group(1)); 
+        clean = _RE_NON_DIGIT.sub('', m.group(1)); 
         if clean.isdigit(): monto_cuota = format_thousands_dot(int(clean))
-    m = re.search(r'[y\s,]+(?:una\s+)?[úu]ltima(?:\s+cuota)?\s+de\s*\$\s*([\d\.\,]+)', t, re.IGNORECASE)
+    m = _RE_MONTO_ULTIMA.search(t)
     if m:
-        clean = re.sub(r'[^\d]', '', m.group(1)); 
+        clean = _RE_NON_DIGIT.sub('', m.group(1)); 
         if clean.isdigit(): monto_ult_cuota = format_thousands_dot(int(clean))
     return cuotas, monto_cuota, monto_ult_cuota
 
 def extract_tasa(text):
-    m = re.search(r'tasa[^%]{0,50}?(\d{1,2}[\.,]\d{1,2})\s*%', text, re.IGNORECASE)
+    m = _RE_TASA.search(text)
     if m: return f"{m.group(1).replace('.', ',')}%"
-    m = re.search(r'inter[eé]s(?:[^%]{0,50})?(\d{1,2}[\.,]\d{1,2})\s*%', text, re.IGNORECASE)
+    m = _RE_INTERES.search(text)
     if m: return f"{m.group(1).replace('.', ',')}%"
     return ""
 
 def extract_cuota_morosa(text):
-    m = re.search(r'cuota\s+morosa\s*(\d{1,3})', text, re.IGNORECASE)
+    m = _RE_CUOTA_MOROSA.search(text)
     cm = m.group(1) if m else ""
     f = ""
-    mf = re.search(r'cuota\s+morosa.*?(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚÑáéíóúñ]+)\s+de\s+(\d{4})', text, re.IGNORECASE)
+    mf = _RE_CUOTA_MOROSA_FECHA.search(text)
     if mf: f = fmt_date(mf.group(1), mf.group(2), mf.group(3))
     return cm, f
 
 # --------------- Representantes ---------------
 def is_name_candidate(s):
     if not s: return False
-    s_clean = re.sub(r'[^A-Za-zÁÉÍÓÚÑñ\s]', '', s).strip()
+    s_clean = _RE_NAME_CHARS.sub('', s).strip()
     if len(s_clean) < 4: return False
-    if re.search(r'C[eé]DULA|C\.L|C\.I|ID|CI\.|N[°\*]', s, re.IGNORECASE): return False
+    if _RE_NAME_ID_MARK.search(s): return False
     return len(s_clean.split()) >= 2
 
-def extract_representantes_allpages(text_pages):
+def extract_representantes_allpages(text_pages, combined_text=None):
+    # Atajo: si el texto combinado no menciona representantes, ninguna página lo hace
+    if combined_text is not None and not _RE_REP_ANY.search(combined_text):
+        return "", ""
     rep1 = rep2 = ""
-    for text in text_pages:
-        m1 = re.search(r'Representante\s*1[:\s\.-]*(.+)', text, re.IGNORECASE)
+    # Gana la última página con valor: se recorre al revés y se corta al tener ambos
+    for text in reversed(text_pages):
+        m1 = None if rep1 else _RE_REP1.search(text)
         if m1:
             cand = m1.group(1).splitlines()[0].strip()
             if is_name_candidate(cand): rep1 = cand.upper()
-        m2 = re.search(r'Representante\s*2[:\s\.-]*(.+)', text, re.IGNORECASE)
+        m2 = None if rep2 else _RE_REP2.search(text)
         if m2:
             cand = m2.group(1).splitlines()[0].strip()
             if is_name_candidate(cand): rep2 = cand.upper()
@@ -364,37 +477,85 @@ def extract_representantes_allpages(text_pages):
                 following = m2.group(1).splitlines()
                 if len(following) >= 2 and is_name_candidate(following[1]):
                     rep2 = following[1].upper()
+        if rep1 and rep2: break
     if not rep2:
         for text in text_pages:
             lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
             for i, ln in enumerate(lines):
-                if re.search(r'Representante\s*2', ln, re.IGNORECASE) and i+1 < len(lines):
+                if _RE_REP2_LABEL.search(ln) and i+1 < len(lines):
                     cand = lines[i+1]
                     if is_name_candidate(cand): rep2 = cand.upper(); break
             if rep2: break
     return rep1, rep2
 
 # --------------- OCR helpers ---------------
-def ocr_image_to_text(img_path):
+def ocr_image_to_text(img_path, config=""):
+    global TESSERACT_AVAILABLE
     if not TESSERACT_AVAILABLE:
         write_debug(f"⚠️ Tesseract no disponible para {img_path}")
         return ""
     try: 
-        img = Image.open(img_path)
-        return pytesseract.image_to_string(img, lang='spa')
+        # Con una ruta pytesseract pasa el archivo tal cual a Tesseract (sin re-codificar)
+        return pytesseract.image_to_string(str(img_path), lang='spa', config=config)
+    except pytesseract.TesseractNotFoundError as e:
+        TESSERACT_AVAILABLE = False
+        write_debug(f"⚠️ Tesseract no disponible: {e}")
+        return ""
     except Exception as e:
         write_debug(f"ERROR OCR {img_path}: {e}")
         return ""
 
-def convert_pdf_to_images(pdf_path, out_folder, poppler_path, dpi=200):
+def ocr_images_batch(images, list_path, threads=1, config=""):
+    """
+    OCR de las páginas con pocas invocaciones de Tesseract: cada invocación
+    recibe un .txt con una ruta de imagen por línea y separa las páginas por '\f'.
+    Con threads > 1 las páginas se reparten en tramos contiguos que corren en
+    hilos (Tesseract es un proceso aparte, el GIL no estorba).
+    Si un tramo falla o no cuadra el número de páginas, ese tramo vuelve a
+    OCR imagen por imagen.
+    """
+    if not TESSERACT_AVAILABLE:
+        write_debug(f"⚠️ Tesseract no disponible para {list_path.parent}")
+        return ["" for _ in images]
+    threads = max(1, min(threads, len(images)))
+    if threads == 1:
+        return _ocr_images_chunk(images, list_path, config)
+    size = -(-len(images) // threads)  # ceil
+    chunks = [images[i:i + size] for i in range(0, len(images), size)]
+    paths = [list_path.with_name(f"{list_path.stem}_{n}{list_path.suffix}") for n in range(len(chunks))]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as ex:
+        parts = list(ex.map(_ocr_images_chunk, chunks, paths, repeat(config)))
+    return [txt for part in parts for txt in part]
+
+def _ocr_images_chunk(images, list_path, config=""):
+    if len(images) > 1:
+        try:
+            list_path.write_text("\n".join(str(Path(img).resolve()) for img in images) + "\n", encoding="utf-8")
+            pages = pytesseract.image_to_string(str(list_path), lang='spa', config=config).split("\f")
+            # Tesseract termina cada página con '\f': sobra un último trozo vacío
+            if len(pages) == len(images) + 1 and not pages[-1].strip():
+                pages.pop()
+            if len(pages) == len(images):
+                return pages
+            write_debug(f"WARNING OCR batch {list_path}: {len(pages)} páginas para {len(images)} imágenes")
+        except Exception as e:
+            write_debug(f"WARNING OCR batch {list_path}: {e}")
+    return [ocr_image_to_text(img, config) for img in images]
+
+def convert_pdf_to_images(pdf_path, out_folder, poppler_path, dpi=200, thread_count=1):
+    """
+    pdftoppm escribe las páginas directamente en out_folder (PPM sin comprimir)
+    y solo se devuelven las rutas: Python no decodifica ni re-codifica PNGs.
+    thread_count reparte las páginas entre varios pdftoppm en paralelo.
+    """
     out_folder.mkdir(parents=True, exist_ok=True)
     try:
-        images = convert_from_path(str(pdf_path), dpi=dpi, poppler_path=str(poppler_path))
-        outs = []
-        for i, img in enumerate(images, start=1):
-            out = out_folder / f"page{i}.png"
-            img.save(out, "PNG"); outs.append(out)
-        return outs
+        paths = convert_from_path(
+            str(pdf_path), dpi=dpi, poppler_path=str(poppler_path),
+            output_folder=str(out_folder), output_file="page", fmt="ppm", paths_only=True,
+            thread_count=max(1, thread_count),
+        )
+        return [Path(p) for p in paths]
     except Exception as e:
         write_debug(f"ERROR PDF->Images {pdf_path}: {e}")
         return []
@@ -403,19 +564,74 @@ def find_existing_pdfs():
     if not PDF_INPUT_DIR.exists(): return []
     return sorted(PDF_INPUT_DIR.glob("*.pdf"))
 
+GEOCACHE_FILE = OUT_DIR / "_geocache.jsonl"
+NOMINATIM_MIN_INTERVAL = 1.0  # política de Nominatim: máx 1 request/seg
+_geo_session = None
+_geo_disk_cache = None
+_geo_last_request = 0.0
+
+def _load_geocache():
+    """Caché persistente {dirección normalizada: ciudad}, append-only entre corridas."""
+    global _geo_disk_cache
+    if _geo_disk_cache is None:
+        _geo_disk_cache = {}
+        if GEOCACHE_FILE.exists():
+            with open(GEOCACHE_FILE, encoding="utf-8") as f:
+                for ln in f:
+                    try:
+                        rec = json.loads(ln)
+                        _geo_disk_cache[rec["q"]] = rec["city"]
+                    except (ValueError, KeyError):
+                        continue
+    return _geo_disk_cache
+
 def geocode_address(addr):
     if not addr: return ""
+    return _geocode_cached(" ".join(addr.upper().split()))
+
+@lru_cache(maxsize=1024)
+def _geocode_cached(key):
+    global _geo_session, _geo_last_request
+    cache = _load_geocache()
+    if key in cache: return cache[key]
     try:
-        r = requests.get(NOMINATIM_URL, params={"q": f"{addr}, Chile","format":"json","addressdetails":1,"limit":1}, headers={"User-Agent": USER_AGENT}, timeout=8)
-        if r.status_code == 200 and r.json():
-            a = r.json()[0].get("address", {})
-            city = a.get("city") or a.get("town") or a.get("municipality") or a.get("county") or ""
-            return (city or "").upper()
-        write_debug(f"Geocode HTTP {r.status_code} for {addr}")
+        if _geo_session is None:
+            _geo_session = requests.Session()
+            _geo_session.headers["User-Agent"] = USER_AGENT
+        wait = NOMINATIM_MIN_INTERVAL - (time.monotonic() - _geo_last_request)
+        if wait > 0: time.sleep(wait)
+        _geo_last_request = time.monotonic()
+        r = _geo_session.get(NOMINATIM_URL, params={"q": f"{key}, Chile","format":"json","addressdetails":1,"limit":1}, timeout=8)
+        if r.status_code == 200:
+            data = r.json()
+            city = ""
+            if data:
+                a = data[0].get("address", {})
+                city = (a.get("city") or a.get("town") or a.get("municipality") or a.get("county") or "").upper()
+            # Solo respuestas definitivas van a disco (errores se reintentan en otra corrida)
+            cache[key] = city
+            GEOCACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(GEOCACHE_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"q": key, "city": city}, ensure_ascii=False) + "\n")
+            return city
+        write_debug(f"Geocode HTTP {r.status_code} for {key}")
     except Exception as e:
-        write_debug(f"Geocode exception: {e} for {addr}")
+        write_debug(f"Geocode exception: {e} for {key}")
     return ""
 
+def geocode_missing_comuna(row):
+    """
+    Completa COMUNA con Nominatim si la fila trae dirección y no comuna. main()
+    la llama en el proceso principal: el límite de 1 request/seg es por proceso.
+    """
+    direccion = row.get("DIRECCION") or ""
+    if direccion and not row.get("COMUNA"):
+        gc = geocode_address(direccion)
+        if gc and gc != "SANTIAGO":
+            row["COMUNA"] = fix_comuna_ocr(gc)
+            write_debug(f"[GEOCODE] {direccion} -> {row['COMUNA']}")
+    return row
+
 # --------------- Finalize address/comuna (solo si falta comuna) ---------------
 def finalize_address_comuna(row):
     dir_val = (row.get("DIRECCION") or "").strip()
@@ -424,13 +640,17 @@ def finalize_address_comuna(row):
         if ',' in dir_val and not is_bank_header_line(dir_val):
             left, right = dir_val.rsplit(',', 1)
             comm = fuzzy_comuna(right)
-            if comm and (comm in COMUNAS or len(comm) >= 4):
+            if comm and (comm in COMUNAS_SET or len(comm) >= 4):
                 row["DIRECCION"] = left.strip().upper()
                 row["COMUNA"] = comm
     return row
 
 # --------------- Combine per PDF ---------------
 def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
+    # Texto combinado una sola vez (se usa en varios respaldos más abajo)
+    text_pages = list(text_pages)
+    combined_text = "\n".join(text_pages)
+
     # 1) identidad del deudor (primaria)
     ident = extract_cc_identity_block(text_pages)
 
@@ -449,7 +669,6 @@ def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
         tasa = extract_tasa(text)
         cuota_morosa, fecha_cuota_morosa = extract_cuota_morosa(text)
         rows.append({
-            "text": text,
             "OPERACIÓN": op, "RUT": rut_gen, "DV": dv_gen,
             "NOMBRE_G": nombre_g, "DIRECCION_H": direccion_h, "COMUNA_H": comuna_h,
             "FECHA_SUSCRIPCION": fecha_sus, "MONTO_CREDITO": monto_fmt,
@@ -462,7 +681,7 @@ def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
     def score_row_basic(r):
         return (50 if r.get("OPERACIÓN") else 0) + (30 if r.get("RUT") else 0) + (20 if r.get("NOMBRE_G") else 0) + (10 if r.get("MONTO_CREDITO") else 0)
     best = max(rows, key=score_row_basic) if rows else {}
-    operation = extract_operation_allpages([r["text"] for r in rows]) or best.get("OPERACIÓN","")
+    operation = extract_operation_allpages(text_pages) or best.get("OPERACIÓN","")
 
     # 4) fijar identidad (bloque) – NO sobreescribir con encabezado legal
     nombre = ident["name"] or best.get("NOMBRE_G","") or ""
@@ -481,7 +700,7 @@ def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
 
     # 6) completar desde combinado solo si aún faltan
     if not direccion or not comuna:
-        addr2, com2 = extract_domicilio_and_comuna("\n".join([r["text"] for r in rows]))
+        addr2, com2 = extract_domicilio_and_comuna(combined_text)
         if addr2 and not direccion: direccion = addr2.upper()
         if com2 and not comuna: comuna = com2
 
@@ -496,7 +715,6 @@ def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
         if gc and gc != "SANTIAGO": comuna = gc
 
     # 9) fechas / montos / tasa
-    combined_text = "\n".join([r["text"] for r in rows])
     f1 = best.get("F1",""); fN = best.get("FN","")
     if not f1 or not fN:
         f1c, fNc = parse_first_last_due_dates(combined_text)
@@ -508,7 +726,7 @@ def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
     if not tasa: tasa = extract_tasa(combined_text)
 
     # 10) representantes
-    rep1, rep2 = extract_representantes_allpages([r["text"] for r in rows])
+    rep1, rep2 = extract_representantes_allpages(text_pages, combined_text)
 
     # 11) fecha suscripción
     fecha_sus = best.get("FECHA_SUSCRIPCION","") or parse_spanish_date(combined_text)
@@ -540,12 +758,145 @@ def extract_all_from_text_pages_cc(text_pages, use_geocode=False):
     write_debug("---- END COMBINED ROW CC ----\n")
     return final_row
 
+# --------------- Excel / checkpoint ---------------
+CHUNK_SIZE = 32  # PDFs por tramo antes de volcar filas al Excel y al checkpoint
+CHECKPOINT_FILE = OUT_DIR / "_checkpoint.jsonl"
+
+def new_results_workbook():
+    """
+    Workbook write-only de openpyxl (streaming, sin estilos por celda) con la
+    cabecera COLUMNS ya escrita. Misma hoja por defecto que df.to_excel.
+    """
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(COLUMNS)
+    return wb, ws
+
+def pdf_content_hash(pdf_path):
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def checkpoint_key(pdf, settings):
+    """
+    Clave del PDF en el checkpoint: contenido + ajustes que cambian la fila (DPI,
+    PSM, geocode). Un PDF modificado o una corrida con otros ajustes no reutiliza
+    filas viejas. None si no se puede leer (se procesa siempre).
+    """
+    try:
+        return f"{pdf_content_hash(pdf)}|{settings}"
+    except OSError:
+        return None
+
+def load_checkpoint():
+    """{clave: fila} de PDFs ya procesados en una corrida anterior interrumpida."""
+    done = {}
+    if not CHECKPOINT_FILE.exists(): return done
+    with open(CHECKPOINT_FILE, encoding="utf-8") as f:
+        for ln in f:
+            try:
+                rec = json.loads(ln)
+                done[rec["key"]] = rec["row"]
+            except (ValueError, KeyError):
+                continue  # línea truncada por un corte (o de una versión anterior, sin clave)
+    return done
+
+def append_checkpoint(pairs):
+    with open(CHECKPOINT_FILE, "a", encoding="utf-8") as f:
+        for key, row in pairs:
+            f.write(json.dumps({"key": key, "row": row}, ensure_ascii=False) + "\n")
+
+def corrected_tuples(rows):
+    """Aplica correcciones de referencia a un tramo; retorna (tuplas COLUMNS, nº corregidas)."""
+    df_new = pd.DataFrame(rows, columns=COLUMNS)
+    corrected_count = 0
+    if GEO_UTILS_AVAILABLE:
+        df_corrected = apply_reference_corrections(df_new)
+        # Filas con al menos una celda distinta (mismas columnas/orden: es una copia)
+        changed = df_new.to_numpy(dtype=object) != df_corrected[df_new.columns].to_numpy(dtype=object)
+        corrected_count = int(changed.any(axis=1).sum())
+        if corrected_count > 0:
+            df_new = df_corrected
+    return list(df_new.itertuples(index=False, name=None)), corrected_count
+
+# --------------- Per-PDF worker ---------------
+# DPI con el que se reintenta un PDF cuyo RUT no valida a menor resolución
+FALLBACK_DPI = 200
+
+def ocr_pdf_pages(pdf, ri_folder, dpi, ocr_threads=1, ocr_config=""):
+    """PDF -> imágenes (RI/<pdf>) -> textos por página. None si no hubo imágenes."""
+    images = convert_pdf_to_images(pdf, ri_folder, POPPLER_BIN, dpi=dpi, thread_count=ocr_threads)
+    if not images:
+        return None
+    print(f"  📄 Generadas {len(images)} páginas ({dpi} DPI)")
+    print(f"    🔍 OCR de {len(images)} imágenes")
+    text_pages = []
+    for img, txt in zip(images, ocr_images_batch(images, ri_folder / "pages.txt", threads=ocr_threads, config=ocr_config)):
+        write_debug(f"--- PAGE OCR CC: {img.name} ---")
+        write_debug(txt[:8000])
+        text_pages.append(txt)
+    return text_pages
+
+def rut_is_valid(row):
+    if not row.get("RUT"): return False
+    return rut_dv_ok(row["RUT"], row.get("DV", ""))
+
+def process_one_pdf(pdf, ocr_threads=1, dpi=FALLBACK_DPI, ocr_config=""):
+    """
+    PDF -> imágenes -> OCR -> fila combinada. Limpia RI/<pdf> al terminar.
+    No geocodifica: con --geocode lo hace main() en el proceso principal.
+    Si se usó un DPI menor a FALLBACK_DPI y el RUT no valida, repite a FALLBACK_DPI.
+    Se ejecuta en un proceso hijo cuando hay varios workers: al importar el
+    módulo cada hijo configura su propio tesseract_cmd.
+    Retorna (fila o None si falló, líneas de debug) para que el padre las escriba.
+    """
+    global _DEBUG_CAPTURE
+    _DEBUG_CAPTURE = lines = []
+    print(f"🔄 Procesando PDF: {pdf.name}")
+    ri_folder = TEMP_RI_ROOT / pdf.stem
+    try:
+        text_pages = ocr_pdf_pages(pdf, ri_folder, dpi, ocr_threads, ocr_config)
+        if text_pages is None:
+            print(f"  ❌ ERROR: no se generaron imágenes para {pdf.name}")
+            return None, lines
+
+        row = extract_all_from_text_pages_cc(text_pages)
+        if dpi < FALLBACK_DPI and not rut_is_valid(row):
+            print(f"  🔁 RUT no válido a {dpi} DPI, reintentando a {FALLBACK_DPI} DPI")
+            write_debug(f"[DPI] Reintento {pdf.name} a {FALLBACK_DPI} DPI (RUT {row['RUT']}-{row['DV']})")
+            shutil.rmtree(ri_folder, ignore_errors=True)
+            retry_pages = ocr_pdf_pages(pdf, ri_folder, FALLBACK_DPI, ocr_threads, ocr_config)
+            if retry_pages is not None:
+                row = extract_all_from_text_pages_cc(retry_pages)
+        print(f"  ✅ Extraído: RUT {row['RUT']}-{row['DV']}, {row['NOMBRE']}")
+        return row, lines
+
+    except Exception as e:
+        print(f"  ❌ ERROR procesando {pdf.name}: {str(e)}")
+        write_debug(f"ERROR procesando {pdf.name}: {e}")
+        return None, lines
+    finally:
+        try:
+            if ri_folder.exists(): shutil.rmtree(ri_folder)
+        except Exception as e:
+            write_debug(f"WARNING cleanup {ri_folder}: {e}")
+        _DEBUG_CAPTURE = None
+
 # --------------- Main ---------------
 def main():
     parser = argparse.ArgumentParser(description="Procesar PDFs Itau (CC) -> Excel v5 REAL DATA")
     parser.add_argument("--geocode", action="store_true", help="Intentar geocodificar (Nominatim)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Procesos en paralelo (1 = secuencial; por defecto nº de CPUs)")
+    parser.add_argument("--dpi", type=int, default=150,
+                        help=f"Resolución de rasterizado para OCR (por defecto 150; reintenta a {FALLBACK_DPI} si el RUT no valida)")
+    parser.add_argument("--psm", type=int, default=3, help="Page segmentation mode de Tesseract (por defecto 3)")
     args = parser.parse_args()
     use_geocode = args.geocode
+    ocr_config = f"--psm {args.psm} --oem 1"
 
     print("🚀 Inicio: proceso Itau CC v5 - EXTRACCIÓN REAL DE PDFs")
     DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -564,61 +915,82 @@ def main():
 
     print(f"📁 Encontrados {len(pdfs)} PDFs para procesar")
     
-    all_rows = []
-    for pdf in pdfs:
-        print(f"🔄 Procesando PDF: {pdf.name}")
-        ri_folder = TEMP_RI_ROOT / pdf.stem
-        text_pages = []
-        try:
-            images = convert_pdf_to_images(pdf, ri_folder, POPPLER_BIN, dpi=200)
-            if not images:
-                print(f"  ❌ ERROR: no se generaron imágenes para {pdf.name}")
-                continue
-            
-            print(f"  📄 Generadas {len(images)} páginas")
-            for img in images:
-                print(f"    🔍 OCR imagen: {img.name}")
-                txt = ocr_image_to_text(img)
-                write_debug(f"--- PAGE OCR CC: {img.name} ---")
-                write_debug(txt[:8000])
-                text_pages.append(txt)
-            
-            row = extract_all_from_text_pages_cc(text_pages, use_geocode=use_geocode)
-            all_rows.append(row)
-            print(f"  ✅ Extraído: RUT {row['RUT']}-{row['DV']}, {row['NOMBRE']}")
-            
-        except Exception as e:
-            print(f"  ❌ ERROR procesando {pdf.name}: {str(e)}")
-            write_debug(f"ERROR procesando {pdf.name}: {e}")
-        finally:
-            try:
-                if ri_folder.exists(): shutil.rmtree(ri_folder)
-            except Exception as e:
-                write_debug(f"WARNING cleanup {ri_folder}: {e}")
-
-    if all_rows:
-        df_new = pd.DataFrame(all_rows, columns=COLUMNS)
-        
-        # Aplicar correcciones de referencia si están disponibles
+    workers = max(1, min(args.workers or 1, len(pdfs)))
+    # Hilos de OCR/render por PDF: los núcleos que sobran tras repartir procesos (máx 4)
+    ocr_threads = max(1, min(4, (os.cpu_count() or 1) // workers))
+    if workers > 1 or ocr_threads > 1:
+        # Cada Tesseract en un solo hilo: el paralelismo lo dan procesos/hilos
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    if workers > 1:
+        print(f"⚙️  Procesando con {workers} procesos en paralelo")
+
+    # Reanudar: los PDFs del checkpoint (mismo contenido y ajustes) no se vuelven a OCR-ear
+    settings = f"dpi={args.dpi};psm={args.psm};geocode={int(use_geocode)}"
+    keys = [checkpoint_key(pdf, settings) for pdf in pdfs]
+    done = load_checkpoint()
+    n_done = sum(key in done for key in keys if key is not None)
+    if n_done:
+        print(f"♻️  Reanudando: {n_done} PDFs ya procesados en {CHECKPOINT_FILE}")
+
+    wb, ws = new_results_workbook()
+    summary = []  # (NOMBRE, RUT, DV, COMUNA) por fila escrita
+    corrected_total = 0
+
+    summary_idx = [COLUMNS.index(c) for c in ("NOMBRE", "RUT", "DV", "COMUNA")]
+
+    def emit(rows):
+        nonlocal corrected_total
+        if not rows: return
+        tuples, corrected = corrected_tuples(rows)
+        corrected_total += corrected
+        for t in tuples:
+            ws.append(list(t))
+            summary.append(tuple(t[j] for j in summary_idx))
+
+    ex = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        # Por tramos en el orden de entrada: las filas del checkpoint y las nuevas
+        # quedan en el Excel en el mismo orden que los PDFs
+        for i in range(0, len(pdfs), CHUNK_SIZE):
+            chunk = list(zip(pdfs[i:i + CHUNK_SIZE], keys[i:i + CHUNK_SIZE]))
+            pending = [(pdf, key) for pdf, key in chunk if key is None or key not in done]
+            todo = [pdf for pdf, _ in pending]
+            if ex and len(todo) > 1:
+                results = list(ex.map(process_one_pdf, todo, repeat(ocr_threads),
+                                      repeat(args.dpi), repeat(ocr_config), chunksize=1))
+            else:
+                results = [process_one_pdf(pdf, ocr_threads, args.dpi, ocr_config) for pdf in todo]
+            fresh = {}
+            for (pdf, key), (row, lines) in zip(pending, results):
+                if lines:
+                    write_debug("\n".join(lines))  # un bloque por PDF, en orden
+                if row and use_geocode:
+                    geocode_missing_comuna(row)  # secuencial: respeta 1 request/seg
+                if row:
+                    fresh[pdf] = row
+            append_checkpoint([(key, fresh[pdf]) for pdf, key in pending if key is not None and pdf in fresh])
+            emit([fresh[pdf] if pdf in fresh else done[key] for pdf, key in chunk
+                  if pdf in fresh or (key is not None and key in done)])
+    finally:
+        if ex: ex.shutdown()
+
+    if summary:
         if GEO_UTILS_AVAILABLE:
             print("📋 Aplicando correcciones de referencia...")
-            df_corrected = apply_reference_corrections(df_new)
-            corrected_count = sum(1 for i in range(len(df_new)) 
-                                if df_new.iloc[i].to_dict() != df_corrected.iloc[i].to_dict())
-            if corrected_count > 0:
-                print(f"✅ Aplicadas {corrected_count} correcciones de referencia")
-                df_new = df_corrected
-        
-        df_new.to_excel(OUT_XLSX, index=False)
+            if corrected_total > 0:
+                print(f"✅ Aplicadas {corrected_total} correcciones de referencia")
+        wb.save(str(OUT_XLSX))
+        CHECKPOINT_FILE.unlink(missing_ok=True)
         print(f"✅ Guardado final en: {OUT_XLSX}")
         print(f"📋 Debug info en: {DEBUG_FILE}")
-        print(f"📊 Filas extraídas: {len(all_rows)}")
+        print(f"📊 Filas extraídas: {len(summary)}")
         
         # Mostrar resumen de datos extraídos
         print("\n📄 RESUMEN DE DATOS EXTRAÍDOS:")
-        for i, row in df_new.iterrows():
-            print(f"  Fila {i+1}: {row['NOMBRE']} (RUT: {row['RUT']}-{row['DV']}) - {row['COMUNA']}")
+        for i, (nombre, rut, dv, comuna) in enumerate(summary):
+            print(f"  Fila {i+1}: {nombre} (RUT: {rut}-{dv}) - {comuna}")
     else:
+        CHECKPOINT_FILE.unlink(missing_ok=True)
         print("❌ No se extrajeron filas. Revisa", DEBUG_FILE)
 
 if __name__ == "__main__":
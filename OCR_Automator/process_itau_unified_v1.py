@@ -18,10 +18,18 @@ Características:
 - Salida unificada a outputs/Itau/Itau_results_UNIFIED.xlsx
 """
 
+import os
 import re
 import shutil
+import tempfile
 import argparse
+import atexit
+import hashlib
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
@@ -31,13 +39,44 @@ from pdf2image import convert_from_path
 import difflib
 import requests
 
+# pypdfium2: rasteriza en proceso con PDFium (sin subproceso pdftoppm); pdf2image como respaldo
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+# rapidfuzz (C++) para el fuzzy de comunas; difflib como respaldo
+try:
+    from rapidfuzz import fuzz, process as rf_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+# process.cdist (matriz de puntajes de una vez) necesita numpy
+try:
+    import numpy  # noqa: F401
+    RF_CDIST_AVAILABLE = RAPIDFUZZ_AVAILABLE
+except ImportError:
+    RF_CDIST_AVAILABLE = False
+
+# tesserocr: API de Tesseract en proceso (modelo cargado una sola vez);
+# pytesseract (un subproceso por página) queda como respaldo.
+# Las páginas se paralelizan con hilos: OpenMP de Tesseract a un hilo para no sobre-suscribir
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+try:
+    from tesserocr import PyTessBaseAPI, PSM, OEM
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
 # Importar utilidades de geocodificación y corrección
 try:
     from geocoding_utils import (
         clean_and_fix_address,
         fix_comuna_ocr,
         apply_reference_corrections,
-        validate_rut_dv
+        validate_rut_dv,
+        count_missing,
     )
     GEO_UTILS_AVAILABLE = True
     print("✅ Utilidades de geocodificación cargadas")
@@ -49,6 +88,7 @@ except ImportError:
     def fix_comuna_ocr(comuna): return comuna
     def apply_reference_corrections(df): return df
     def validate_rut_dv(rut: str, dv: str) -> tuple[str, str, bool]: return rut, dv, True
+    def count_missing(df, fields): return {}
 
 # ---------------- CONFIG ----------------
 TESSERACT_EXE = r"C:\Users\cdiaz\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
@@ -56,8 +96,21 @@ POPPLER_BIN = r"C:\poppler\Library\bin"
 PROJECT_ROOT = Path.cwd()
 PDF_INPUT_DIR = PROJECT_ROOT / "pdfs" / "Itau"
 TEMP_RI_ROOT = PROJECT_ROOT / "RI"
+# Páginas rasterizadas por contenido del PDF y DPI (--no-cache la omite). No se
+# limpia sola: se puede borrar en cualquier momento, sólo hace más lenta la próxima corrida.
+# Fuera de RI/: ahí cada PDF usa (y borra) RI/<nombre del PDF>, y un "_cache.pdf" la borraría
+RASTER_CACHE_DIR = PROJECT_ROOT / "RI_cache"
+TEXT_LAYER_MIN_CHARS = 200  # caracteres por página (promedio) para usar la capa de texto sin OCR
+TEXT_LAYER_PAGE_MIN_CHARS = 20  # menos en una página (p. ej. una hoja escaneada): esa página va a OCR
 OUT_DIR = PROJECT_ROOT / "outputs" / "Itau"
 OUT_XLSX = OUT_DIR / "Itau_results_UNIFIED.xlsx"
+TESSDATA_DIR = str(Path(TESSERACT_EXE).parent / "tessdata")
+# Páginas de una columna: PSM 6 (bloque único) evita el análisis de layout y OEM 1
+# usa sólo el LSTM; sin diccionarios del sistema/frecuencias (RUTs, montos, nombres).
+# Para más velocidad se puede reemplazar tessdata/spa.traineddata por el modelo
+# entero de tessdata_fast (spa_fast) conservando el nombre spa.traineddata.
+TESS_VARIABLES = {"load_system_dawg": "0", "load_freq_dawg": "0"}
+TESS_CONFIG = "--psm 6 --oem 1 " + " ".join(f"-c {k}={v}" for k, v in TESS_VARIABLES.items())
 DEBUG_FILE = PROJECT_ROOT / "outputs" / "Itau_debug_unified.txt"
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 USER_AGENT = "OCR-Automator/1.0 (cdiaz@ejemplo.com)"
@@ -71,7 +124,8 @@ try:
     TESSERACT_AVAILABLE = True
     print("✅ Tesseract disponible")
 except Exception as e:
-    TESSERACT_AVAILABLE = False
+    # Sin ejecutable aún puede haber OCR vía tesserocr
+    TESSERACT_AVAILABLE = TESSEROCR_AVAILABLE
     print(f"⚠️ Tesseract no disponible: {e}")
 
 # Columnas unificadas (incluye todos los campos de PP y CC)
@@ -98,65 +152,202 @@ COMUNAS = [
     "PUERTO VARAS","MELIPILLA","BUIN","PAINE","PEÑAFLOR","PENAFLOR","PADRE HURTADO","CAÑETE","CANETE"
 ]
 
+# Para un texto que ya es una comuna, el resultado de la búsqueda por subcadena
+# de fuzzy_comuna (primera comuna de la lista contenida en él o que lo contiene)
+_COMUNA_EXACT = {su: next(c for c in COMUNAS if c in su or su in c) for su in COMUNAS}
+
 MONTHS = {
     'enero':1,'febrero':2,'marzo':3,'abril':4,'mayo':5,'junio':6,
     'julio':7,'agosto':8,'septiembre':9,'setiembre':9,'octubre':10,'noviembre':11,'diciembre':12
 }
 
+# --------------- Regex precompiladas ---------------
+_RE_NON_DIGIT = re.compile(r'[^\d]')
+_RE_DETECT_CUOTAS = re.compile(r'\ben\s+\d+\s+cuotas\b', re.IGNORECASE)
+_RE_DETECT_PAGARE_CC = re.compile(r'pagar[ée]?\s+cr[ée]dito\s+de?\s+consumo', re.IGNORECASE)
+_RE_DETECT_PAGARE = re.compile(r'pagar[ée]|me\s+obligo\s+a\s+pagar', re.IGNORECASE)
+_RE_DETECT_NOMBRE_DEUDOR = re.compile(r'Nombre\s+y\s+Apellidos\s+del\s+deudor', re.IGNORECASE)
+_RE_DETECT_CEDULA = re.compile(r'C[eé]dula\s+de\s+Identidad', re.IGNORECASE)
+_RE_ADDR_NUM = re.compile(r'\d{1,5}')
+_RE_ADDR_WORDS = re.compile(r'\b(CALLE|AVENIDA|AVDA|AV|PJE|PAS|PASAJE|MARINA|CIRCUNVAL|BOULEVARD|BLVD|PROLONGACION|DEPARTAMENTO|DEPTO|DPTO|Nº|N°|LOCAL|EDIF|BLOCK|BLOQUE|BRISAS)\b', re.IGNORECASE)
+_RE_DATE_NUMERIC = re.compile(r'(\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b)')
+# Variantes frecuentes en PP/CC: "a 29 de mayo de 2023", "el día 29 de mayo de 2023",
+# "Santiago, 29 de mayo de 2023" (ciudad opcional al comienzo)
+_RE_DATE_LONG = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'\b(?:en\s+[A-Za-zÁÉÍÓÚÑáéíóúñ]+,?\s*)?a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\bel\s+d[ií]a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+,\s*(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+\s*,?\s*a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\b(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})\b',
+))
+_RE_PRODUCTO_HINT = re.compile(r'Producto\s*[:\-]\s*([A-Z]{1,4})', re.IGNORECASE)
+# Ser tolerantes con el caracter "N°" que suele degradarse como "N?" o "N*"
+_RE_OPERATION = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'N[°º\*\?\W]?\s*(?:Operaci[oó]n|Operación)[:\s]*([0-9]{6,})',
+    r'\b(?:Operaci[oó]n|Operación)\s*N[°º\*\?\W]?\s*([0-9]{6,})',
+    r'N[°º\*\?\W]?\s*Producto[:\s]*([0-9]{6,})',
+    r'\bProducto\s*N[°º\*\?\W]?\s*[:\s]*([0-9]{6,})'
+))
+_RE_DIGIT_RUNS = re.compile(r"(\d{6,})")
+# Los 2 primeros de cada tupla son "día X de mes de año"; el resto dd/mm/yyyy
+_RE_VENC_PRIMERA = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    # Patrón específico encontrado: "primera cuota el día 29 de junio de 2023"
+    r'primera\s+cuota\s+el\s+d[ií]a\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
+    r'venciendo\s+la\s+primera\s+cuota\s+el\s+d[ií]a\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
+    # Patrones adicionales
+    r'(?:primera?\s+cuota|1[aª]?\s+cuota|cuota\s+inicial)[:\s]*(?:vence|vencimiento|fecha)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
+    r'(?:vencimiento|fecha)[:\s]*(?:primera?\s+cuota|1[aª]?\s+cuota)[:\s]*([0-3]?\d[\/\-][0-1]?\d{2}[\/\-](?:20)?\d{2})',
+    r'1[aª]?\s+cuota[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
+    r'(?:del|desde)\s+([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})\s+(?:en\s+adelante|mensual)',
+    r'primera?\s+(?:cuota|pago)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})'
+))
+_RE_VENC_ULTIMA = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    # Patrón específico encontrado: "la última el 29 de mayo de 2028"
+    r'(?:y\s+)?la\s+última\s+el\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
+    r'última\s+cuota\s+el\s+d[ií]a\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
+    # Patrones adicionales
+    r'(?:última?\s+cuota|final\s+cuota|cuota\s+final)[:\s]*(?:vence|vencimiento|fecha)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
+    r'(?:vencimiento|fecha)[:\s]*(?:última?\s+cuota|final\s+cuota)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
+    r'(?:hasta|hasta\s+el)\s+([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
+    r'(?:término|fin|finaliza)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
+    r'última?\s+(?:cuota|pago)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})'
+))
+_RE_DATE_SEPS = re.compile(r'[\/\-\.]')
+_RE_RUT_LABELED = tuple((name, re.compile(pat, re.IGNORECASE), base) for name, pat, base in (
+    # Patrones específicos para PP con "C.L/RUT N*:" (prioridad máxima)
+    ("cl", r'C\.L[\/\\]RUT\s+N\*?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 20),
+    ("cl_sp", r'C\.L\s*\/\s*RUT\s+N\*?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 19),
+    # Patrones específicos para PP con "C.I/RUT N°:"
+    ("ci", r'C\.I[\/\\]RUT\s+N[°º\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 18),
+    ("ci_sp", r'C\.I\s*\/\s*RUT\s+N[°º\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 17),
+    ("ci_rut", r'C\.I\s*\/\s*RUT\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 16),
+    # Variaciones con espacios y separadores
+    ("ci_loose", r'C\s*\.\s*I\s*[\/\\]\s*RUT\s+N[°º\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 15),
+    # Otros patrones de cédula
+    ("cedula", r'C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 12),
+    ("label", r'(?:C\.I\.\/RUT|C\.L\/RUT|RUT)[^:\d]{0,10}[:\s]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 10)
+))
+_RE_RUT_DOTTED = re.compile(r'([0-9]{1,3}(?:\.[0-9]{3}){1,2})\s*[-\s–—]*([0-9Kk])')
+_RE_RUT_PLAIN = re.compile(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])')
+# Todas las anteriores en una sola pasada: cada rama es (?P<rama>(num)(dv)); m.lastindex
+# apunta al grupo de la rama y los dos siguientes son número y DV. Las ramas van de
+# mayor a menor base, así en una misma posición gana la etiqueta más específica.
+_RUT_BRANCHES = _RE_RUT_LABELED + (("dotted", _RE_RUT_DOTTED, 3), ("plain", _RE_RUT_PLAIN, 2))
+_RE_RUTS = re.compile("|".join(f"(?P<{name}>{rx.pattern})" for name, rx, _ in _RUT_BRANCHES), re.IGNORECASE)
+_RUT_BASE = {name: base for name, _, base in _RUT_BRANCHES}
+_RE_OP_CTX = re.compile(r'Operaci[oó]n|Producto', re.IGNORECASE)
+_RE_SUSCRIPTOR = re.compile(r'(Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)', re.IGNORECASE)
+_RE_BANCO_CTX = re.compile(r'\bBanco\b|\bIta[uú]\b|Representado por', re.IGNORECASE)
+_RE_CL_RUT_CTX = re.compile(r'C\.L[\/\\]RUT\s+N\*?\s*:', re.IGNORECASE)
+_RE_CI_RUT_CTX = re.compile(r'C\.I[\/\\]RUT\s+N[°º]', re.IGNORECASE)
+_RE_NOMBRE_LINE = re.compile(r'^(?:Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)[:\.\s-]*(.+)$', re.IGNORECASE)
+_RE_UNICODE_PUNCT = re.compile(r'[\u2000-\u206F\u2E00-\u2E7F]+')
+_RE_DOMICILIO_WORD = re.compile(r'\bDomicilio\b', re.IGNORECASE)
+_RE_DOMICILIO_PP_LINE = re.compile(r'^[^\n]*\bDomicilio\b[^\n]*', re.IGNORECASE | re.MULTILINE)
+# Fin de línea (con espacios previos) más líneas en blanco: deja el texto como las
+# líneas no vacías de splitlines(), sin espacios al final, unidas por '\n'
+_RE_LINE_GAPS = re.compile(r'[^\S\n\r\v\f\x1c-\x1e\x85\u2028\u2029]*[\n\r\v\f\x1c-\x1e\x85\u2028\u2029]\s*')
+_RE_DOMICILIO_COMPETENCIA = re.compile(r'\bDomicilio\b\s*y\s+competencia', re.IGNORECASE)
+_RE_DOMICILIO_TAIL = re.compile(r'\bDomicilio\b\s*[:.\-]*\s*(.*)$', re.IGNORECASE)
+_RE_DIGITS_2_5 = re.compile(r'\d{2,5}')
+_RE_LEGAL_CLAUSE = re.compile(r'competencia|efectos\s+legales', re.IGNORECASE)
+_RE_LEADING_LETTERS = re.compile(r'([A-ZÁÉÍÓÚÑ\s]+)')
+_RE_SPACES = re.compile(r'\s+')
+_RE_IDENT_NOMBRE = re.compile(r'^\s*Nombre\s+y\s+Apellidos\s+del\s+deudor\s*[:]\s*(.+)$', re.IGNORECASE | re.MULTILINE)
+_RE_IDENT_CEDULA = re.compile(r'^\s*C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*:?\s*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])\s*$', re.IGNORECASE | re.MULTILINE)
+_RE_IDENT_DOMICILIO = re.compile(r'^\s*Domicilio\s*[:]\s*(.+)$', re.IGNORECASE | re.MULTILINE)
+_RE_IDENT_DIR_INFO = re.compile(r'^\s*Direcci[oó]n\s+Informativa\s*[:]\s*(.+)$', re.IGNORECASE | re.MULTILINE)
+_RE_IDENT_COMUNA = re.compile(r'^\s*Comuna\s*[:]\s*(.+)$', re.IGNORECASE | re.MULTILINE)
+_RE_AMOUNT = re.compile(r'(?:la\s+suma\s+de|cantidad\s+de)?\s*\$\s*([0-9\.\,]+)', re.IGNORECASE)
+_RE_NAME_CHARS = re.compile(r'[^A-Za-zÁÉÍÓÚÑñ\s]')
+_RE_NAME_ID_MARK = re.compile(r'C[eé]DULA|C\.L|C\.I|ID|CI\.|N[°\*]', re.IGNORECASE)
+_RE_REP1 = re.compile(r'Representante\s*1[:\s\.-]*(.+)', re.IGNORECASE)
+_RE_REP2 = re.compile(r'Representante\s*2[:\s\.-]*(.+)', re.IGNORECASE)
+
 # --------------- Debug helper ---------------
+# write_debug acumula en memoria; flush_debug() escribe todo con un solo open
+# (al terminar cada PDF, al final de main/web y al salir del proceso). Mientras
+# process_one_pdf corre, el debug se junta en _DEBUG_CAPTURE y se devuelve al
+# proceso padre, que es el único que escribe DEBUG_FILE (en el orden de entrada)
+_DEBUG_BUF = []
+_DEBUG_LOCK = threading.Lock()
+_DEBUG_CAPTURE = None
+
 def write_debug(s: str):
-    DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(DEBUG_FILE, "a", encoding="utf-8") as f:
-        f.write(s + "\n")
+    (_DEBUG_BUF if _DEBUG_CAPTURE is None else _DEBUG_CAPTURE).append(s)
+
+def flush_debug():
+    with _DEBUG_LOCK:
+        if not _DEBUG_BUF: return
+        lines = _DEBUG_BUF[:]
+        del _DEBUG_BUF[:len(lines)]
+        DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(DEBUG_FILE, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+atexit.register(flush_debug)
 
 # --------------- Detección de tipo de documento ---------------
+# Indicadores de Pagaré (PP)
+PP_INDICATORS = (
+    "PAGARÉ", "PAGARE", "PAGARÁ", "DOCUMENTO MERCANTIL",
+    "VALOR RECIBIDO", "CONTRAVALOR RECIBIDO", "ME OBLIGO A PAGAR",
+    "VENCIMIENTO"
+)
+
+# Indicadores de Crédito de Consumo (CC)
+CC_INDICATORS = (
+    "CRÉDITO DE CONSUMO", "CREDITO DE CONSUMO", "LÍNEA DE CRÉDITO",
+    "CONTRATO DE MUTUO", "CUOTAS", "TASA DE INTERÉS", "CRONOGRAMA",
+    "TABLA DE DESARROLLO", "PLAN DE PAGOS"
+)
+
 def detect_document_type(text_pages):
     """
     Detecta si es un Pagaré (PP) o Crédito de Consumo (CC) basándose en contenido.
+    Recorre las páginas en orden y se detiene cuando los puntos que aún quedan
+    por sumar ya no pueden cambiar el resultado.
     """
-    combined_text = "\n".join(text_pages)
-    combined_up = combined_text.upper()
-    
-    # Indicadores de Pagaré (PP)
-    pp_indicators = [
-        "PAGARÉ", "PAGARE", "PAGARÁ", "DOCUMENTO MERCANTIL",
-        "VALOR RECIBIDO", "CONTRAVALOR RECIBIDO", "ME OBLIGO A PAGAR",
-        "VENCIMIENTO"
-    ]
-    
-    # Indicadores de Crédito de Consumo (CC)
-    cc_indicators = [
-        "CRÉDITO DE CONSUMO", "CREDITO DE CONSUMO", "LÍNEA DE CRÉDITO",
-        "CONTRATO DE MUTUO", "CUOTAS", "TASA DE INTERÉS", "CRONOGRAMA",
-        "TABLA DE DESARROLLO", "PLAN DE PAGOS"
-    ]
-    
-    pp_score = sum(1 for indicator in pp_indicators if indicator in combined_up)
-    cc_score = sum(1 for indicator in cc_indicators if indicator in combined_up)
-    
-    # Verificar por patrones específicos
-    if re.search(r'\ben\s+\d+\s+cuotas\b', combined_text, re.IGNORECASE):
-        cc_score += 3
-    # Casos especiales: "PAGARE CREDITO CONSUMO" debe contar como CC
-    if re.search(r'pagar[ée]?\s+cr[ée]dito\s+de?\s+consumo', combined_text, re.IGNORECASE):
-        cc_score += 10
-    
-    if re.search(r'pagar[ée]|me\s+obligo\s+a\s+pagar', combined_text, re.IGNORECASE):
-        pp_score += 3
-    
-    # Bloque de identidad CC: señales fuertes en cualquier página
-    if (
-        re.search(r'Nombre\s+y\s+Apellidos\s+del\s+deudor', combined_text, re.IGNORECASE)
-        and re.search(r'C[eé]dula\s+de\s+Identidad', combined_text, re.IGNORECASE)
-    ):
-        cc_score += 4
+    pp_found = set(); cc_found = set()
+    cuotas = pagare_cc = pagare = nombre_deudor = cedula = False
+    prev = None
+    pp_score = cc_score = 0
+    n = 0
+    for n, page in enumerate(text_pages, 1):
+        page_up = page.upper()
+        pp_found.update(ind for ind in PP_INDICATORS if ind not in pp_found and ind in page_up)
+        cc_found.update(ind for ind in CC_INDICATORS if ind not in cc_found and ind in page_up)
+        
+        # Patrones con \s+ pueden cruzar el salto de página: ventana con la página
+        # anterior (y las que un match atravesaría enteras: en blanco o con a lo
+        # sumo las 3 palabras intermedias de un patrón, p.ej. "y Apellidos del")
+        window = page if prev is None else f"{prev}\n{page}"
+        prev = window if prev is not None and len(page.split()) <= 3 else page
+        cuotas = cuotas or bool(_RE_DETECT_CUOTAS.search(window))
+        # Casos especiales: "PAGARE CREDITO CONSUMO" debe contar como CC
+        pagare_cc = pagare_cc or bool(_RE_DETECT_PAGARE_CC.search(window))
+        pagare = pagare or bool(_RE_DETECT_PAGARE.search(window))
+        # Bloque de identidad CC: señales fuertes en cualquier página
+        nombre_deudor = nombre_deudor or bool(_RE_DETECT_NOMBRE_DEUDOR.search(window))
+        cedula = cedula or bool(_RE_DETECT_CEDULA.search(window))
+        
+        pp_score = len(pp_found) + (3 if pagare else 0)
+        cc_score = (len(cc_found) + (3 if cuotas else 0) + (10 if pagare_cc else 0)
+                    + (4 if nombre_deudor and cedula else 0))
+        # Máximo alcanzable por cada tipo con lo que falta por encontrar
+        pp_max = pp_score + len(PP_INDICATORS) - len(pp_found) + (0 if pagare else 3)
+        cc_max = (cc_score + len(CC_INDICATORS) - len(cc_found) + (0 if cuotas else 3)
+                  + (0 if pagare_cc else 10) + (0 if nombre_deudor and cedula else 4))
+        if pp_score > cc_max or cc_score >= pp_max:
+            break
     
     doc_type = "PP" if pp_score > cc_score else "CC"
-    write_debug(f"[DETECT] PP_score={pp_score}, CC_score={cc_score} -> {doc_type}")
+    write_debug(f"[DETECT] PP_score={pp_score}, CC_score={cc_score} -> {doc_type} (páginas {n}/{len(text_pages)})")
     
     return doc_type
 
 # --------------- Utilidades comunes ---------------
+@lru_cache(maxsize=4096)
 def fmt_date(d, mname, y):
     m = MONTHS.get((mname or "").strip().lower())
     if not m: return ""
@@ -172,42 +363,38 @@ def format_thousands_dot(n):
 def normalize_token(tok): 
     return tok.strip().strip(" .,:;").upper()
 
+@lru_cache(maxsize=4096)
 def fuzzy_comuna(s):
     su = normalize_token(s)
     su = fix_n_to_ene(su)
     if not su: return ""
-    # Exact match
+    # Exact match (texto que ya es una comuna: resultado precalculado)
+    hit = _COMUNA_EXACT.get(su)
+    if hit: return hit
     for c in COMUNAS:
         if c in su or su in c:
             return c
     # Fuzzy match
-    best = difflib.get_close_matches(su, COMUNAS, n=1, cutoff=0.72)
-    return best[0] if best else su
+    return closest_comuna(su, cutoff=72) or su
 
 def looks_like_physical_address(s):
     if not s: return False
-    if re.search(r'\d{1,5}', s): return True
-    return bool(re.search(r'\b(CALLE|AVENIDA|AVDA|AV|PJE|PAS|PASAJE|MARINA|CIRCUNVAL|BOULEVARD|BLVD|PROLONGACION|DEPARTAMENTO|DEPTO|DPTO|Nº|N°|LOCAL|EDIF|BLOCK|BLOQUE|BRISAS)\b', s, re.IGNORECASE))
+    if _RE_ADDR_NUM.search(s): return True
+    return bool(_RE_ADDR_WORDS.search(s))
 
 # --------------- Fechas ---------------
+# Recibe textos de página completos: caché acotada para no retener demasiadas páginas
+@lru_cache(maxsize=256)
 def parse_spanish_date(text):
     t = text.replace('\n',' ')
-    m = re.search(r'(\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b)', t)
+    m = _RE_DATE_NUMERIC.search(t)
     if m:
         s = m.group(1).replace('-', '/')
         for fmt in ("%d/%m/%Y","%d/%m/%y"):
             try: return datetime.strptime(s, fmt).strftime("%d-%m-%Y")
             except: pass
-    # Variantes frecuentes en PP/CC: "a 29 de mayo de 2023", "el día 29 de mayo de 2023",
-    # "Santiago, 29 de mayo de 2023" (ciudad opcional al comienzo)
-    for pat in [
-        r'\b(?:en\s+[A-Za-zÁÉÍÓÚÑáéíóúñ]+,?\s*)?a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\bel\s+d[ií]a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+,\s*(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+\s*,?\s*a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\b(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})\b',
-    ]:
-        m = re.search(pat, t, re.IGNORECASE)
+    for pat in _RE_DATE_LONG:
+        m = pat.search(t)
         if m:
             return fmt_date(m.group(1), m.group(2), m.group(3))
     return ""
@@ -215,28 +402,26 @@ def parse_spanish_date(text):
 # --------------- Producto (hints) ---------------
 def extract_producto_hint(text: str) -> str:
     """Busca indicaciones de producto en el texto (p.ej., 'Producto: TC')."""
-    m = re.search(r'Producto\s*[:\-]\s*([A-Z]{1,4})', text, re.IGNORECASE)
+    m = _RE_PRODUCTO_HINT.search(text)
     if m:
         return m.group(1).upper().strip()
     return ""
 
 # --------------- Operación ---------------
 def extract_operation_from_text(text):
-    # Ser tolerantes con el caracter "N°" que suele degradarse como "N?" o "N*"
-    for pat in [
-        r'N[°º\*\?\W]?\s*(?:Operaci[oó]n|Operación)[:\s]*([0-9]{6,})',
-        r'\b(?:Operaci[oó]n|Operación)\s*N[°º\*\?\W]?\s*([0-9]{6,})',
-        r'N[°º\*\?\W]?\s*Producto[:\s]*([0-9]{6,})',
-        r'\bProducto\s*N[°º\*\?\W]?\s*[:\s]*([0-9]{6,})'
-    ]:
-        m = re.search(pat, text, re.IGNORECASE)
+    for pat in _RE_OPERATION:
+        m = pat.search(text)
         if m: return m.group(1).strip()
     return ""
 
 def extract_operation_allpages(text_pages):
+    return first_page_value(extract_operation_from_text, text_pages)
+
+def first_page_value(extract, text_pages):
+    """Primer valor no vacío de extract(texto) recorriendo las páginas en orden."""
     for t in text_pages:
-        op = extract_operation_from_text(t)
-        if op: return op
+        value = extract(t)
+        if value: return value
     return ""
 
 def extract_operation_from_filename(filename: str) -> str:
@@ -251,7 +436,7 @@ def extract_operation_from_filename(filename: str) -> str:
     except Exception:
         stem = filename
     # Buscar todos los grupos de dígitos
-    nums = re.findall(r"(\d{6,})", stem)
+    nums = _RE_DIGIT_RUNS.findall(stem)
     if not nums:
         return ""
     # Devolver el más largo; si empatan, el primero
@@ -261,20 +446,8 @@ def extract_operation_from_filename(filename: str) -> str:
 # --------------- Fechas de Vencimiento ---------------
 def extract_fecha_vencimiento_primera_cuota(text):
     """Extrae fecha de vencimiento de la primera cuota"""
-    patterns = [
-        # Patrón específico encontrado: "primera cuota el día 29 de junio de 2023"
-        r'primera\s+cuota\s+el\s+d[ií]a\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
-        r'venciendo\s+la\s+primera\s+cuota\s+el\s+d[ií]a\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
-        # Patrones adicionales
-        r'(?:primera?\s+cuota|1[aª]?\s+cuota|cuota\s+inicial)[:\s]*(?:vence|vencimiento|fecha)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
-        r'(?:vencimiento|fecha)[:\s]*(?:primera?\s+cuota|1[aª]?\s+cuota)[:\s]*([0-3]?\d[\/\-][0-1]?\d{2}[\/\-](?:20)?\d{2})',
-        r'1[aª]?\s+cuota[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
-        r'(?:del|desde)\s+([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})\s+(?:en\s+adelante|mensual)',
-        r'primera?\s+(?:cuota|pago)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})'
-    ]
-    
-    for i, pat in enumerate(patterns):
-        m = re.search(pat, text, re.IGNORECASE)
+    for i, pat in enumerate(_RE_VENC_PRIMERA):
+        m = pat.search(text)
         if m:
             if i < 2:  # Patrones con formato "día X de mes de año"
                 day = m.group(1)
@@ -292,20 +465,8 @@ def extract_fecha_vencimiento_primera_cuota(text):
 
 def extract_fecha_vencimiento_ultima_cuota(text):
     """Extrae fecha de vencimiento de la última cuota"""
-    patterns = [
-        # Patrón específico encontrado: "la última el 29 de mayo de 2028"
-        r'(?:y\s+)?la\s+última\s+el\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
-        r'última\s+cuota\s+el\s+d[ií]a\s+(\d{1,2})\s+de\s+([a-záéíóúñ]+)\s+de\s+(\d{4})',
-        # Patrones adicionales
-        r'(?:última?\s+cuota|final\s+cuota|cuota\s+final)[:\s]*(?:vence|vencimiento|fecha)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
-        r'(?:vencimiento|fecha)[:\s]*(?:última?\s+cuota|final\s+cuota)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
-        r'(?:hasta|hasta\s+el)\s+([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
-        r'(?:término|fin|finaliza)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})',
-        r'última?\s+(?:cuota|pago)[:\s]*([0-3]?\d[\/\-][0-1]?\d[\/\-](?:20)?\d{2})'
-    ]
-    
-    for i, pat in enumerate(patterns):
-        m = re.search(pat, text, re.IGNORECASE)
+    for i, pat in enumerate(_RE_VENC_ULTIMA):
+        m = pat.search(text)
         if m:
             if i < 2:  # Patrones con formato "día X de mes de año"
                 day = m.group(1)
@@ -321,13 +482,14 @@ def extract_fecha_vencimiento_ultima_cuota(text):
                     return fecha_norm
     return ""
 
+@lru_cache(maxsize=4096)
 def normalize_date_format(fecha_str):
     """Normaliza formato de fecha a DD-MM-YYYY"""
     if not fecha_str:
         return ""
     
     # Limpiar y normalizar separadores
-    fecha_clean = re.sub(r'[\/\-\.]', '/', fecha_str.strip())
+    fecha_clean = _RE_DATE_SEPS.sub('/', fecha_str.strip())
     
     # Intentar varios formatos
     for fmt in ("%d/%m/%Y", "%d/%m/%y", "%Y/%m/%d", "%m/%d/%Y"):
@@ -339,6 +501,7 @@ def normalize_date_format(fecha_str):
     
     return ""
 
+@lru_cache(maxsize=4096)
 def format_spanish_date(day, month_name, year):
     """Convierte fecha en español (día, nombre_mes, año) a formato DD-MM-YYYY"""
     month_map = {
@@ -358,6 +521,58 @@ def format_spanish_date(day, month_name, year):
         return ""
 
 # --------------- Corrección N por Ñ ---------------
+# Correcciones comunes N -> Ñ (palabra en mayúsculas -> reemplazo)
+_ENE_MAP = {
+    # Apellidos comunes
+    'PENA': 'PEÑA',
+    'MUNOZ': 'MUÑOZ',
+    'NUNEZ': 'NUÑEZ',
+    'IBANEZ': 'IBAÑEZ',
+    'YANEZ': 'YÁÑEZ',
+    'ACUNA': 'ACUÑA',
+    'ARGANARAZ': 'ARGAÑARAZ',
+    'ZUNIGA': 'ZÚÑIGA',
+    'NIGON': 'ÑIGÓN',
+    'VICUNA': 'VICUÑA',
+    'NIQUEN': 'ÑIQUÉN',
+    'ARANA': 'ARAÑA',
+    'ARANO': 'ARAÑO',
+    'MONTANA': 'MONTAÑA',
+    'CASTANEDA': 'CASTAÑEDA',
+    'ESPINOSA': 'ESPINOZA',
+    # Nombres comunes
+    'NINO': 'NIÑO',
+    'NINA': 'NIÑA',
+    'INIGO': 'IÑIGO',
+    'INAKI': 'IÑAKI',
+    'MANE': 'MAÑE', 'MANUE': 'MAÑE',
+    # Lugares comunes
+    'ESPANA': 'ESPAÑA',
+    'VINA DEL MAR': 'VIÑA DEL MAR',
+    'PENALOLEN': 'PEÑALOLÉN',
+    'PENAFLOR': 'PEÑAFLOR',
+    'PENALBA': 'PEÑALBA',
+    'NUNOA': 'ÑUÑOA',
+    'NUBLE': 'ÑUBLE',
+    'NANCUL': 'ÑANCUL',
+    'NACULEO': 'ÑACULEO',
+    'NICULIPE': 'ÑACULIPE',
+    'SAN NICASIO': 'SAN IGNACIO',
+    # Términos legales/comerciales
+    'SENOR': 'SEÑOR',
+    'SENORA': 'SEÑORA',
+    'DUENO': 'DUEÑO',
+    'ANO': 'AÑO',
+    'ANOS': 'AÑOS',
+}
+# Todas las palabras en una sola alternación (un solo recorrido del texto);
+# en las de varias palabras el espacio admite cualquier separación
+_RE_ENE = re.compile(r'\b(?:' + '|'.join(re.escape(k).replace(r'\ ', r'\s+') for k in _ENE_MAP) + r')\b', re.IGNORECASE)
+
+def _ene_replacement(m):
+    word = m.group(0)
+    return _ENE_MAP.get(_RE_SPACES.sub(' ', word.upper()), word)
+
 def fix_n_to_ene(text):
     """
     Corrige N por Ñ en palabras comunes donde corresponda
@@ -365,96 +580,22 @@ def fix_n_to_ene(text):
     if not text:
         return text
     
-    # Diccionario de correcciones comunes N -> Ñ (solo strings)
-    corrections = {
-        # Apellidos comunes
-        r'\bPENA\b': 'PEÑA',
-        r'\bMUNOZ\b': 'MUÑOZ', 
-        r'\bNUNEZ\b': 'NÚÑEZ', r'\bNUNEZ\b': 'NUÑEZ',  # aceptar ambas acentuaciones comunes
-        r'\bIBANEZ\b': 'IBAÑEZ',
-        r'\bYANEZ\b': 'YÁÑEZ',
-        r'\bACUNA\b': 'ACUÑA',
-        r'\bARGANARAZ\b': 'ARGAÑARAZ',
-        r'\bZUNIGA\b': 'ZÚÑIGA',
-        r'\bNIGON\b': 'ÑIGÓN',
-        r'\bVICUNA\b': 'VICUÑA',
-        r'\bNIQUEN\b': 'ÑIQUÉN',
-        r'\bARANA\b': 'ARAÑA',
-        r'\bARANO\b': 'ARAÑO',
-        r'\bMONTANA\b': 'MONTAÑA',
-        r'\bCASTANEDA\b': 'CASTAÑEDA',
-        r'\bESPINOSA\b': 'ESPINOZA',
-        
-        # Nombres comunes
-    r'\bNINO\b': 'NIÑO', r'\bNINO\s*\(NOMBRE\)\b': 'NIÑO (NOMBRE)',
-        r'\bNINA\b': 'NIÑA',
-    r'\bINIGO\b': 'IÑIGO',
-    r'\bINAKI\b': 'IÑAKI',
-    r'\bMANE\b': 'MAÑE', r'\bMANUE\b': 'MAÑE',
-        
-        # Lugares comunes
-    r'\bESPANA\b': 'ESPAÑA',
-        r'\bVINA\s+DEL\s+MAR\b': 'VIÑA DEL MAR',
-        r'\bPENALOLEN\b': 'PEÑALOLÉN',
-        r'\bPENAFLOR\b': 'PEÑAFLOR',
-    r'\bPENALBA\b': 'PEÑALBA',
-    r'\bNUNOA\b': 'ÑUÑOA', r'\bNUNOA\s*\(COMUNA\)\b': 'ÑUÑOA (COMUNA)',
-    r'\bNUBLE\b': 'ÑUBLE',
-    r'\bNANCUL\b': 'ÑANCUL',
-    r'\bNACULEO\b': 'ÑACULEO',
-    r'\bNICULIPE\b': 'ÑACULIPE',
-    r'\bSAN\s+NICASIO\b': 'SAN IGNACIO',
-        
-        # Términos legales/comerciales
-        r'\bSENOR\b': 'SEÑOR',
-        r'\bSENORA\b': 'SEÑORA',
-        r'\bDUENO\b': 'DUEÑO',
-        r'\bANO\b': 'AÑO',
-        r'\bANOS\b': 'AÑOS'
-    }
-    
-    result = text
-    
-    for pattern, replacement in corrections.items():
-        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-    
-    return result
+    return _RE_ENE.sub(_ene_replacement, text)
 
 # --------------- RUT ---------------
 def find_all_ruts(text):
     matches = []
-    # Etiquetados (Cédula / RUT) - Priorizando patrones específicos de PP
-    for pat, base in [
-        # Patrones específicos para PP con "C.L/RUT N*:" (prioridad máxima)
-        (r'C\.L[\/\\]RUT\s+N\*?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 20),
-        (r'C\.L\s*\/\s*RUT\s+N\*?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 19),
-        # Patrones específicos para PP con "C.I/RUT N°:"
-        (r'C\.I[\/\\]RUT\s+N[°º\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 18),
-        (r'C\.I\s*\/\s*RUT\s+N[°º\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 17),
-        (r'C\.I\s*\/\s*RUT\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 16),
-        # Variaciones con espacios y separadores
-        (r'C\s*\.\s*I\s*[\/\\]\s*RUT\s+N[°º\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 15),
-        # Otros patrones de cédula
-        (r'C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*[:\s]+([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 12),
-        (r'(?:C\.I\.\/RUT|C\.L\/RUT|RUT)[^:\d]{0,10}[:\s]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 10)
-    ]:
-        for m in re.finditer(pat, text, re.IGNORECASE):
-            start = m.start(1)
-            matches.append((start, re.sub(r'[^\d]', '', m.group(1)), m.group(2).upper(), text[max(0,start-80):start+120], base))
-    # Genéricos
-    for m in re.finditer(r'([0-9]{1,3}(?:\.[0-9]{3}){1,2})\s*[-\s–—]*([0-9Kk])', text):
-        start = m.start(1)
-        ctx = text[max(0,start-80):start+120]
-        # Evitar capturar números cercanos a 'Operación' o 'Producto' como RUT
-        if re.search(r'Operaci[oó]n|Producto', ctx, re.IGNORECASE):
-            continue
-        matches.append((start, re.sub(r'[^\d]', '', m.group(1)), m.group(2).upper(), ctx, 3))
-    for m in re.finditer(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])', text):
-        start = m.start(1)
+    for m in _RE_RUTS.finditer(text):
+        g = m.lastindex
+        start = m.start(g + 1)
         ctx = text[max(0,start-80):start+120]
-        if re.search(r'Operaci[oó]n|Producto', ctx, re.IGNORECASE):
+        base = _RUT_BASE[m.lastgroup]
+        # Evitar capturar números cercanos a 'Operación' o 'Producto' como RUT (genéricos)
+        if base <= 3 and _RE_OP_CTX.search(ctx):
             continue
-        matches.append((start, m.group(1), m.group(2).upper(), ctx, 2))
+        matches.append((start, _RE_NON_DIGIT.sub('', m.group(g + 1)), m.group(g + 2).upper(), ctx, base))
+    # Mismo orden que las pasadas separadas (etiquetados por prioridad, luego genéricos): importa en empates
+    matches.sort(key=lambda x: -x[4])
     return matches
 
 def choose_rut_for_doc(text, ruts, doc_type="CC"):
@@ -466,9 +607,9 @@ def choose_rut_for_doc(text, ruts, doc_type="CC"):
     """
     if not ruts: return "", ""
     
-    sus = re.search(r'(Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)', text, re.IGNORECASE)
+    sus = _RE_SUSCRIPTOR.search(text)
     sus_pos = sus.start() if sus else None
-    banco_pat = re.compile(r'\bBanco\b|\bIta[uú]\b|Representado por', re.IGNORECASE)
+    banco_pat = _RE_BANCO_CTX
     
     best = None; best_score = -1
     for (pos, rut, dv, ctx, base) in ruts:
@@ -488,13 +629,13 @@ def choose_rut_for_doc(text, ruts, doc_type="CC"):
             if base >= 15:  # Patrones específicos C.I/RUT N°:
                 score += 25
             # Buscar patrón específico C.L/RUT que aparece en PP
-            if re.search(r'C\.L[\/\\]RUT\s+N\*?\s*:', ctx, re.IGNORECASE):
+            if _RE_CL_RUT_CTX.search(ctx):
                 score += 30
             # Para pagarés, priorizar RUTs cerca de "Suscriptor"
             if sus_pos is not None:
                 score += max(0, 300 - abs(pos - sus_pos)) // 10
             # Buscar contexto específico de PP
-            if re.search(r'C\.I[\/\\]RUT\s+N[°º]', ctx, re.IGNORECASE):
+            if _RE_CI_RUT_CTX.search(ctx):
                 score += 20
         else:
             # Para CC, priorizar bloques de identidad
@@ -513,40 +654,47 @@ def choose_rut_for_doc(text, ruts, doc_type="CC"):
 def extract_nombre_generic(text):
     lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
     for i, ln in enumerate(lines):
-        m = re.match(r'^(?:Suscriptor(?:\s+o\s+Deudor)?|Deudor|Cliente\/Deudor)[:\.\s-]*(.+)$', ln, re.IGNORECASE)
+        m = _RE_NOMBRE_LINE.match(ln)
         if m:
             name = (m.group(1) or "").strip()
             return (name or (lines[i+1].strip() if i+1 < len(lines) else "")).upper()
     return ""
 
 # --------------- Dirección/Comuna (lógica PP mejorada) ---------------
+def _line_at(text, pos):
+    """Línea de text que empieza en pos (sin el salto)."""
+    end = text.find("\n", pos)
+    return text[pos:] if end < 0 else text[pos:end]
+
 def extract_domicilio_and_comuna_pp(text):
     """
     Lógica especializada para Pagarés con puntuación mejorada.
     """
-    lines_raw = [ln.rstrip() for ln in text.splitlines() if ln.strip()]
-    lines = [re.sub(r'[\u2000-\u206F\u2E00-\u2E7F]+', ' ', ln) for ln in lines_raw]
+    # Líneas no vacías unidas por '\n' y puntuación unicode a espacio, en C
+    joined = _RE_UNICODE_PUNCT.sub(' ', _RE_LINE_GAPS.sub("\n", text).strip())
 
     # Recolectar candidatos 'Domicilio' evitando 'y competencia'
     candidates = []
-    for i, ln in enumerate(lines):
-        if not re.search(r'\bDomicilio\b', ln, re.IGNORECASE):
-            continue
-        if re.search(r'\bDomicilio\b\s*y\s+competencia', ln, re.IGNORECASE):
+    for m in _RE_DOMICILIO_PP_LINE.finditer(joined):
+        ln = m.group(0)
+        if _RE_DOMICILIO_COMPETENCIA.search(ln):
             continue  # evitar cláusula legal
+        i = joined.count("\n", 0, m.start())
         
-        m = re.search(r'\bDomicilio\b\s*[:.\-]*\s*(.*)$', ln, re.IGNORECASE)
-        tail = (m.group(1) if m else "").strip()
+        t = _RE_DOMICILIO_TAIL.search(ln)
+        tail = (t.group(1) if t else "").strip()
         ext = tail
         
-        if (len(ext) < 6 or ',' not in ext) and i+1 < len(lines) and looks_like_physical_address(lines[i+1]):
-            ext = (ext + " " + lines[i+1].strip()).strip()
+        if (len(ext) < 6 or ',' not in ext) and m.end() < len(joined):
+            nxt = _line_at(joined, m.end() + 1)
+            if looks_like_physical_address(nxt):
+                ext = (ext + " " + nxt.strip()).strip()
         
         score = 0
         if ',' in ext: score += 3
-        if re.search(r'\d{2,5}', ext): score += 3
+        if _RE_DIGITS_2_5.search(ext): score += 3
         if looks_like_physical_address(ext): score += 2
-        if re.search(r'competencia|efectos\s+legales', ext, re.IGNORECASE): score -= 5
+        if _RE_LEGAL_CLAUSE.search(ext): score -= 5
         
         candidates.append((score, i, ext))
         write_debug(f"[DOM_PP] candidate score={score} line={i} text='{ext}'")
@@ -563,26 +711,43 @@ def extract_domicilio_and_comuna_pp(text):
     
     return "", ""
 
+def closest_comuna(s, cutoff=70):
+    """Comuna más parecida a s con similitud >= cutoff (0-100), o ""."""
+    if RAPIDFUZZ_AVAILABLE:
+        best = rf_process.extractOne(s, COMUNAS, scorer=fuzz.ratio, score_cutoff=cutoff)
+        return best[0] if best else ""
+    best = difflib.get_close_matches(s, COMUNAS, n=1, cutoff=cutoff / 100)
+    return best[0] if best else ""
+
+@lru_cache(maxsize=4096)
 def clean_comuna_tail(tail):
     """
     Limpia y normaliza el final de una dirección que debería contener la comuna.
     """
     t = normalize_token(tail)
     # Extraer solo letras y espacios
-    m = re.match(r'([A-ZÁÉÍÓÚÑ\s]+)', t)
-    cand = re.sub(r'\s+', ' ', (m.group(1).strip() if m else t))
+    m = _RE_LEADING_LETTERS.match(t)
+    cand = _RE_SPACES.sub(' ', (m.group(1).strip() if m else t))
     
     # Fuzzy matching con comunas válidas
-    best = difflib.get_close_matches(cand, COMUNAS, n=1, cutoff=0.7)
-    if best: return best[0]
+    best = closest_comuna(cand)
+    if best: return best
     
     # Buscar por segmentos de palabras
     words = cand.split()
+    if RF_CDIST_AVAILABLE:
+        # Todos los segmentos contra todas las comunas en una llamada; gana el
+        # primer segmento con alguna comuna >= 70 y, en él, la de mayor puntaje
+        segs = [" ".join(words[k:k+n]) for n in (3, 2, 1) for k in range(len(words)-n+1)]
+        if not segs: return cand
+        scores = rf_process.cdist(segs, COMUNAS, scorer=fuzz.ratio, score_cutoff=70, dtype="float64")
+        hits = (scores.max(axis=1) > 0).nonzero()[0]
+        return COMUNAS[int(scores[hits[0]].argmax())] if len(hits) else cand
     for n in [3,2,1]:
         for k in range(len(words)-n+1):
             seg = " ".join(words[k:k+n])
-            best = difflib.get_close_matches(seg, COMUNAS, n=1, cutoff=0.7)
-            if best: return best[0]
+            best = closest_comuna(seg)
+            if best: return best
     
     return cand
 
@@ -594,25 +759,25 @@ def extract_cc_identity_block(text_pages):
     ident = {"name":"","rut":"","dv":"","address":"","comuna":"","ok":False}
     for page_idx, text in enumerate(text_pages, start=1):
         # Nombre
-        mname = re.search(r'^\s*Nombre\s+y\s+Apellidos\s+del\s+deudor\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+        mname = _RE_IDENT_NOMBRE.search(text)
         if mname and not ident["name"]:
             ident["name"] = mname.group(1).strip().upper()
         
         # Cédula
-        mrut = re.search(r'^\s*C[eé]dula\s+de\s+Identidad\s*N[°\*]?\s*:?\s*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])\s*$', text, re.IGNORECASE | re.MULTILINE)
+        mrut = _RE_IDENT_CEDULA.search(text)
         if mrut and not ident["rut"]:
-            ident["rut"] = re.sub(r'[^\d]', '', mrut.group(1))
+            ident["rut"] = _RE_NON_DIGIT.sub('', mrut.group(1))
             ident["dv"] = mrut.group(2).upper()
         
         # Domicilio
-        mdom = re.search(r'^\s*Domicilio\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+        mdom = _RE_IDENT_DOMICILIO.search(text)
         if mdom and not ident["address"]:
             cand = mdom.group(1).strip()
             if not is_bank_header_line(cand):
                 ident["address"] = cand.upper()
         # Dirección Informativa (muchos CC)
         if not ident["address"]:
-            minfo = re.search(r'^\s*Direcci[oó]n\s+Informativa\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+            minfo = _RE_IDENT_DIR_INFO.search(text)
             if minfo:
                 cand = minfo.group(1).strip()
                 if not is_bank_header_line(cand):
@@ -625,7 +790,7 @@ def extract_cc_identity_block(text_pages):
                         ident["address"] = cand.upper()
         
         # Comuna
-        mcom = re.search(r'^\s*Comuna\s*[:]\s*(.+)$', text, re.IGNORECASE | re.MULTILINE)
+        mcom = _RE_IDENT_COMUNA.search(text)
         if mcom and not ident["comuna"]:
             ident["comuna"] = fuzzy_comuna(mcom.group(1))
     
@@ -646,8 +811,8 @@ def is_bank_header_line(s: str) -> bool:
 # --------------- Montos ---------------
 def extract_amount(text):
     candidates = []
-    for m in re.finditer(r'(?:la\s+suma\s+de|cantidad\s+de)?\s*\$\s*([0-9\.\,]+)', text, re.IGNORECASE):
-        raw = m.group(1); clean = re.sub(r'[^\d]', '', raw)
+    for m in _RE_AMOUNT.finditer(text):
+        raw = m.group(1); clean = _RE_NON_DIGIT.sub('', raw)
         num = int(clean) if clean.isdigit() else None
         ctx = text[max(0, m.start()-80): m.end()+80].lower()
         score = 10 if ('la suma de' in ctx or 'cantidad de' in ctx) else 0
@@ -661,49 +826,272 @@ def extract_amount(text):
 # --------------- Representantes ---------------
 def is_name_candidate(s):
     if not s: return False
-    s_clean = re.sub(r'[^A-Za-zÁÉÍÓÚÑñ\s]', '', s).strip()
+    s_clean = _RE_NAME_CHARS.sub('', s).strip()
     if len(s_clean) < 4: return False
-    if re.search(r'C[eé]DULA|C\.L|C\.I|ID|CI\.|N[°\*]', s, re.IGNORECASE): return False
+    if _RE_NAME_ID_MARK.search(s): return False
     return len(s_clean.split()) >= 2
 
 def extract_representantes_allpages(text_pages):
     rep1 = rep2 = ""
     for text in text_pages:
-        m1 = re.search(r'Representante\s*1[:\s\.-]*(.+)', text, re.IGNORECASE)
+        m1 = _RE_REP1.search(text)
         if m1:
             cand = m1.group(1).splitlines()[0].strip()
             if is_name_candidate(cand): rep1 = cand.upper()
-        m2 = re.search(r'Representante\s*2[:\s\.-]*(.+)', text, re.IGNORECASE)
+        m2 = _RE_REP2.search(text)
         if m2:
             cand = m2.group(1).splitlines()[0].strip()
             if is_name_candidate(cand): rep2 = cand.upper()
     return rep1, rep2
 
 # --------------- OCR helpers ---------------
+_tess_local = threading.local()
+_OCR_POOL = None
+OCR_THREADS = os.cpu_count() or 1
+OCR_LIST_MAX = 50  # imágenes por invocación de Tesseract con lista (respaldo pytesseract)
+
+def get_tess_api():
+    """API tesserocr del hilo actual, creada en el primer uso (None si no se puede)."""
+    global TESSEROCR_AVAILABLE
+    api = getattr(_tess_local, "api", None)
+    if api is None and TESSEROCR_AVAILABLE:
+        try:
+            api = _tess_local.api = PyTessBaseAPI(path=TESSDATA_DIR, lang='spa', psm=PSM.SINGLE_BLOCK,
+                                                  oem=OEM.LSTM_ONLY, variables=TESS_VARIABLES)
+            atexit.register(api.End)
+        except Exception as e:
+            TESSEROCR_AVAILABLE = False
+            write_debug(f"⚠️ tesserocr no disponible, se usa pytesseract: {e}")
+    return api
+
+def ocr_pages(images):
+    """
+    OCR de varias páginas en paralelo, en el orden de entrada. tesserocr suelta
+    el GIL y pytesseract corre en subprocesos, así que los hilos escalan. El pool
+    es del módulo para que cada hilo reutilice su API entre PDFs.
+    """
+    global _OCR_POOL
+    if len(images) <= 1 or (OCR_THREADS <= 1 and TESSEROCR_AVAILABLE):
+        return [ocr_image_to_text(img) for img in images]
+    if _OCR_POOL is None:
+        _OCR_POOL = ThreadPoolExecutor(max_workers=OCR_THREADS)
+    if TESSEROCR_AVAILABLE:
+        return list(_OCR_POOL.map(ocr_image_to_text, images))
+    # pytesseract: tramos contiguos de páginas, un Tesseract con lista por tramo
+    size = min(OCR_LIST_MAX, -(-len(images) // OCR_THREADS))  # ceil
+    chunks = [images[i:i + size] for i in range(0, len(images), size)]
+    return [txt for part in _OCR_POOL.map(_ocr_images_chunk, chunks) for txt in part]
+
+def _ocr_images_chunk(images):
+    """
+    OCR de varias imágenes en una sola invocación de Tesseract: recibe un .txt
+    con una ruta por línea y separa las páginas por '\f'. Si falla o no cuadra
+    el número de páginas, vuelve a OCR imagen por imagen.
+    """
+    if len(images) > 1 and TESSERACT_AVAILABLE:
+        list_path = None
+        try:
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+                f.write("\n".join(str(Path(img).resolve()) for img in images) + "\n")
+                list_path = f.name
+            pages = pytesseract.image_to_string(list_path, lang='spa', config=TESS_CONFIG).split("\f")
+            # Tesseract termina cada página con '\f': sobra un último trozo vacío
+            if len(pages) == len(images) + 1 and not pages[-1].strip():
+                pages.pop()
+            if len(pages) == len(images):
+                return pages
+            write_debug(f"WARNING OCR batch: {len(pages)} páginas para {len(images)} imágenes")
+        except Exception as e:
+            write_debug(f"WARNING OCR batch: {e}")
+        finally:
+            if list_path:
+                os.unlink(list_path)
+    return [ocr_image_to_text(img) for img in images]
+
 def ocr_image_to_text(img_path):
     if not TESSERACT_AVAILABLE:
         write_debug(f"⚠️ Tesseract no disponible para {img_path}")
         return ""
     try: 
-        img = Image.open(img_path)
-        return pytesseract.image_to_string(img, lang='spa')
+        api = get_tess_api()
+        with Image.open(img_path) as img:
+            if api is not None:
+                api.SetImage(img)
+                return api.GetUTF8Text()
+            return pytesseract.image_to_string(img, lang='spa', config=TESS_CONFIG)
     except Exception as e:
         write_debug(f"ERROR OCR {img_path}: {e}")
         return ""
 
-def convert_pdf_to_images(pdf_path, out_folder, poppler_path, dpi=200):
+def extract_pdf_text_layer(pdf_path, min_chars=TEXT_LAYER_MIN_CHARS, page_min_chars=TEXT_LAYER_PAGE_MIN_CHARS):
+    """
+    Texto embebido del PDF por página (requiere pypdfium2). Devuelve None si no
+    hay capa de texto suficiente (promedio < min_chars por página) y hay que OCR-ear
+    todo; si no, las páginas con menos de page_min_chars quedan en None para OCR.
+    """
+    if not PDFIUM_AVAILABLE:
+        return None
+    try:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+    except Exception as e:
+        write_debug(f"WARNING capa de texto {pdf_path}: {e}")
+        return None
+    try:
+        texts = []
+        for i in range(len(pdf)):
+            page = pdf[i]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    texts.append(textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n"))
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+    except Exception as e:
+        write_debug(f"WARNING capa de texto {pdf_path}: {e}")
+        return None
+    finally:
+        pdf.close()
+    lengths = [len(t.strip()) for t in texts]
+    if not lengths or sum(lengths) < min_chars * len(lengths):
+        return None
+    return [t if n >= page_min_chars else None for t, n in zip(texts, lengths)]
+
+def pdf_text_pages(pdf_path, ri_folder, dpi, log=print, cache_dir=RASTER_CACHE_DIR):
+    """
+    Textos por página del PDF: capa de texto donde la hay y OCR del resto (todo
+    el documento si no trae capa). Lista vacía si no se pudo rasterizar.
+    Con cache_dir=None las páginas van a ri_folder, que borra quien llama.
+    """
+    layer = extract_pdf_text_layer(pdf_path)
+    if layer and None not in layer:
+        # PDF con capa de texto: no se rasteriza ni se pasa por Tesseract
+        log(f"  📝 Capa de texto en {len(layer)} páginas, se omite el OCR")
+        for i, txt in enumerate(layer, start=1):
+            write_debug(f"--- PAGE TEXT: page{i} ---")
+            write_debug(txt[:8000])
+        return layer
+    images = convert_pdf_to_images(pdf_path, ri_folder, POPPLER_BIN, dpi=dpi, cache_dir=cache_dir)
+    if not images:
+        return []
+    if layer is None or len(layer) != len(images):
+        layer = [None] * len(images)
+        log(f"  📄 Generadas {len(images)} páginas")
+    else:
+        log(f"  📝 Capa de texto en {sum(t is not None for t in layer)} de {len(layer)} páginas, OCR del resto")
+    todo = [i for i, t in enumerate(layer) if t is None]
+    ocr = dict(zip(todo, ocr_pages([images[i] for i in todo])))
+    text_pages = []
+    for i, img in enumerate(images):
+        if i in ocr:
+            log(f"    🔍 OCR imagen: {img.name}")
+            write_debug(f"--- PAGE OCR: {img.name} ---")
+            txt = ocr[i]
+        else:
+            write_debug(f"--- PAGE TEXT: page{i + 1} ---")
+            txt = layer[i]
+        write_debug(txt[:8000])
+        text_pages.append(txt)
+    return text_pages
+
+def pdf_content_hash(pdf_path):
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def _cached_pages(folder):
+    return sorted(folder.glob("page*.png"), key=lambda p: int(p.stem[4:]))
+
+def convert_pdf_to_images(pdf_path, out_folder, poppler_path, dpi=200, cache_dir=RASTER_CACHE_DIR):
+    """
+    Rasteriza el PDF en pageN.png (binarizadas). Con cache_dir las páginas quedan en
+    cache_dir/<sha256 del PDF>/<dpi>-bw/ y una corrida posterior con el mismo
+    contenido y DPI las reutiliza sin llamar a Poppler (out_folder no se usa).
+    """
+    if cache_dir is None:
+        return _render_pdf_pages(pdf_path, out_folder, poppler_path, dpi)
+    try:
+        final = cache_dir / pdf_content_hash(pdf_path) / f"{dpi}-bw"
+    except OSError as e:
+        write_debug(f"WARNING cache PDF {pdf_path}: {e}")
+        return _render_pdf_pages(pdf_path, out_folder, poppler_path, dpi)
+    if final.is_dir():
+        return _cached_pages(final)
+    # Se rasteriza en una carpeta temporal y se renombra al final: la carpeta
+    # de la caché aparece completa o no aparece (ejecuciones concurrentes/cortadas)
+    tmp = final.with_name(f"{final.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    outs = _render_pdf_pages(pdf_path, tmp, poppler_path, dpi)
+    if not outs:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return []
+    try:
+        tmp.rename(final)
+    except OSError as e:
+        if not final.is_dir():
+            write_debug(f"WARNING cache PDF {pdf_path}: {e}")
+            return outs
+        shutil.rmtree(tmp, ignore_errors=True)  # otra ejecución la dejó lista antes
+    return _cached_pages(final)
+
+def _render_pdf_pages(pdf_path, out_folder, poppler_path, dpi):
     out_folder.mkdir(parents=True, exist_ok=True)
     try:
+        if PDFIUM_AVAILABLE:
+            return _render_pdf_pages_pdfium(pdf_path, out_folder, dpi)
         images = convert_from_path(str(pdf_path), dpi=dpi, poppler_path=str(poppler_path))
         outs = []
         for i, img in enumerate(images, start=1):
             out = out_folder / f"page{i}.png"
-            img.save(out, "PNG"); outs.append(out)
+            binarize_page(img).save(out, "PNG"); outs.append(out)
         return outs
     except Exception as e:
         write_debug(f"ERROR PDF->Images {pdf_path}: {e}")
         return []
 
+def binarize_page(img):
+    """
+    Escala de grises + umbral de Otsu -> imagen de 1 bit. En PDFs impresos
+    Tesseract lee igual de bien y procesa/lee del disco bastante menos.
+    """
+    gray = img if img.mode == "L" else img.convert("L")
+    hist = gray.histogram()
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    w_b = sum_b = 0
+    best_t, best_var = 127, -1.0
+    for t in range(256):
+        w_b += hist[t]
+        if w_b == 0: continue
+        w_f = total - w_b
+        if w_f == 0: break
+        sum_b += t * hist[t]
+        var = w_b * w_f * (sum_b / w_b - (sum_all - sum_b) / w_f) ** 2
+        if var > best_var:
+            best_t, best_var = t, var
+    return gray.point([255 if v > best_t else 0 for v in range(256)], mode="1")
+
+def _render_pdf_pages_pdfium(pdf_path, out_folder, dpi):
+    # PDFium dibuja directo a un PIL.Image: sin pdftoppm ni el PPM intermedio
+    # que pdf2image vuelve a decodificar. El PNG (compresión rápida) es lo que
+    # guarda la caché y lo que lee Tesseract.
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        outs = []
+        for i in range(len(pdf)):
+            page = pdf[i]
+            try:
+                img = page.render(scale=dpi / 72, grayscale=True).to_pil()
+            finally:
+                page.close()
+            out = out_folder / f"page{i + 1}.png"
+            binarize_page(img).save(out, "PNG", compress_level=1); outs.append(out)
+        return outs
+    finally:
+        pdf.close()
+
 def find_existing_pdfs():
     if not PDF_INPUT_DIR.exists(): return []
     return sorted(PDF_INPUT_DIR.glob("*.pdf"))
@@ -724,6 +1112,8 @@ def process_pagare(text_pages, use_geocode=False, source_name: str | None = None
     """
     Procesa un Pagaré (PP) usando lógica especializada.
     """
+    # Por página sólo lo que decide la mejor página; el resto se extrae después
+    # de la mejor página o de la primera que lo tenga, sin recorrer todas
     rows = []
     producto_hint = ""
     for text in text_pages:
@@ -734,51 +1124,40 @@ def process_pagare(text_pages, use_geocode=False, source_name: str | None = None
         ruts = find_all_ruts(text)
         rut, dv = choose_rut_for_doc(text, ruts, "PP") if ruts else ("","")
         nombre = extract_nombre_generic(text)
-        direccion, comuna = extract_domicilio_and_comuna_pp(text)
-        fecha_sus = parse_spanish_date(text)
         monto_fmt, _ = extract_amount(text)
         
-        # Extraer fechas de vencimiento
-        fecha_venc_1 = extract_fecha_vencimiento_primera_cuota(text)
-        fecha_venc_ultima = extract_fecha_vencimiento_ultima_cuota(text)
-        
         rows.append({
             "text": text,
             "OPERACIÓN": op, "RUT": rut, "DV": dv, "NOMBRE": nombre,
-            "DIRECCION": direccion, "COMUNA": comuna,
-            "FECHA_SUSCRIPCION": fecha_sus, "MONTO_CREDITO": monto_fmt,
-            "FECHA_VENC_1": fecha_venc_1, "FECHA_VENC_ULTIMA": fecha_venc_ultima
+            "MONTO_CREDITO": monto_fmt
         })
     
-    operation = extract_operation_allpages(text_pages)
+    # Primera operación encontrada (= extract_operation_allpages, sin volver a escanear)
+    operation = next((r["OPERACIÓN"] for r in rows if r["OPERACIÓN"]), "")
     op_from_file = extract_operation_from_filename(source_name or "")
     def score_row_basic(r):
         return (50 if r.get("OPERACIÓN") else 0) + (30 if r.get("RUT") else 0) + (20 if r.get("NOMBRE") else 0) + (10 if r.get("MONTO_CREDITO") else 0)
     best = max(rows, key=score_row_basic) if rows else {}
+    best_text = best.get("text", "")
     
     # Representantes
     rep1, rep2 = extract_representantes_allpages(text_pages)
     
-    # Aplicar correcciones
-    direccion = clean_and_fix_address(best.get("DIRECCION", ""))
-    comuna = fix_comuna_ocr(best.get("COMUNA", ""))
+    # Domicilio de la mejor página; aplicar correcciones
+    direccion, comuna = extract_domicilio_and_comuna_pp(best_text) if best else ("", "")
+    direccion = clean_and_fix_address(direccion)
+    comuna = fix_comuna_ocr(comuna)
     
     # Aplicar corrección N->Ñ en nombre y dirección
     nombre_corregido = fix_n_to_ene(best.get("NOMBRE", ""))
     direccion_corregida = fix_n_to_ene(direccion)
     comuna_corregida = fix_n_to_ene(comuna)
     
-    # Extraer fecha de suscripción y vencimientos de todas las páginas
-    fecha_sus_final = ""
-    fecha_venc_1_final = ""
-    fecha_venc_ultima_final = ""
-    for row in rows:
-        if not fecha_sus_final and row.get("FECHA_SUSCRIPCION"):
-            fecha_sus_final = row["FECHA_SUSCRIPCION"]
-        if not fecha_venc_1_final and row.get("FECHA_VENC_1"):
-            fecha_venc_1_final = row["FECHA_VENC_1"]
-        if not fecha_venc_ultima_final and row.get("FECHA_VENC_ULTIMA"):
-            fecha_venc_ultima_final = row["FECHA_VENC_ULTIMA"]
+    # Fecha de suscripción y vencimientos: primera página que los tenga
+    fecha_sus_best = parse_spanish_date(best_text) if best else ""
+    fecha_sus_final = first_page_value(parse_spanish_date, text_pages)
+    fecha_venc_1_final = first_page_value(extract_fecha_vencimiento_primera_cuota, text_pages)
+    fecha_venc_ultima_final = first_page_value(extract_fecha_vencimiento_ultima_cuota, text_pages)
     
     # Normalizar PRODUCTO: para la base seguimos usando 'PP' aunque el encabezado indique 'TC'
     producto_out = "PP"
@@ -789,11 +1168,11 @@ def process_pagare(text_pages, use_geocode=False, source_name: str | None = None
         "OPERACION_1": operation or best.get("OPERACIÓN","") or op_from_file,
         "RUT": best.get("RUT",""), "DV": best.get("DV",""), "NOMBRE": nombre_corregido,
         "DIRECCION": direccion_corregida, "COMUNA": comuna_corregida,
-    "FECHA_SUSCRIPCION_1": fecha_sus_final or best.get("FECHA_SUSCRIPCION",""),
+    "FECHA_SUSCRIPCION_1": fecha_sus_final or fecha_sus_best,
         "MONTO_CREDITO_1": best.get("MONTO_CREDITO",""),
         "CUOTAS_1": "", "TASA_1": "", "MONTO_CUOTA_1": "", "MONTO_ULTIMA_CUOTA_1": "",
-        "FECHA_VENCIMIENTO_1_CUOTA_1": fecha_venc_1_final or best.get("FECHA_SUSCRIPCION",""),
-        "FECHA_VENCIMIENTO_ULTIMA_CUOTA_1": fecha_venc_ultima_final or best.get("FECHA_SUSCRIPCION",""),
+        "FECHA_VENCIMIENTO_1_CUOTA_1": fecha_venc_1_final or fecha_sus_best,
+        "FECHA_VENCIMIENTO_ULTIMA_CUOTA_1": fecha_venc_ultima_final or fecha_sus_best,
         "CUOTA_MOROSA_1": "", "FECHA_CUOTA_MOROSA_1": "",
         "CAPITAL_1": best.get("MONTO_CREDITO",""), 
         "EXHORTO": "TEMUCO", "SUCURSAL": "SANTIAGO", "PRODUCTO": producto_out,
@@ -813,7 +1192,7 @@ def process_credito_consumo(text_pages, use_geocode=False, source_name: str | No
     # Usar lógica del bloque de identidad
     ident = extract_cc_identity_block(text_pages)
     
-    # Procesar páginas individualmente
+    # Procesar páginas individualmente (sólo lo que decide la mejor página)
     rows = []
     producto_hint = ""
     for text in text_pages:
@@ -823,27 +1202,23 @@ def process_credito_consumo(text_pages, use_geocode=False, source_name: str | No
         ruts = find_all_ruts(text)
         rut_gen, dv_gen = choose_rut_for_doc(text, ruts, "CC") if ruts else ("","")
         nombre_g = extract_nombre_generic(text)
-        fecha_sus = parse_spanish_date(text)
         monto_fmt, _ = extract_amount(text)
         
-        # Extraer fechas de vencimiento para CC
-        fecha_venc_1 = extract_fecha_vencimiento_primera_cuota(text)
-        fecha_venc_ultima = extract_fecha_vencimiento_ultima_cuota(text)
-        
         rows.append({
             "text": text,
             "OPERACIÓN": op, "RUT": rut_gen, "DV": dv_gen,
             "NOMBRE_G": nombre_g,
-            "FECHA_SUSCRIPCION": fecha_sus, "MONTO_CREDITO": monto_fmt,
-            "FECHA_VENC_1": fecha_venc_1, "FECHA_VENC_ULTIMA": fecha_venc_ultima
+            "MONTO_CREDITO": monto_fmt
         })
     
     # Escoger mejor página
     def score_row_basic(r):
         return (50 if r.get("OPERACIÓN") else 0) + (30 if r.get("RUT") else 0) + (20 if r.get("NOMBRE_G") else 0) + (10 if r.get("MONTO_CREDITO") else 0)
     best = max(rows, key=score_row_basic) if rows else {}
-    operation = extract_operation_allpages([r["text"] for r in rows]) or best.get("OPERACIÓN","")
+    # Primera operación encontrada (= extract_operation_allpages, sin volver a escanear)
+    operation = next((r["OPERACIÓN"] for r in rows if r["OPERACIÓN"]), "")
     op_from_file = extract_operation_from_filename(source_name or "")
+    fecha_sus = parse_spanish_date(best["text"]) if best else ""
     
     # Priorizar datos del bloque de identidad
     nombre = ident["name"] or best.get("NOMBRE_G","") or ""
@@ -857,14 +1232,9 @@ def process_credito_consumo(text_pages, use_geocode=False, source_name: str | No
     direccion_corregida = fix_n_to_ene(direccion)
     comuna_corregida = fix_n_to_ene(comuna)
     
-    # Extraer fechas de vencimiento de todas las páginas
-    fecha_venc_1_final = ""
-    fecha_venc_ultima_final = ""
-    for row in rows:
-        if not fecha_venc_1_final and row.get("FECHA_VENC_1"):
-            fecha_venc_1_final = row["FECHA_VENC_1"]
-        if not fecha_venc_ultima_final and row.get("FECHA_VENC_ULTIMA"):
-            fecha_venc_ultima_final = row["FECHA_VENC_ULTIMA"]
+    # Fechas de vencimiento: primera página que las tenga
+    fecha_venc_1_final = first_page_value(extract_fecha_vencimiento_primera_cuota, text_pages)
+    fecha_venc_ultima_final = first_page_value(extract_fecha_vencimiento_ultima_cuota, text_pages)
     
     # Representantes
     rep1, rep2 = extract_representantes_allpages(text_pages)
@@ -874,7 +1244,7 @@ def process_credito_consumo(text_pages, use_geocode=False, source_name: str | No
         "OPERACION_1": operation or op_from_file,
         "RUT": rut, "DV": dv, "NOMBRE": nombre_corregido,
         "DIRECCION": direccion_corregida, "COMUNA": comuna_corregida,
-        "FECHA_SUSCRIPCION_1": best.get("FECHA_SUSCRIPCION",""),
+        "FECHA_SUSCRIPCION_1": fecha_sus,
         "MONTO_CREDITO_1": best.get("MONTO_CREDITO",""),
         "CUOTAS_1": "", "TASA_1": "", "MONTO_CUOTA_1": "", "MONTO_ULTIMA_CUOTA_1": "",
         "FECHA_VENCIMIENTO_1_CUOTA_1": fecha_venc_1_final,
@@ -891,16 +1261,96 @@ def process_credito_consumo(text_pages, use_geocode=False, source_name: str | No
     
     return final_row
 
+CRITICAL_FIELDS = ("OPERACION_1", "RUT", "DV", "NOMBRE", "COMUNA")
+
+# --------------- Excel (streaming) ---------------
+CHUNK_SIZE = 32  # PDFs por tramo antes de volcar filas al Excel
+
+def new_results_workbook():
+    """
+    Workbook write-only de openpyxl (las filas van a disco a medida que se
+    agregan, sin estilos por celda) con la cabecera UNIFIED_COLUMNS ya escrita.
+    Misma hoja por defecto que df.to_excel.
+    """
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(UNIFIED_COLUMNS)
+    return wb, ws
+
+def corrected_frame(rows):
+    """DataFrame de un tramo con las correcciones de referencia; retorna (df, nº corregidas)."""
+    df_new = pd.DataFrame(rows, columns=UNIFIED_COLUMNS)
+    corrected_count = 0
+    if GEO_UTILS_AVAILABLE:
+        df_corrected = apply_reference_corrections(df_new)
+        corrected_count = int(df_new.ne(df_corrected).any(axis=1).sum())
+        if corrected_count > 0:
+            df_new = df_corrected
+    return df_new, corrected_count
+
+def _init_worker(ocr_threads):
+    """
+    Inicializa un proceso hijo: Tesseract en un solo hilo (el paralelismo lo
+    dan los procesos) y la API tesserocr creada una vez por proceso.
+    """
+    global OCR_THREADS
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    OCR_THREADS = ocr_threads
+    get_tess_api()
+
+def process_one_pdf(pdf, use_geocode=False, cache_dir=RASTER_CACHE_DIR):
+    """
+    PDF -> imágenes -> OCR -> detección -> fila unificada. Las páginas quedan en
+    cache_dir o, sin caché, en RI/<pdf>, que se borra al terminar. Se ejecuta en un proceso hijo cuando hay varios workers, así que
+    no escribe el debug: retorna (fila o None, líneas de debug) para el padre.
+    """
+    global _DEBUG_CAPTURE
+    _DEBUG_CAPTURE = lines = []
+    print(f"🔄 Procesando PDF: {pdf.name}")
+    ri_folder = TEMP_RI_ROOT / pdf.stem
+    try:
+        text_pages = pdf_text_pages(pdf, ri_folder, 200, cache_dir=cache_dir)
+        if not text_pages:
+            print(f"  ❌ ERROR: no se generaron imágenes para {pdf.name}")
+            return None, lines
+
+        # Detectar tipo de documento
+        doc_type = detect_document_type(text_pages)
+        print(f"  📋 Tipo detectado: {doc_type}")
+
+        # Procesar según tipo
+        row = process_document_unified(text_pages, doc_type, use_geocode=use_geocode, source_name=pdf.name)
+        print(f"  ✅ Extraído: RUT {row['RUT']}-{row['DV']}, {row['NOMBRE']} ({doc_type})")
+        return row, lines
+
+    except Exception as e:
+        print(f"  ❌ ERROR procesando {pdf.name}: {str(e)}")
+        write_debug(f"ERROR procesando {pdf.name}: {e}")
+        return None, lines
+    finally:
+        try:
+            if ri_folder.exists(): shutil.rmtree(ri_folder)
+        except Exception as e:
+            write_debug(f"WARNING cleanup {ri_folder}: {e}")
+        _DEBUG_CAPTURE = None
+
 # --------------- Main ---------------
 def main():
     parser = argparse.ArgumentParser(description="Procesar PDFs Itau (Unificado PP/CC) -> Excel")
     parser.add_argument("--geocode", action="store_true", help="Intentar geocodificar (Nominatim)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Procesos en paralelo (1 = secuencial; por defecto nº de CPUs)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"No usar ni llenar la caché de páginas rasterizadas ({RASTER_CACHE_DIR})")
     args = parser.parse_args()
     use_geocode = args.geocode
+    cache_dir = None if args.no_cache else RASTER_CACHE_DIR
 
     print("🚀 Inicio: proceso Itau UNIFICADO (PP/CC)")
     DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
     DEBUG_FILE.unlink(missing_ok=True)
+    flush_debug()  # avisos de la carga del módulo; los procesos hijos no los heredan
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
     if not TESSERACT_AVAILABLE:
@@ -914,76 +1364,69 @@ def main():
 
     print(f"📁 Encontrados {len(pdfs)} PDFs para procesar")
     
-    all_rows = []
-    for pdf in pdfs:
-        print(f"🔄 Procesando PDF: {pdf.name}")
-        ri_folder = TEMP_RI_ROOT / pdf.stem
-        text_pages = []
-        try:
-            images = convert_pdf_to_images(pdf, ri_folder, POPPLER_BIN, dpi=200)
-            if not images:
-                print(f"  ❌ ERROR: no se generaron imágenes para {pdf.name}")
+    workers = max(1, min(args.workers or 1, len(pdfs)))
+    ex = None
+    if workers > 1:
+        print(f"⚙️  Procesando con {workers} procesos en paralelo")
+        # Hilos de OCR por proceso: los núcleos que sobran tras repartir procesos
+        ocr_threads = max(1, (os.cpu_count() or 1) // workers)
+        ex = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ocr_threads,))
+
+    # Las filas se vuelcan al Excel por tramos: en memoria sólo queda el resumen
+    wb, ws = new_results_workbook()
+    summary = []  # (NOMBRE, RUT, DV, COMUNA, PRODUCTO) por fila escrita
+    corrected_total = 0
+    missing_counts = dict.fromkeys(CRITICAL_FIELDS, 0)
+    try:
+        for i in range(0, len(pdfs), CHUNK_SIZE):
+            chunk = pdfs[i:i + CHUNK_SIZE]
+            if ex:
+                results = list(ex.map(process_one_pdf, chunk, repeat(use_geocode), repeat(cache_dir),
+                                      chunksize=1))
+            else:
+                results = [process_one_pdf(pdf, use_geocode, cache_dir) for pdf in chunk]
+            rows = []
+            for row, lines in results:
+                if lines:
+                    write_debug("\n".join(lines))
+                    flush_debug()
+                if row:
+                    rows.append(row)
+            if not rows:
                 continue
-            
-            print(f"  📄 Generadas {len(images)} páginas")
-            for img in images:
-                print(f"    🔍 OCR imagen: {img.name}")
-                txt = ocr_image_to_text(img)
-                write_debug(f"--- PAGE OCR: {img.name} ---")
-                write_debug(txt[:8000])
-                text_pages.append(txt)
-            
-            # Detectar tipo de documento
-            doc_type = detect_document_type(text_pages)
-            print(f"  📋 Tipo detectado: {doc_type}")
-            
-            # Procesar según tipo
-            row = process_document_unified(text_pages, doc_type, use_geocode=use_geocode, source_name=pdf.name)
-            all_rows.append(row)
-            print(f"  ✅ Extraído: RUT {row['RUT']}-{row['DV']}, {row['NOMBRE']} ({doc_type})")
-            
-        except Exception as e:
-            print(f"  ❌ ERROR procesando {pdf.name}: {str(e)}")
-            write_debug(f"ERROR procesando {pdf.name}: {e}")
-        finally:
-            try:
-                if ri_folder.exists(): shutil.rmtree(ri_folder)
-            except Exception as e:
-                write_debug(f"WARNING cleanup {ri_folder}: {e}")
+            df_chunk, corrected = corrected_frame(rows)
+            corrected_total += corrected
+            for k, v in count_missing(df_chunk, CRITICAL_FIELDS).items():
+                missing_counts[k] += v
+            for t in df_chunk.itertuples(index=False, name=None):
+                ws.append(list(t))
+            summary.extend(zip(*(df_chunk[c] for c in ("NOMBRE", "RUT", "DV", "COMUNA", "PRODUCTO"))))
+    finally:
+        if ex: ex.shutdown()
 
-    if all_rows:
-        df_new = pd.DataFrame(all_rows, columns=UNIFIED_COLUMNS)
-        
-        # Aplicar correcciones de referencia si están disponibles
+    if summary:
+        # Correcciones de referencia aplicadas por tramo si están disponibles
         if GEO_UTILS_AVAILABLE:
             print("📋 Aplicando correcciones de referencia...")
-            df_corrected = apply_reference_corrections(df_new)
-            corrected_count = sum(1 for i in range(len(df_new)) 
-                                if df_new.iloc[i].to_dict() != df_corrected.iloc[i].to_dict())
-            if corrected_count > 0:
-                print(f"✅ Aplicadas {corrected_count} correcciones de referencia")
-                df_new = df_corrected
+            if corrected_total > 0:
+                print(f"✅ Aplicadas {corrected_total} correcciones de referencia")
         
         # Verificador rápido de campos críticos para depurar mínimos errores de extracción
-        missing_counts = {k: 0 for k in ["OPERACION_1","RUT","DV","NOMBRE","COMUNA"]}
-        for i, (_, row) in enumerate(df_new.iterrows(), 1):
-            for k in missing_counts:
-                if not str(row.get(k, "")).strip():
-                    missing_counts[k] += 1
         write_debug("\n==== VERIFICADOR DE CAMPOS CRÍTICOS ====")
         for k, v in missing_counts.items():
             write_debug(f"Faltantes {k}: {v}")
         write_debug("=======================================\n")
 
-        df_new.to_excel(OUT_XLSX, index=False)
+        wb.save(str(OUT_XLSX))
+        flush_debug()
         print(f"✅ Guardado final en: {OUT_XLSX}")
         print(f"📋 Debug info en: {DEBUG_FILE}")
-        print(f"📊 Filas extraídas: {len(all_rows)}")
+        print(f"📊 Filas extraídas: {len(summary)}")
         
         # Mostrar resumen
         print("\n📄 RESUMEN DE DATOS EXTRAÍDOS:")
-        for i, (_, row) in enumerate(df_new.iterrows(), 1):
-            print(f"  Fila {i}: {row['NOMBRE']} (RUT: {row['RUT']}-{row['DV']}) - {row['COMUNA']} [{row['PRODUCTO']}]")
+        for i, (nombre, rut, dv, comuna, producto) in enumerate(summary, 1):
+            print(f"  Fila {i}: {nombre} (RUT: {rut}-{dv}) - {comuna} [{producto}]")
     else:
         print("❌ No se extrajeron filas. Revisa", DEBUG_FILE)
 
@@ -1010,6 +1453,7 @@ def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: s
 
     # Redirigir temporalmente el debug global a este archivo
     global DEBUG_FILE
+    flush_debug()  # lo pendiente va al debug anterior
     prev_debug = DEBUG_FILE
     DEBUG_FILE = debug_path
     try:
@@ -1029,14 +1473,9 @@ def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: s
                 continue
             # Usar una carpeta temporal por sesión web para evitar choques con el proceso local
             ri_folder = ri_root / pdf_path.stem
-            text_pages = []
             try:
-                images = convert_pdf_to_images(pdf_path, ri_folder, POPPLER_BIN, dpi=dpi_val)
-                for img in images:
-                    txt = ocr_image_to_text(img)
-                    write_debug(f"--- PAGE OCR: {img.name} ---")
-                    write_debug(txt[:8000])
-                    text_pages.append(txt)
+                # Sin caché: las páginas de documentos subidos no quedan en disco
+                text_pages = pdf_text_pages(pdf_path, ri_folder, dpi_val, log=lambda *a: None, cache_dir=None)
                 doc_type = detect_document_type(text_pages)
                 row = process_document_unified(text_pages, doc_type, use_geocode=geocode, source_name=pdf_path.name)
                 all_rows.append(row)
@@ -1047,10 +1486,11 @@ def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: s
                     if ri_folder.exists(): shutil.rmtree(ri_folder)
                 except Exception as e:
                     write_debug(f"WARNING cleanup {ri_folder}: {e}")
+                flush_debug()
 
         if not all_rows:
             # Aún así, crear un Excel vacío con columnas para feedback claro
-            pd.DataFrame(columns=UNIFIED_COLUMNS).to_excel(xlsx_path, index=False)
+            new_results_workbook()[0].save(str(xlsx_path))
             return str(xlsx_path), str(debug_path)
 
         df_new = pd.DataFrame(all_rows, columns=UNIFIED_COLUMNS)
@@ -1058,17 +1498,17 @@ def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: s
             df_new = apply_reference_corrections(df_new)
 
         # Verificador rápido de campos críticos
-        missing_counts = {k: 0 for k in ["OPERACION_1","RUT","DV","NOMBRE","COMUNA"]}
-        for _, row in df_new.iterrows():
-            for k in missing_counts:
-                if not str(row.get(k, "")).strip():
-                    missing_counts[k] += 1
+        missing_counts = count_missing(df_new, CRITICAL_FIELDS)
         write_debug("\n==== VERIFICADOR DE CAMPOS CRÍTICOS (web) ====")
         for k, v in missing_counts.items():
             write_debug(f"Faltantes {k}: {v}")
         write_debug("==============================================\n")
 
-        df_new.to_excel(xlsx_path, index=False)
+        wb, ws = new_results_workbook()
+        for t in df_new.itertuples(index=False, name=None):
+            ws.append(list(t))
+        wb.save(str(xlsx_path))
         return str(xlsx_path), str(debug_path)
     finally:
+        flush_debug()
         DEBUG_FILE = prev_debug
\ No newline at end of file
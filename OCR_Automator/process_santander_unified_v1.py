@@ -9,17 +9,48 @@ y aplica la lógica de extracción correspondiente (genérica, robusta ante OCR)
 Salida: outputs/Santander/Santander_results_UNIFIED.xlsx y un log debug.
 """
 
+import os
 import re
 import shutil
 import argparse
+import atexit
+import hashlib
+import json
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import cycle, repeat
 from pathlib import Path
 from datetime import datetime
 import pandas as pd
 from PIL import Image
 import pytesseract
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import difflib
 
+# tesserocr: API de Tesseract en proceso (modelo cargado una sola vez por hilo);
+# pytesseract (un subproceso por página) queda como respaldo.
+try:
+    from tesserocr import PyTessBaseAPI, PSM
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+
+# pypdfium2: lee la capa de texto de PDFs digitales (sin rasterizar ni OCR)
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+# rapidfuzz (C++) para el fuzzy de comunas; difflib como respaldo
+try:
+    from rapidfuzz import fuzz, process as rf_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
 # RUTs institucionales a evitar como titular (frecuentes en contratos)
 INSTITUTIONAL_RUTS = {"97036000"}
 
@@ -29,6 +60,7 @@ try:
         clean_and_fix_address,
         fix_comuna_ocr,
         apply_reference_corrections,
+        count_missing,
     )
     GEO_UTILS_AVAILABLE = True
     print("✅ Utilidades de geocodificación cargadas")
@@ -38,6 +70,7 @@ except Exception:
     def clean_and_fix_address(address): return address
     def fix_comuna_ocr(comuna): return comuna
     def apply_reference_corrections(df): return df
+    def count_missing(df, fields): return {}
 
 # ---------------- CONFIG ----------------
 TESSERACT_EXE = r"C:\Users\cdiaz\AppData\Local\Programs\Tesseract-OCR\tesseract.exe"
@@ -46,11 +79,31 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR  # Usamos la carpeta del módulo como raíz del proyecto
 PDF_INPUT_DIR = PROJECT_ROOT / "pdfs" / "Santander"
 TEMP_RI_ROOT = PROJECT_ROOT / "RI_Santander"
+OCR_CACHE_DIR = TEMP_RI_ROOT / "_cache"  # texto OCR por contenido del PDF, DPI y ajustes de OCR (--no-cache lo omite)
+PAGES_IN_MEMORY = True  # False: guarda pageN.png en RI_Santander/<pdf> (para revisar el rasterizado)
+PAGE_BATCH = 10  # páginas rasterizadas a la vez: acota la memoria en PDFs largos
+TEXT_LAYER_MIN_CHARS = 200  # caracteres por página (promedio) para usar la capa de texto sin OCR
+TEXT_LAYER_PAGE_MIN_CHARS = 20  # y en cada página: una página escaneada dentro del PDF no trae capa
 OUT_DIR = PROJECT_ROOT / "outputs" / "Santander"
 OUT_XLSX = OUT_DIR / "Santander_results_UNIFIED.xlsx"
 DEBUG_FILE = PROJECT_ROOT / "outputs" / "Santander_debug_unified.txt"
+TESSDATA_DIR = str(Path(TESSERACT_EXE).parent / "tessdata")
+# Las páginas llegan binarizadas (texto negro sobre blanco): sin el reintento de
+# Tesseract con cada línea invertida
+TESS_VARIABLES = {"tessedit_do_invert": "0"}
+TESS_CONFIG = " ".join(f"-c {k}={v}" for k, v in TESS_VARIABLES.items())
+# Versión del preprocesado de páginas (binarize_page): subirla al cambiarlo para
+# que la caché de OCR no devuelva texto leído con el preprocesado anterior
+OCR_PREPROCESS_VERSION = 1
+# Ajustes que cambian el texto OCR (idioma, PSM 3 = AUTO, variables, preprocesado);
+# forman parte de la clave de la caché de OCR
+OCR_CACHE_SETTINGS = hashlib.sha256(
+    f"spa;psm=3;{TESS_CONFIG};prep={OCR_PREPROCESS_VERSION}".encode()).hexdigest()[:8]
 # ----------------------------------------
 
+# Los PDFs se reparten entre procesos: Tesseract (OpenMP) a un hilo por proceso
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
 # Verificar Tesseract
 try:
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_EXE
@@ -59,7 +112,8 @@ try:
     TESSERACT_AVAILABLE = True
     print("✅ Tesseract disponible")
 except Exception as e:
-    TESSERACT_AVAILABLE = False
+    # Sin ejecutable aún puede haber OCR vía tesserocr
+    TESSERACT_AVAILABLE = TESSEROCR_AVAILABLE
     print(f"⚠️ Tesseract no disponible: {e}")
 
 UNIFIED_COLUMNS = [
@@ -84,30 +138,135 @@ COMUNAS = [
     "CHILLAN","CHILLÁN","PUNTA ARENAS","CURICO","CURICÓ","ILLAPEL","COQUIMBO","LINARES","IQUIQUE","SAN BERNARDO","COLINA",
     "PUERTO VARAS","MELIPILLA","BUIN","PAINE","PEÑAFLOR","PENAFLOR","PADRE HURTADO","CAÑETE","CANETE"
 ]
+COMUNAS_TUPLE = tuple(COMUNAS)
+COMUNAS_SET = frozenset(COMUNAS)
 
 MONTHS = {
     'enero':1,'febrero':2,'marzo':3,'abril':4,'mayo':5,'junio':6,
     'julio':7,'agosto':8,'septiembre':9,'setiembre':9,'octubre':10,'noviembre':11,'diciembre':12
 }
 
+# Regex precompiladas (los extractores corren una vez por página y PDF)
+_RE_NON_DIGIT = re.compile(r'[^\d]')
+_RE_SPACES = re.compile(r'\s+')
+_RE_DATE_NUMERIC = re.compile(r'(\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b)')
+_RE_DATE_LONG = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'\b(?:en\s+[A-Za-zÁÉÍÓÚÑáéíóúñ]+,?\s*)?a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\bel\s+d[ií]a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+,\s*(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+\s*,?\s*a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+    r'\b(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})\b',
+))
+_RE_OPERATION = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'N[°º\*\?\W]?\s*(?:Operaci[oó]n|Operación)[:\s]*([0-9]{6,})',
+    r'\b(?:Operaci[oó]n|Operación)\s*N[°º\*\?\W]?\s*([0-9]{6,})',
+    r'N[°º\*\?\W]?\s*Producto[:\s]*([0-9]{6,})',
+    r'\bProducto\s*N[°º\*\?\W]?\s*[:\s]*([0-9]{6,})',
+))
+_RE_DIGIT_RUNS = re.compile(r'(\d{6,})')
+_RE_RUT_LABELED = tuple((re.compile(pat, re.IGNORECASE), base) for pat, base in (
+    (r'C[ée]dula\s+de\s+Identidad\s*N[°oº\*]?\s*:?\s*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 12),
+    (r'\bRUT\b[^:\d]{0,10}[:\sNNoº°]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 10),
+    (r'(?:C\.I\.|CI\b)[^:\d]{0,10}[:\s]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 8),
+))
+_RE_RUT_DOTTED = re.compile(r'([0-9]{1,3}(?:\.[0-9]{3}){1,2})\s*[-\s–—]*([0-9Kk])')
+_RE_RUT_PLAIN = re.compile(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])')
+_RE_OP_CTX = re.compile(r'Operaci[oó]n|Producto', re.IGNORECASE)
+_RE_RUT_GLOBAL = re.compile(r'(?:RUT|C[ée]dula\s+de\s+Identidad)[^\d]{0,15}([\d\.]{6,})\s*[-–—]?\s*([0-9Kk])', re.IGNORECASE)
+_RE_RUT_GLOBAL_PLAIN = re.compile(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])\b')
+_RE_SUSCRIPTOR = re.compile(r'(Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor|Deudor|Cliente)', re.IGNORECASE)
+_RE_NAME_LABELS = tuple(re.compile(pat) for pat in (
+    r'^(NOMBRE\s+DEUDOR\s*[:\-]+\s*)',
+    r'^(DEUDOR\s*[:\-]+\s*)',
+    r'^(SUSCRIPTOR\s*[:\-]+\s*)',
+))
+_RE_NOMBRE_LINES = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'^(?:Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor|Deudor|Cliente)[:\.\s-]*(.+)$',
+    r'^(?:Señor|Señora|Sr\.?|Sra\.?)[:\.\s-]*(.+)$',
+))
+_RE_RUT_LINE = re.compile(r'\bRUT\b|C[eé]dula\s+de\s+Identidad', re.IGNORECASE)
+_RE_LETTERS_2 = re.compile(r"[A-Za-zÁÉÍÓÚÑ]{2,}")
+_RE_UPPER_NAME_LINE = re.compile(r"^[A-ZÁÉÍÓÚÑ\s]{8,}$")
+_RE_ADDR_NUM = re.compile(r'\d{1,5}')
+_RE_ADDR_WORDS = re.compile(r'\b(CALLE|AVENIDA|AVDA|AV|PJE|PAS|PASAJE|Nº|N°|DEPTO|DPTO|LOCAL|BLOCK)\b', re.IGNORECASE)
+_RE_UNICODE_PUNCT = re.compile(r'[\u2000-\u206F\u2E00-\u2E7F]+')
+_RE_DOMICILIO_START = re.compile(r'^\s*(?:Domicilio|Direcci[oó]n)\b', re.IGNORECASE)
+_RE_DOMICILIO_TAIL = re.compile(r'^\s*(?:Domicilio|Direcci[oó]n)\s*[:.\-]+\s*(.*)$', re.IGNORECASE)
+_RE_COMUNA_LABEL = re.compile(r'\bComuna\b\s*[:.\-]*\s*(.+)$', re.IGNORECASE)
+_RE_DOMICILIADO_EN = re.compile(r'(?:domiciliad[oa]\s+en|con\s+domicilio\s+en)\s+([^\n\r]+)', re.IGNORECASE)
+_RE_AMOUNT = re.compile(r'(?:la\s+suma\s+de|cantidad\s+de)?\s*\$\s*([0-9\.\,]+)', re.IGNORECASE)
+_RE_SUMA_DE = re.compile(r'la\s+suma\s+de[^$\d]{0,10}\$\s*([0-9\.,]+)', re.IGNORECASE)
+_RE_DOLLAR_AMOUNT = re.compile(r'\$\s*([0-9\.,]{4,})')
+_RE_CUOTAS = re.compile(r'\b(?:en\s+)?(\d{1,3})\s+cuotas\b', re.IGNORECASE)
+_RE_TASA = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'\btasa\b[^%\n\r]{0,80}?([0-9][0-9\.,]{0,4})\s*%',
+    r'inter[eé]s[^%\n\r]{0,80}?([0-9][0-9\.,]{0,4})\s*%',
+))
+_RE_PERCENT = re.compile(r'([0-9][0-9\.,]{0,4})\s*%')
+_RE_MONTO_CUOTA = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'iguales\s+de\s*\$\s*([0-9\.,]+)',
+    r'cuota\s+mensual[^$\n\r]{0,60}\$\s*([0-9\.,]+)',
+    r'monto\s+de\s+la\s+cuota[^$\n\r]{0,60}\$\s*([0-9\.,]+)',
+))
+_RE_MONTO_ULTIMA = re.compile(r'una\s+[úu]ltima\s+de\s*\$\s*([0-9\.,]+)', re.IGNORECASE)
+_RE_VENC_A_CONTAR = re.compile(r'a\s+contar\s+del\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del\s+año\s+(\d{4})', re.IGNORECASE)
+_RE_VENC_PRIMERA = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'(?:primera|1[aª]?|1\.)\s*cuota[^\n\r]{0,30}(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
+    r'(?:primera|1[aª]?|1\.)\s*cuota[^\n\r]{0,60}a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
+))
+_RE_VENC_ULTIMA_MONTO = re.compile(r'una\s+[úu]ltima\s+de\s*\$[^\n\r]{0,80}?con\s+vencimiento\s+el\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del\s+año\s+(\d{4})', re.IGNORECASE)
+_RE_VENC_ULTIMA = tuple(re.compile(pat, re.IGNORECASE) for pat in (
+    r'(?:[úu]ltima|\b\d+\s*/\s*\d+\b\s*cuota)[^\n\r]{0,40}(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
+    r'vencimiento\s+el\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del\s+año\s+(\d{4})',
+))
+_RE_CLIENTE_DEUDOR = re.compile(r'Cliente\s*/?\s*deudor', re.IGNORECASE)
+_RE_CLIENTE_DEUDOR_LABEL = re.compile(r'^\s*Cliente\s*/?\s*deudor\s*[:\-]*\s*', re.IGNORECASE)
+_RE_DOMICILIO_LABEL = re.compile(r'^\s*Domicilio\s*[:\-]*\s*', re.IGNORECASE)
+_RE_FECHA_EN_CIUDAD = re.compile(r'\bEn\s+[A-ZÁÉÍÓÚÑ\s]+,?\s*a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del?\s+año\s+(\d{4})', re.IGNORECASE)
+_RE_DETECT_CUOTAS = re.compile(r'\ben\s+\d+\s+cuotas\b', re.IGNORECASE)
+
+# write_debug acumula en memoria; flush_debug() escribe todo con un solo open
+# (una vez por PDF y al final de la corrida). Mientras _process_one_pdf corre,
+# el debug se junta en _DEBUG_CAPTURE y se devuelve al proceso padre, que es
+# el único que escribe DEBUG_FILE
+_DEBUG_BUF = []
+_DEBUG_LOCK = threading.Lock()
+_DEBUG_CAPTURE = None
+
 def write_debug(s: str):
-    DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(DEBUG_FILE, "a", encoding="utf-8") as f:
-        f.write(s + "\n")
+    (_DEBUG_BUF if _DEBUG_CAPTURE is None else _DEBUG_CAPTURE).append(s)
+
+def flush_debug():
+    with _DEBUG_LOCK:
+        if not _DEBUG_BUF: return
+        lines = _DEBUG_BUF[:]
+        del _DEBUG_BUF[:len(lines)]
+        DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(DEBUG_FILE, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+atexit.register(flush_debug)
 
 # --------- Utilidades ---------
 def normalize_token(tok):
     return tok.strip().strip(" .,:;").upper()
 
+# Las mismas colas de dirección ("SANTIAGO", ...) se repiten entre páginas y PDFs
+@lru_cache(maxsize=2048)
 def fuzzy_comuna(s):
     su = normalize_token(s)
     # Corrección N->Ñ y equivalentes comunes antes de comparar
     su = fix_n_to_ene(su)
     if not su: return ""
-    for c in COMUNAS:
+    for c in COMUNAS_TUPLE:
         if c in su or su in c:
             return c
-    best = difflib.get_close_matches(su, COMUNAS, n=1, cutoff=0.72)
+    # fuzzy: fuzz.ratio (Indel/LCS, 0-100) es comparable pero no idéntico a difflib
+    # (Ratcliff-Obershelp), así que con corte 72 pueden elegir comunas distintas
+    if RAPIDFUZZ_AVAILABLE:
+        best = rf_process.extractOne(su, COMUNAS_TUPLE, scorer=fuzz.ratio, score_cutoff=72)
+        return best[0] if best else su
+    best = difflib.get_close_matches(su, COMUNAS_TUPLE, n=1, cutoff=0.72)
     return best[0] if best else su
 
 def fmt_date(d, mname, y):
@@ -119,63 +278,58 @@ def fmt_date(d, mname, y):
 # --------- Fechas ---------
 def parse_spanish_date(text):
     t = text.replace('\n',' ')
-    m = re.search(r'(\b\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}\b)', t)
+    m = _RE_DATE_NUMERIC.search(t)
     if m:
         s = m.group(1).replace('-', '/')
         for fmt in ("%d/%m/%Y","%d/%m/%y"):
             try: return datetime.strptime(s, fmt).strftime("%d-%m-%Y")
             except: pass
-    for pat in [
-        r'\b(?:en\s+[A-Za-zÁÉÍÓÚÑáéíóúñ]+,?\s*)?a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\bel\s+d[ií]a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+,\s*(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\b[A-Za-zÁÉÍÓÚÑáéíóúñ]+\s*,?\s*a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        r'\b(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})\b',
-    ]:
-        m = re.search(pat, t, re.IGNORECASE)
+    for pat in _RE_DATE_LONG:
+        m = pat.search(t)
         if m:
             return fmt_date(m.group(1), m.group(2), m.group(3))
     return ""
 
 # --------- Operación ---------
 def extract_operation_from_text(text):
-    for pat in [
-        r'N[°º\*\?\W]?\s*(?:Operaci[oó]n|Operación)[:\s]*([0-9]{6,})',
-        r'\b(?:Operaci[oó]n|Operación)\s*N[°º\*\?\W]?\s*([0-9]{6,})',
-        r'N[°º\*\?\W]?\s*Producto[:\s]*([0-9]{6,})',
-        r'\bProducto\s*N[°º\*\?\W]?\s*[:\s]*([0-9]{6,})'
-    ]:
-        m = re.search(pat, text, re.IGNORECASE)
+    for pat in _RE_OPERATION:
+        m = pat.search(text)
         if m: return m.group(1).strip()
     return ""
 
 def extract_operation_allpages(text_pages):
-    for t in text_pages:
-        op = extract_operation_from_text(t)
-        if op: return op
-    return ""
+    return next((op for op in map(extract_operation_from_text, text_pages) if op), "")
 
 # --------- RUT ---------
+def _upper_slicer(text):
+    """
+    Función (a, b) -> text[a:b].upper() que recorta de un único text.upper().
+    Si upper() cambia el largo (p. ej. 'ß' -> 'SS') los índices no calzan y se
+    pasa a mayúsculas cada recorte.
+    """
+    up = text.upper()
+    if len(up) == len(text):
+        return lambda a, b: up[a:b]
+    return lambda a, b: text[a:b].upper()
+
 def find_all_ruts(text):
+    """Candidatos (pos, rut, dv, contexto en mayúsculas, puntaje base)."""
     matches = []
-    for pat, base in [
-        (r'C[ée]dula\s+de\s+Identidad\s*N[°oº\*]?\s*:?\s*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 12),
-        (r'\bRUT\b[^:\d]{0,10}[:\sNNoº°]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 10),
-        (r'(?:C\.I\.|CI\b)[^:\d]{0,10}[:\s]*([\d\.\,]{6,})\s*[-–—]?\s*([0-9Kk])', 8),
-    ]:
-        for m in re.finditer(pat, text, re.IGNORECASE):
+    ctx_of = _upper_slicer(text)
+    for pat, base in _RE_RUT_LABELED:
+        for m in pat.finditer(text):
             start = m.start(1)
-            matches.append((start, re.sub(r'[^\d]', '', m.group(1)), m.group(2).upper(), text[max(0,start-80):start+120], base))
-    for m in re.finditer(r'([0-9]{1,3}(?:\.[0-9]{3}){1,2})\s*[-\s–—]*([0-9Kk])', text):
+            matches.append((start, _RE_NON_DIGIT.sub('', m.group(1)), m.group(2).upper(), ctx_of(max(0,start-80), start+120), base))
+    for m in _RE_RUT_DOTTED.finditer(text):
         start = m.start(1)
-        ctx = text[max(0,start-80):start+120]
-        if re.search(r'Operaci[oó]n|Producto', ctx, re.IGNORECASE):
+        ctx = ctx_of(max(0,start-80), start+120)
+        if _RE_OP_CTX.search(ctx):
             continue
-        matches.append((start, re.sub(r'[^\d]', '', m.group(1)), m.group(2).upper(), ctx, 3))
-    for m in re.finditer(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])', text):
+        matches.append((start, _RE_NON_DIGIT.sub('', m.group(1)), m.group(2).upper(), ctx, 3))
+    for m in _RE_RUT_PLAIN.finditer(text):
         start = m.start(1)
-        ctx = text[max(0,start-80):start+120]
-        if re.search(r'Operaci[oó]n|Producto', ctx, re.IGNORECASE):
+        ctx = ctx_of(max(0,start-80), start+120)
+        if _RE_OP_CTX.search(ctx):
             continue
         matches.append((start, m.group(1), m.group(2).upper(), ctx, 2))
     return matches
@@ -183,8 +337,8 @@ def find_all_ruts(text):
 def extract_rut_global(text_pages):
     joined = "\n".join(text_pages)
     cands = []
-    for m in re.finditer(r'(?:RUT|C[ée]dula\s+de\s+Identidad)[^\d]{0,15}([\d\.]{6,})\s*[-–—]?\s*([0-9Kk])', joined, re.IGNORECASE):
-        rut = re.sub(r'[^\d]', '', m.group(1))
+    for m in _RE_RUT_GLOBAL.finditer(joined):
+        rut = _RE_NON_DIGIT.sub('', m.group(1))
         dv = m.group(2).upper()
         if 7 <= len(rut) <= 8 and is_valid_rut(rut, dv) and rut not in INSTITUTIONAL_RUTS:
             cands.append((m.start(1), rut, dv))
@@ -192,9 +346,11 @@ def extract_rut_global(text_pages):
         cands.sort(key=lambda t: t[0])
         return cands[0][1], cands[0][2]
     # Fallback sin etiqueta
-    for m in re.finditer(r'\b(\d{7,8})\s*[-\s–—]*([0-9Kk])\b', joined):
+    ctx_of = None
+    for m in _RE_RUT_GLOBAL_PLAIN.finditer(joined):
         rut = m.group(1); dv = m.group(2).upper()
-        ctx = joined[max(0, m.start()-60): m.end()+60].upper()
+        ctx_of = ctx_of or _upper_slicer(joined)
+        ctx = ctx_of(max(0, m.start()-60), m.end()+60)
         if ("BANCO" in ctx or "SANTANDER" in ctx):
             continue
         if is_valid_rut(rut, dv) and rut not in INSTITUTIONAL_RUTS:
@@ -203,7 +359,7 @@ def extract_rut_global(text_pages):
 
 def choose_rut_for_doc(text, ruts, doc_type="CC"):
     if not ruts: return "", ""
-    sus = re.search(r'(Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor|Deudor|Cliente)', text, re.IGNORECASE)
+    sus = _RE_SUSCRIPTOR.search(text)
     sus_pos = sus.start() if sus else None
     best = None; best_score = -1
     for (pos, rut, dv, ctx, base) in ruts:
@@ -214,9 +370,8 @@ def choose_rut_for_doc(text, ruts, doc_type="CC"):
         # Bonus si DV válido
         if is_valid_rut(rut, dv):
             score += 5
-        # Penalizar contexto con palabras de entidad bancaria
-        ctx_up = ctx.upper()
-        if "BANCO" in ctx_up or "SANTANDER" in ctx_up:
+        # Penalizar contexto con palabras de entidad bancaria (ctx ya en mayúsculas)
+        if "BANCO" in ctx or "SANTANDER" in ctx:
             score -= 10
         if doc_type == "PP":
             if sus_pos is not None:
@@ -229,21 +384,16 @@ def choose_rut_for_doc(text, ruts, doc_type="CC"):
 # --------- Nombre/Dirección ---------
 def cleanup_name(s: str) -> str:
     up = s.upper().strip()
-    up = re.sub(r'^(NOMBRE\s+DEUDOR\s*[:\-]+\s*)', '', up)
-    up = re.sub(r'^(DEUDOR\s*[:\-]+\s*)', '', up)
-    up = re.sub(r'^(SUSCRIPTOR\s*[:\-]+\s*)', '', up)
-    return re.sub(r"\s+", " ", up).strip()
+    for pat in _RE_NAME_LABELS:
+        up = pat.sub('', up)
+    return _RE_SPACES.sub(" ", up).strip()
 
 def extract_nombre_generic(text):
     lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
     name_cands = []
-    patterns = [
-        r'^(?:Nombre\s+y\s+Apellidos\s+del\s+deudor|Suscriptor|Deudor|Cliente)[:\.\s-]*(.+)$',
-        r'^(?:Señor|Señora|Sr\.?|Sra\.?)[:\.\s-]*(.+)$',
-    ]
     for i, ln in enumerate(lines):
-        for pat in patterns:
-            m = re.match(pat, ln, re.IGNORECASE)
+        for pat in _RE_NOMBRE_LINES:
+            m = pat.match(ln)
             if m:
                 val = (m.group(1) or "").strip()
                 if not val and i+1 < len(lines):
@@ -254,36 +404,36 @@ def extract_nombre_generic(text):
         up = cand.upper()
         if any(bad in up for bad in ["PAGARE", "PAGARÉ", "CREDITO", "CRÉDITO", "S.A", "SOCIEDAD", "BANCO"]):
             continue
-        words = [w for w in re.split(r"\s+", up) if w and len(w) > 1]
+        words = [w for w in _RE_SPACES.split(up) if w and len(w) > 1]
         if 2 <= len(words) <= 6 and len(up) <= 80:
             return cleanup_name(up)
     # Fallback 1: buscar línea previa a una línea con RUT
     for i, ln in enumerate(lines):
-        if re.search(r'\bRUT\b|C[eé]dula\s+de\s+Identidad', ln, re.IGNORECASE):
+        if _RE_RUT_LINE.search(ln):
             prev = lines[i-1].strip() if i > 0 else ""
             up = prev.upper()
-            if prev and re.search(r"[A-Za-zÁÉÍÓÚÑ]{2,}", prev) and not any(b in up for b in ["BANCO","SANTANDER","CHILE","S.A","PAGARE","CREDITO"]):
+            if prev and _RE_LETTERS_2.search(prev) and not any(b in up for b in ["BANCO","SANTANDER","CHILE","S.A","PAGARE","CREDITO"]):
                 return cleanup_name(up)
     # Fallback 2: primera línea con pinta de nombre en mayúsculas
     for ln in lines[:15]:
         up = ln.upper()
-        if re.search(r"^[A-ZÁÉÍÓÚÑ\s]{8,}$", up) and len(up.split()) >= 2 and len(up) <= 80:
+        if _RE_UPPER_NAME_LINE.search(up) and len(up.split()) >= 2 and len(up) <= 80:
             if not any(bad in up for bad in ["PAGARE", "PAGARÉ", "CREDITO", "CRÉDITO", "BANCO", "SANTANDER", "CHILE"]):
                 return cleanup_name(up)
     return ""
 
 def looks_like_physical_address(s):
     if not s: return False
-    if re.search(r'\d{1,5}', s): return True
-    return bool(re.search(r'\b(CALLE|AVENIDA|AVDA|AV|PJE|PAS|PASAJE|Nº|N°|DEPTO|DPTO|LOCAL|BLOCK)\b', s, re.IGNORECASE))
+    if _RE_ADDR_NUM.search(s): return True
+    return bool(_RE_ADDR_WORDS.search(s))
 
 def extract_domicilio_and_comuna(text):
     lines_raw = [ln.rstrip() for ln in text.splitlines() if ln.strip()]
-    lines = [re.sub(r'[\u2000-\u206F\u2E00-\u2E7F]+', ' ', ln) for ln in lines_raw]
+    lines = [_RE_UNICODE_PUNCT.sub(' ', ln) for ln in lines_raw]
     for i, ln in enumerate(lines):
-        if not re.search(r'^\s*(?:Domicilio|Direcci[oó]n)\b', ln, re.IGNORECASE):
+        if not _RE_DOMICILIO_START.search(ln):
             continue
-        m = re.search(r'^\s*(?:Domicilio|Direcci[oó]n)\s*[:.\-]+\s*(.*)$', ln, re.IGNORECASE)
+        m = _RE_DOMICILIO_TAIL.search(ln)
         tail = (m.group(1) if m else "").strip()
         ext = tail
         if (len(ext) < 6 or ',' not in ext) and i+1 < len(lines) and looks_like_physical_address(lines[i+1]):
@@ -292,7 +442,7 @@ def extract_domicilio_and_comuna(text):
         comuna_lab = ""
         for j in range(1, 4):
             if i+j < len(lines):
-                m2 = re.search(r'\bComuna\b\s*[:.\-]*\s*(.+)$', lines[i+j], re.IGNORECASE)
+                m2 = _RE_COMUNA_LABEL.search(lines[i+j])
                 if m2:
                     comuna_lab = m2.group(1).strip()
                     break
@@ -302,7 +452,7 @@ def extract_domicilio_and_comuna(text):
         if ext and comuna_lab:
             return fix_n_to_ene(ext.strip().upper()), fuzzy_comuna(comuna_lab)
     # Fallback: "domiciliado en" / "con domicilio en"
-    m = re.search(r'(?:domiciliad[oa]\s+en|con\s+domicilio\s+en)\s+([^\n\r]+)', text, re.IGNORECASE)
+    m = _RE_DOMICILIADO_EN.search(text)
     if m:
         tail = m.group(1).strip()
         if ',' in tail:
@@ -312,25 +462,30 @@ def extract_domicilio_and_comuna(text):
     return "", ""
  
 # --------- Corrección N por Ñ (nombres, direcciones, comunas) ---------
+_ENE_MAP = {
+    'PENA': 'PEÑA', 'MUNOZ': 'MUÑOZ', 'NUNEZ': 'NÚÑEZ', 'IBANEZ': 'IBAÑEZ', 'YANEZ': 'YÁÑEZ',
+    'NINO': 'NIÑO', 'NINA': 'NIÑA', 'ESPANA': 'ESPAÑA', 'VINA DEL MAR': 'VIÑA DEL MAR',
+    'PENALOLEN': 'PEÑALOLÉN', 'PENAFLOR': 'PEÑAFLOR', 'NUNOA': 'ÑUÑOA', 'CANETE': 'CAÑETE',
+    'SENOR': 'SEÑOR', 'SENORA': 'SEÑORA', 'DUENO': 'DUEÑO', 'ANO': 'AÑO', 'ANOS': 'AÑOS',
+}
+# Todas las palabras en una sola alternación (un solo recorrido del texto);
+# en las de varias palabras el espacio admite cualquier separación
+_RE_ENE = re.compile(r'\b(?:' + '|'.join(re.escape(k).replace(r'\ ', r'\s+') for k in _ENE_MAP) + r')\b', re.IGNORECASE)
+
+def _ene_replacement(m):
+    word = m.group(0)
+    return _ENE_MAP.get(_RE_SPACES.sub(' ', word.upper()), word)
+
 def fix_n_to_ene(text: str) -> str:
     if not text:
         return text
-    repl = [
-        (r'\bPENA\b', 'PEÑA'), (r'\bMUNOZ\b', 'MUÑOZ'), (r'\bNUNEZ\b', 'NÚÑEZ'), (r'\bIBANEZ\b', 'IBAÑEZ'), (r'\bYANEZ\b', 'YÁÑEZ'),
-        (r'\bNINO\b', 'NIÑO'), (r'\bNINA\b', 'NIÑA'), (r'\bESPANA\b', 'ESPAÑA'), (r'\bVINA\s+DEL\s+MAR\b', 'VIÑA DEL MAR'),
-        (r'\bPENALOLEN\b', 'PEÑALOLÉN'), (r'\bPENAFLOR\b', 'PEÑAFLOR'), (r'\bNUNOA\b', 'ÑUÑOA'), (r'\bCANETE\b', 'CAÑETE'),
-        (r'\bSENOR\b', 'SEÑOR'), (r'\bSENORA\b', 'SEÑORA'), (r'\bDUENO\b', 'DUEÑO'), (r'\bANO\b', 'AÑO'), (r'\bANOS\b', 'AÑOS')
-    ]
-    out = text
-    for pat, rep in repl:
-        out = re.sub(pat, rep, out, flags=re.IGNORECASE)
-    return out
+    return _RE_ENE.sub(_ene_replacement, text)
 
 # --------- Montos ---------
 def extract_amount(text):
     candidates = []
-    for m in re.finditer(r'(?:la\s+suma\s+de|cantidad\s+de)?\s*\$\s*([0-9\.\,]+)', text, re.IGNORECASE):
-        raw = m.group(1); clean = re.sub(r'[^\d]', '', raw)
+    for m in _RE_AMOUNT.finditer(text):
+        raw = m.group(1); clean = _RE_NON_DIGIT.sub('', raw)
         num = int(clean) if clean.isdigit() else None
         ctx = text[max(0, m.start()-80): m.end()+80].lower()
         score = 10 if ('la suma de' in ctx or 'cantidad de' in ctx) else 0
@@ -344,15 +499,15 @@ def extract_amount(text):
 def extract_credit_amount_cc(text_pages):
     joined = "\n".join(text_pages)
     # Prefer "la suma de $..."
-    m = re.search(r'la\s+suma\s+de[^$\d]{0,10}\$\s*([0-9\.,]+)', joined, re.IGNORECASE)
+    m = _RE_SUMA_DE.search(joined)
     if m:
-        clean = re.sub(r'[^\d]', '', m.group(1))
+        clean = _RE_NON_DIGIT.sub('', m.group(1))
         if clean.isdigit():
             return f"{int(clean):,}".replace(",", ".")
     # Fallback: mayor monto con $ en el documento
     best = 0
-    for m in re.finditer(r'\$\s*([0-9\.,]{4,})', joined):
-        clean = re.sub(r'[^\d]', '', m.group(1))
+    for m in _RE_DOLLAR_AMOUNT.finditer(joined):
+        clean = _RE_NON_DIGIT.sub('', m.group(1))
         if clean.isdigit():
             val = int(clean)
             best = max(best, val)
@@ -361,19 +516,21 @@ def extract_credit_amount_cc(text_pages):
     return ""
 
 # --------- RUT Utils ---------
+_DV_FACTORS = (2, 3, 4, 5, 6, 7)
+
+# Los mismos RUTs (titular, banco) se validan una y otra vez en cada página
+@lru_cache(maxsize=4096)
 def rut_calc_dv(num_str: str) -> str:
     if not num_str.isdigit():
         return ""
-    digits = list(map(int, reversed(num_str)))
-    factors = [2,3,4,5,6,7]
-    s = sum(d * factors[i % len(factors)] for i, d in enumerate(digits))
+    s = sum(int(d) * f for d, f in zip(reversed(num_str), cycle(_DV_FACTORS)))
     mod = 11 - (s % 11)
     if mod == 11: return "0"
     if mod == 10: return "K"
     return str(mod)
 
 def is_valid_rut(rut: str, dv: str) -> bool:
-    rut_num = re.sub(r"[^\d]", "", rut or "")
+    rut_num = _RE_NON_DIGIT.sub("", rut or "")
     dv = (dv or "").upper()
     if not rut_num or not dv: return False
     return rut_calc_dv(rut_num) == dv
@@ -389,21 +546,18 @@ def extract_cuotas_tasa(text_pages):
     f_venc_1 = ""
     f_venc_ult = ""
     # Cuotas (global)
-    m = re.search(r'\b(?:en\s+)?(\d{1,3})\s+cuotas\b', joined, re.IGNORECASE)
+    m = _RE_CUOTAS.search(joined)
     if m:
         cuotas = m.group(1)
     # Tasa % (buscar cerca de 'tasa' o 'interés' en página 1)
-    for pat in [
-        r'\btasa\b[^%\n\r]{0,80}?([0-9][0-9\.,]{0,4})\s*%',
-        r'inter[eé]s[^%\n\r]{0,80}?([0-9][0-9\.,]{0,4})\s*%'
-    ]:
-        m = re.search(pat, page1, re.IGNORECASE)
+    for pat in _RE_TASA:
+        m = pat.search(page1)
         if m:
             tasa = m.group(1).replace(',', '.').strip() + '%'
             break
     if not tasa:
         # Fallback: cualquier número con % cerca de 'tasa' o 'interes'
-        for m in re.finditer(r'([0-9][0-9\.,]{0,4})\s*%', page1):
+        for m in _RE_PERCENT.finditer(page1):
             start = m.start()
             ctx = page1[max(0, start-120): m.end()+10].lower()
             if 'tasa' in ctx or 'interes' in ctx or 'interés' in ctx:
@@ -411,34 +565,27 @@ def extract_cuotas_tasa(text_pages):
                 tasa = val + '%'
                 break
     # Monto de la cuota: patrón típico 'iguales de $<monto>' en página 1
-    for pat in [
-        r'iguales\s+de\s*\$\s*([0-9\.,]+)',
-        r'cuota\s+mensual[^$\n\r]{0,60}\$\s*([0-9\.,]+)',
-        r'monto\s+de\s+la\s+cuota[^$\n\r]{0,60}\$\s*([0-9\.,]+)'
-    ]:
-        m = re.search(pat, page1, re.IGNORECASE)
+    for pat in _RE_MONTO_CUOTA:
+        m = pat.search(page1)
         if m:
-            clean = re.sub(r'[^\d]', '', m.group(1))
+            clean = _RE_NON_DIGIT.sub('', m.group(1))
             if clean.isdigit():
                 monto_cuota = f"{int(clean):,}".replace(",", ".")
                 break
     # Monto última cuota: 'una última de $ <monto>'
-    m = re.search(r'una\s+[úu]ltima\s+de\s*\$\s*([0-9\.,]+)', page1, re.IGNORECASE)
+    m = _RE_MONTO_ULTIMA.search(page1)
     if m:
-        clean = re.sub(r'[^\d]', '', m.group(1))
+        clean = _RE_NON_DIGIT.sub('', m.group(1))
         if clean.isdigit():
             monto_ultima = f"{int(clean):,}".replace(",", ".")
     # Fechas: primera (a contar del ...) y última (con vencimiento el ...)
-    m = re.search(r'a\s+contar\s+del\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del\s+año\s+(\d{4})', page1, re.IGNORECASE)
+    m = _RE_VENC_A_CONTAR.search(page1)
     if m:
         f_venc_1 = fmt_date(m.group(1), m.group(2), m.group(3))
     if not f_venc_1:
         # Fallbacks
-        for pat in [
-            r'(?:primera|1[aª]?|1\.)\s*cuota[^\n\r]{0,30}(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-            r'(?:primera|1[aª]?|1\.)\s*cuota[^\n\r]{0,60}a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+de\s+(\d{4})',
-        ]:
-            m = re.search(pat, page1, re.IGNORECASE)
+        for pat in _RE_VENC_PRIMERA:
+            m = pat.search(page1)
             if m:
                 if m.lastindex == 1:
                     try:
@@ -453,16 +600,13 @@ def extract_cuotas_tasa(text_pages):
                 if f_venc_1:
                     break
     # Última: buscar alrededor de 'una última de $...' 'con vencimiento el ...'
-    m = re.search(r'una\s+[úu]ltima\s+de\s*\$[^\n\r]{0,80}?con\s+vencimiento\s+el\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del\s+año\s+(\d{4})', page1, re.IGNORECASE)
+    m = _RE_VENC_ULTIMA_MONTO.search(page1)
     if m:
         f_venc_ult = fmt_date(m.group(1), m.group(2), m.group(3))
     if not f_venc_ult:
         # Más flexibles
-        for pat in [
-            r'(?:[úu]ltima|\b\d+\s*/\s*\d+\b\s*cuota)[^\n\r]{0,40}(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})',
-            r'vencimiento\s+el\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del\s+año\s+(\d{4})',
-        ]:
-            m = re.search(pat, page1, re.IGNORECASE)
+        for pat in _RE_VENC_ULTIMA:
+            m = pat.search(page1)
             if m:
                 if m.lastindex == 1:
                     try:
@@ -479,42 +623,208 @@ def extract_cuotas_tasa(text_pages):
     return cuotas, tasa, monto_cuota, monto_ultima, f_venc_1, f_venc_ult
 
 # --------- OCR/PDF ---------
-def ocr_image_to_text(img_path):
+_tess_local = threading.local()
+_OCR_POOL = None
+OCR_THREADS = min(4, os.cpu_count() or 1)
+
+def get_tess_api():
+    """API tesserocr del hilo actual, creada en el primer uso (None si no se puede)."""
+    global TESSEROCR_AVAILABLE
+    api = getattr(_tess_local, "api", None)
+    if api is None and TESSEROCR_AVAILABLE:
+        try:
+            api = _tess_local.api = PyTessBaseAPI(path=TESSDATA_DIR, lang='spa', psm=PSM.AUTO,
+                                                  variables=TESS_VARIABLES)
+            atexit.register(api.End)
+        except Exception as e:
+            TESSEROCR_AVAILABLE = False
+            write_debug(f"⚠️ tesserocr no disponible, se usa pytesseract: {e}")
+    return api
+
+# Texto OCR por hash de la página binarizada: las páginas modelo (condiciones,
+# firmas) se repiten entre los PDFs de un lote y no se vuelven a OCR-ear.
+# Es por proceso y se deja de llenar al llegar a PAGE_TEXT_CACHE_MAX.
+PAGE_TEXT_CACHE_MAX = 1024
+_PAGE_TEXT_CACHE = {}
+
+def _page_digest(page):
+    """SHA-1 de los píxeles de la página (o de los bytes del archivo); None si no se puede leer."""
+    try:
+        if isinstance(page, (str, Path)):
+            return hashlib.sha1(Path(page).read_bytes()).hexdigest()
+        return hashlib.sha1(f"{page.mode}{page.size}".encode() + page.tobytes()).hexdigest()
+    except Exception:
+        return None
+
+def ocr_pages(images):
+    """
+    OCR de varias páginas en hilos, en el orden de entrada: tesserocr suelta el
+    GIL y pytesseract corre en subprocesos, así que los hilos escalan. El pool
+    es del módulo para que cada hilo reutilice su API entre PDFs. Las páginas
+    idénticas a una ya leída (en este tramo o antes) toman su texto del caché.
+    Una página cuyo OCR falló queda como None.
+    """
+    global _OCR_POOL
+    keys = [_page_digest(img) for img in images]
+    # Una sola vez cada página que falta (sin hash: siempre se OCR-ea)
+    todo = {}
+    for i, (key, img) in enumerate(zip(keys, images)):
+        if key is None or (key not in _PAGE_TEXT_CACHE and key not in todo):
+            todo[key if key is not None else i] = img
+    if len(todo) <= 1 or OCR_THREADS <= 1:
+        texts = [ocr_image_to_text(img) for img in todo.values()]
+    else:
+        if _OCR_POOL is None:
+            _OCR_POOL = ThreadPoolExecutor(max_workers=OCR_THREADS)
+        texts = list(_OCR_POOL.map(ocr_image_to_text, todo.values()))
+    fresh = dict(zip(todo, texts))
+    for key, txt in fresh.items():
+        # Ni errores (None) ni páginas vacías: se vuelven a intentar
+        if isinstance(key, str) and txt and len(_PAGE_TEXT_CACHE) < PAGE_TEXT_CACHE_MAX:
+            _PAGE_TEXT_CACHE[key] = txt
+    return [fresh[i] if key is None else fresh[key] if key in fresh else _PAGE_TEXT_CACHE[key]
+            for i, key in enumerate(keys)]
+
+def ocr_image_to_text(page):
+    """
+    OCR de una página: imagen PIL en memoria o ruta a la imagen. Retorna None
+    si el OCR falló (distinto de "", una página que no tiene texto).
+    """
     if not TESSERACT_AVAILABLE:
-        write_debug(f"⚠️ Tesseract no disponible para {img_path}")
-        return ""
+        write_debug(f"⚠️ Tesseract no disponible para {page}")
+        return None
+    is_path = isinstance(page, (str, Path))
     try:
-        img = Image.open(img_path)
-        return pytesseract.image_to_string(img, lang='spa')
+        api = get_tess_api()
+        if api is not None:
+            # Una ruta la lee Leptonica directamente, sin decodificarla con PIL
+            if is_path:
+                api.SetImageFile(str(page))
+            else:
+                api.SetImage(page)
+            return api.GetUTF8Text()
+        with (Image.open(page) if is_path else nullcontext(page)) as img:
+            return pytesseract.image_to_string(img, lang='spa', config=TESS_CONFIG)
     except Exception as e:
-        write_debug(f"ERROR OCR {img_path}: {e}")
-        return ""
+        write_debug(f"ERROR OCR {page if is_path else 'página en memoria'}: {e}")
+        return None
 
-def convert_pdf_to_images(pdf_path, out_folder, poppler_path, dpi=200):
-    out_folder.mkdir(parents=True, exist_ok=True)
+def binarize_page(img):
+    """
+    Escala de grises + umbral de Otsu -> imagen de 1 bit. En PDFs impresos
+    Tesseract lee igual de bien y procesa/lee del disco bastante menos.
+    """
+    gray = img if img.mode == "L" else img.convert("L")
+    hist = gray.histogram()
+    total = sum(hist)
+    sum_all = sum(i * h for i, h in enumerate(hist))
+    w_b = sum_b = 0
+    best_t, best_var = 127, -1.0
+    for t in range(256):
+        w_b += hist[t]
+        if w_b == 0: continue
+        w_f = total - w_b
+        if w_f == 0: break
+        sum_b += t * hist[t]
+        var = w_b * w_f * (sum_b / w_b - (sum_all - sum_b) / w_f) ** 2
+        if var > best_var:
+            best_t, best_var = t, var
+    return gray.point([255 if v > best_t else 0 for v in range(256)], mode="1")
+
+def convert_pdf_to_images(pdf_path, out_folder, poppler_path, dpi=200, batch=PAGE_BATCH):
+    """
+    Rasteriza el PDF por tramos de `batch` páginas y genera, por tramo, una lista
+    de (nombre, página) ya binarizadas. Con out_folder=None quedan en memoria (PIL,
+    sin PNG de ida y vuelta); si no, se guardan como pageN.png y se entregan sus rutas.
+    pdftoppm rasteriza en gris (un tercio de los bytes de RGB) y reparte cada
+    tramo entre OCR_THREADS procesos.
+    Si Poppler falla o entrega menos páginas que las de pdfinfo, el error se
+    registra y se propaga: los tramos ya entregados son un documento truncado.
+    """
     try:
-        images = convert_from_path(str(pdf_path), dpi=dpi, poppler_path=str(poppler_path))
-        outs = []
-        for i, img in enumerate(images, start=1):
-            out = out_folder / f"page{i}.png"
-            img.save(out, "PNG"); outs.append(out)
-        return outs
+        n_pages = pdfinfo_from_path(str(pdf_path), poppler_path=str(poppler_path))["Pages"]
+        if out_folder is not None:
+            out_folder.mkdir(parents=True, exist_ok=True)
+        for first in range(1, n_pages + 1, batch):
+            last = min(n_pages, first + batch - 1)
+            images = convert_from_path(str(pdf_path), dpi=dpi, poppler_path=str(poppler_path),
+                                       first_page=first, last_page=last,
+                                       grayscale=True, thread_count=OCR_THREADS)
+            if len(images) != last - first + 1:
+                raise RuntimeError(f"páginas {first}-{last}: Poppler entregó {len(images)} imágenes")
+            pages = []
+            for i, img in enumerate(images, start=first):
+                name = f"page{i}.png"
+                img = binarize_page(img)
+                if out_folder is not None:
+                    img.save(out_folder / name, "PNG"); img = out_folder / name
+                pages.append((name, img))
+            yield pages
     except Exception as e:
         write_debug(f"ERROR PDF->Images {pdf_path}: {e}")
-        return []
+        raise
+
+def extract_pdf_text_layer(pdf_path, min_chars=TEXT_LAYER_MIN_CHARS, page_min_chars=TEXT_LAYER_PAGE_MIN_CHARS):
+    """
+    Texto embebido del PDF por página (requiere pypdfium2). Devuelve None si no
+    hay capa de texto suficiente (promedio < min_chars por página, o alguna página
+    con menos de page_min_chars, p. ej. un pagaré escaneado) y hay que OCR-ear.
+    """
+    if not PDFIUM_AVAILABLE:
+        return None
+    try:
+        pdf = pdfium.PdfDocument(str(pdf_path))
+    except Exception as e:
+        write_debug(f"WARNING capa de texto {pdf_path}: {e}")
+        return None
+    try:
+        texts = []
+        for i in range(len(pdf)):
+            page = pdf[i]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    texts.append(textpage.get_text_range().replace("\r\n", "\n").replace("\r", "\n"))
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+    except Exception as e:
+        write_debug(f"WARNING capa de texto {pdf_path}: {e}")
+        return None
+    finally:
+        pdf.close()
+    lengths = [len(t.strip()) for t in texts]
+    if not lengths or min(lengths) < page_min_chars or sum(lengths) < min_chars * len(lengths):
+        return None
+    return texts
+
+def prefetch_batches(batches):
+    """
+    Recorre los tramos de convert_pdf_to_images rasterizando el siguiente en un
+    hilo mientras se hace el OCR del actual (Poppler y Tesseract corren fuera
+    del GIL). Mantiene a lo más dos tramos en memoria.
+    """
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        fut = ex.submit(next, batches, None)
+        while True:
+            pages = fut.result()
+            if pages is None:
+                return
+            fut = ex.submit(next, batches, None)
+            yield pages
 
 def find_existing_pdfs():
     if not PDF_INPUT_DIR.exists(): return []
     return sorted(PDF_INPUT_DIR.glob("*.pdf"))
 
 # --------- CC Name/Address/Date helpers ---------
-def _find_after_label(lines, start_idx, label_regex, max_ahead=8):
-    rr = re.compile(label_regex, re.IGNORECASE)
+def _find_after_label(lines, start_idx, label_rx, max_ahead=8):
     for j in range(start_idx, min(len(lines), start_idx + max_ahead)):
-        m = rr.search(lines[j])
+        m = label_rx.search(lines[j])
         if m:
             # tail after label punctuation
-            tail = re.sub(label_regex, "", lines[j], flags=re.IGNORECASE).strip()
+            tail = label_rx.sub("", lines[j]).strip()
             if tail:
                 return tail, j
             # otherwise next non-empty line
@@ -529,11 +839,11 @@ def _split_address_comuna_inline(s):
         addr, tail = s.rsplit(",", 1)
         return addr.strip(), fuzzy_comuna(tail)
     # Try from end building 1..3 tokens to match known comunas
-    toks = [t for t in re.split(r"\s+", s.strip()) if t]
+    toks = [t for t in _RE_SPACES.split(s.strip()) if t]
     for take in range(1, min(4, len(toks)) + 1):
         tail = " ".join(toks[-take:])
         fc = fuzzy_comuna(tail)
-        if fc and fc in COMUNAS:
+        if fc in COMUNAS_SET:
             addr = " ".join(toks[:-take])
             return addr.strip(), fc
     return s.strip(), ""
@@ -544,18 +854,18 @@ def extract_cc_name_addr_comuna_and_date(text_pages):
     name = ""; addr = ""; comuna = ""; fecha = ""
     # Find Cliente/deudor block
     for i, ln in enumerate(lines):
-        if re.search(r'Cliente\s*/?\s*deudor', ln, re.IGNORECASE):
+        if _RE_CLIENTE_DEUDOR.search(ln):
             # Name follows
-            cand, at = _find_after_label(lines, i, r'^\s*Cliente\s*/?\s*deudor\s*[:\-]*\s*')
+            cand, at = _find_after_label(lines, i, _RE_CLIENTE_DEUDOR_LABEL)
             if cand:
                 name = cleanup_name(cand)
             # Address line typically starts with Domicilio
-            a2, at2 = _find_after_label(lines, i, r'^\s*Domicilio\s*[:\-]*\s*')
+            a2, at2 = _find_after_label(lines, i, _RE_DOMICILIO_LABEL)
             if a2:
                 addr, comuna = _split_address_comuna_inline(a2)
             break
     # Date like: En SANTIAGO, a 13 de FEBRERO del año 2025
-    m = re.search(r'\bEn\s+[A-ZÁÉÍÓÚÑ\s]+,?\s*a\s+(\d{1,2})\s+de\s+([A-Za-záéíóúñÑ]+)\s+del?\s+año\s+(\d{4})', joined, re.IGNORECASE)
+    m = _RE_FECHA_EN_CIUDAD.search(joined)
     if m:
         fecha = fmt_date(m.group(1), m.group(2), m.group(3))
     if not fecha:
@@ -563,39 +873,61 @@ def extract_cc_name_addr_comuna_and_date(text_pages):
     return name, addr, comuna, fecha
 
 # --------- Procesamiento ---------
+PP_INDICATORS = ("PAGARÉ", "PAGARE", "DOCUMENTO MERCANTIL", "ME OBLIGO A PAGAR")
+CC_INDICATORS = ("CRÉDITO DE CONSUMO", "CREDITO DE CONSUMO", "CUOTAS", "TASA DE INTERÉS", "PLAN DE PAGOS")
+# Página que un match de _RE_DETECT_CUOTAS puede atravesar entera (sólo espacios/dígitos)
+_RE_BRIDGE_PAGE = re.compile(r'[\s\d]*')
+
 def detect_document_type(text_pages):
-    combined = "\n".join(text_pages)
-    up = combined.upper()
-    pp_ind = ["PAGARÉ", "PAGARE", "DOCUMENTO MERCANTIL", "ME OBLIGO A PAGAR"]
-    cc_ind = ["CRÉDITO DE CONSUMO", "CREDITO DE CONSUMO", "CUOTAS", "TASA DE INTERÉS", "PLAN DE PAGOS"]
-    pp = sum(1 for s in pp_ind if s in up)
-    cc = sum(1 for s in cc_ind if s in up)
-    if re.search(r'\ben\s+\d+\s+cuotas\b', combined, re.IGNORECASE): cc += 2
+    """
+    PP si suma más indicadores de pagaré que de crédito de consumo, si no CC.
+    Recorre las páginas en orden y se detiene cuando los puntos que aún quedan
+    por sumar ya no pueden cambiar el resultado.
+    """
+    pp_found = set(); cc_found = set()
+    cuotas = False
+    prev = None
+    pp = cc = 0
+    for page in text_pages:
+        page_up = page.upper()
+        pp_found.update(ind for ind in PP_INDICATORS if ind not in pp_found and ind in page_up)
+        cc_found.update(ind for ind in CC_INDICATORS if ind not in cc_found and ind in page_up)
+        # "en N cuotas" puede cruzar el salto de página: ventana con la página anterior
+        # (y las que un match atravesaría enteras, como las en blanco)
+        window = page if prev is None else f"{prev}\n{page}"
+        prev = window if prev is not None and _RE_BRIDGE_PAGE.fullmatch(page) else page
+        cuotas = cuotas or bool(_RE_DETECT_CUOTAS.search(window))
+        pp = len(pp_found)
+        cc = len(cc_found) + (2 if cuotas else 0)
+        # Máximo alcanzable por cada tipo con lo que falta por encontrar
+        pp_max = pp + len(PP_INDICATORS) - len(pp_found)
+        cc_max = cc + len(CC_INDICATORS) - len(cc_found) + (0 if cuotas else 2)
+        if pp > cc_max or cc >= pp_max:
+            break
     return "PP" if pp > cc else "CC"
 
 def process_document_unified(text_pages, doc_type, source_name: str | None = None):
-    rows = []
+    # Una sola pasada por las páginas: se queda con la mejor (empate -> la
+    # primera) y con la primera operación; el resto se extrae de la mejor página
+    best = {}; best_text = ""; best_score = -1
+    operation = ""
     for text in text_pages:
         op = extract_operation_from_text(text)
         ruts = find_all_ruts(text)
         rut, dv = choose_rut_for_doc(text, ruts, doc_type) if ruts else ("","")
         nombre = extract_nombre_generic(text)
-        direccion, comuna = extract_domicilio_and_comuna(text)
-        fecha_sus = parse_spanish_date(text)
-        monto_fmt, _ = extract_amount(text)
-        rows.append({
-            "text": text,
-            "OPERACIÓN": op, "RUT": rut, "DV": dv, "NOMBRE": nombre,
-            "DIRECCION": direccion, "COMUNA": comuna,
-            "FECHA_SUSCRIPCION": fecha_sus, "MONTO_CREDITO": monto_fmt
-        })
-    def score_row_basic(r):
-        return (50 if r.get("OPERACIÓN") else 0) + (30 if r.get("RUT") else 0) + (20 if r.get("NOMBRE") else 0)
-    best = max(rows, key=score_row_basic) if rows else {}
-    operation = extract_operation_allpages([r["text"] for r in rows]) or best.get("OPERACIÓN","")
+        score = (50 if op else 0) + (30 if rut else 0) + (20 if nombre else 0)
+        if score > best_score:
+            best = {"OPERACIÓN": op, "RUT": rut, "DV": dv, "NOMBRE": nombre}
+            best_text = text; best_score = score
+        operation = operation or op
+    if best:
+        best["DIRECCION"], best["COMUNA"] = extract_domicilio_and_comuna(best_text)
+        best["FECHA_SUSCRIPCION"] = parse_spanish_date(best_text)
+        best["MONTO_CREDITO"], _ = extract_amount(best_text)
     # Prefer operation from filename if available
     if source_name:
-        m = re.search(r'(\d{6,})', source_name)
+        m = _RE_DIGIT_RUNS.search(source_name)
         if m:
             operation = m.group(1)
     cuotas, tasa, monto_cuota, monto_ult, f_v1, f_vu = extract_cuotas_tasa(text_pages)
@@ -630,20 +962,222 @@ def process_document_unified(text_pages, doc_type, source_name: str | None = Non
         "EXHORTO": "SANTIAGO", "SUCURSAL": "SANTIAGO", "PRODUCTO": doc_type,
         "NOMBRE_APODERADO": "", "NOMBRE_APODERADO_2": "",
     }
-    write_debug("---- COMBINED ROW SANTANDER ----")
-    for k,v in final_row.items(): write_debug(f"{k}: {v}")
-    write_debug("---- END COMBINED ROW SANTANDER ----\n")
+    write_debug("---- COMBINED ROW SANTANDER ----\n"
+                + "\n".join(f"{k}: {v}" for k, v in final_row.items())
+                + "\n---- END COMBINED ROW SANTANDER ----\n")
     return final_row
 
+# --------- Pipeline por PDF ---------
+# DPI con el que se reintenta un PDF cuyo RUT no valida a menor resolución
+FALLBACK_DPI = 200
+
+def pdf_content_hash(pdf_path):
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def _ocr_cache_file(pdf_path, dpi, cache_dir):
+    """
+    Ruta del texto OCR cacheado de este PDF, DPI y ajustes de OCR (None sin caché
+    o si no se puede leer el PDF).
+    """
+    if cache_dir is None:
+        return None
+    try:
+        return cache_dir / f"{pdf_content_hash(pdf_path)}-{dpi}-{OCR_CACHE_SETTINGS}.json"
+    except OSError as e:
+        write_debug(f"WARNING cache OCR {pdf_path}: {e}")
+        return None
+
+def _save_ocr_cache(cache_file, text_pages):
+    # Se escribe en un temporal y se renombra: el JSON aparece completo o no
+    # aparece (ejecuciones concurrentes/cortadas)
+    tmp = cache_file.with_name(f"{cache_file.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(text_pages, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        write_debug(f"WARNING cache OCR {cache_file}: {e}")
+        tmp.unlink(missing_ok=True)
+
+def ocr_pdf_pages(pdf_path, ri_folder, dpi, log=print, cache_dir=None):
+    """
+    PDF -> páginas rasterizadas -> textos por página (lista vacía si no hubo páginas
+    o si la rasterización falló: no se extrae de un documento incompleto).
+    Con cache_dir el resultado se guarda por contenido del PDF y DPI, y una corrida
+    posterior sobre el mismo PDF lo reutiliza sin rasterizar ni OCR. Sólo se
+    cachea un documento completo en el que ninguna página falló el OCR.
+    """
+    cache_file = _ocr_cache_file(pdf_path, dpi, cache_dir)
+    if cache_file is not None and cache_file.is_file():
+        try:
+            text_pages = json.loads(cache_file.read_text(encoding="utf-8"))
+            for i, txt in enumerate(text_pages, start=1):
+                write_debug(f"--- PAGE OCR (caché): page{i} ---")
+                write_debug(txt[:8000])
+            log(f"  📦 OCR en caché: {len(text_pages)} páginas ({dpi} DPI)")
+            return text_pages
+        except (OSError, ValueError) as e:
+            write_debug(f"WARNING cache OCR {cache_file}: {e}")
+    text_pages = []
+    ocr_failed = False
+    try:
+        for pages in prefetch_batches(convert_pdf_to_images(pdf_path, ri_folder, POPPLER_BIN, dpi=dpi)):
+            texts = ocr_pages([img for _, img in pages])
+            for (name, _), txt in zip(pages, texts):
+                log(f"    🔍 OCR imagen: {name}")
+                if txt is None:
+                    ocr_failed, txt = True, ""
+                write_debug(f"--- PAGE OCR: {name} ---")
+                write_debug(txt[:8000])
+                text_pages.append(txt)
+    except Exception:
+        # convert_pdf_to_images ya dejó el error en el debug
+        log(f"  ❌ ERROR rasterizando {pdf_path.name} ({dpi} DPI)")
+        return []
+    log(f"  📄 Procesadas {len(text_pages)} páginas ({dpi} DPI)")
+    # convert_pdf_to_images garantiza todas las páginas de pdfinfo; con alguna
+    # página sin OCR no se cachea: se reintenta la próxima vez
+    if cache_file is not None and text_pages and not ocr_failed:
+        _save_ocr_cache(cache_file, text_pages)
+    return text_pages
+
+def _process_one_pdf(pdf_path, ri_root, dpi, verbose=False, cache_dir=None):
+    """
+    PDF -> imágenes -> OCR -> detección -> fila unificada (si el PDF trae capa de
+    texto se usa directamente, sin OCR). Si se usó un DPI menor a FALLBACK_DPI y
+    el RUT no valida, repite el OCR a FALLBACK_DPI. El OCR se cachea en cache_dir
+    (None: sin caché). Sin PAGES_IN_MEMORY las páginas pasan por ri_root/<pdf>
+    (process_pdfs borra ri_root al final).
+    Corre en un proceso hijo cuando hay varios workers, así que no escribe el
+    debug: retorna (fila o None, líneas de debug) para que lo haga el padre.
+    """
+    global _DEBUG_CAPTURE
+    _DEBUG_CAPTURE = lines = []
+    log = print if verbose else (lambda *a: None)
+    try:
+        if not pdf_path.exists():
+            write_debug(f"WARN: PDF no existe -> {pdf_path}")
+            return None, lines
+        log(f"🔄 Procesando PDF: {pdf_path.name}")
+        ri_folder = None if PAGES_IN_MEMORY else ri_root / pdf_path.stem
+        try:
+            layer = extract_pdf_text_layer(pdf_path)
+            if layer:
+                # PDF con capa de texto: no se rasteriza ni se pasa por Tesseract
+                log(f"  📝 Capa de texto en {len(layer)} páginas, se omite el OCR")
+                for i, txt in enumerate(layer, start=1):
+                    write_debug(f"--- PAGE TEXT: page{i} ---")
+                    write_debug(txt[:8000])
+                text_pages = layer
+            else:
+                text_pages = ocr_pdf_pages(pdf_path, ri_folder, dpi, log, cache_dir)
+            if not text_pages:
+                log(f"  ❌ ERROR: no se generaron imágenes para {pdf_path.name}")
+                return None, lines
+            doc_type = detect_document_type(text_pages)
+            log(f"  📋 Tipo detectado: {doc_type}")
+            row = process_document_unified(text_pages, doc_type, source_name=pdf_path.name)
+            if not layer and dpi < FALLBACK_DPI and not is_valid_rut(row["RUT"], row["DV"]):
+                log(f"  🔁 RUT no válido a {dpi} DPI, reintentando a {FALLBACK_DPI} DPI")
+                write_debug(f"[DPI] Reintento {pdf_path.name} a {FALLBACK_DPI} DPI (RUT {row['RUT']}-{row['DV']})")
+                retry_pages = ocr_pdf_pages(pdf_path, ri_folder, FALLBACK_DPI, log, cache_dir)
+                if retry_pages:
+                    doc_type = detect_document_type(retry_pages)
+                    row = process_document_unified(retry_pages, doc_type, source_name=pdf_path.name)
+            log(f"  ✅ Extraído: RUT {row['RUT']}-{row['DV']}, {row['NOMBRE']} ({doc_type})")
+            return row, lines
+        except Exception as e:
+            log(f"  ❌ ERROR procesando {pdf_path.name}: {str(e)}")
+            write_debug(f"ERROR procesando {pdf_path.name}: {e}")
+            return None, lines
+    finally:
+        _DEBUG_CAPTURE = None
+
+def _init_worker(ocr_threads):
+    """
+    Proceso hijo: reparte entre hilos de OCR los núcleos que le tocan y crea
+    la API tesserocr del hilo principal una sola vez.
+    """
+    global OCR_THREADS
+    OCR_THREADS = ocr_threads
+    get_tess_api()
+
+def process_pdfs(pdfs, ri_root, dpi, workers=None, verbose=False, cache_dir=OCR_CACHE_DIR):
+    """
+    Procesa los PDFs (en procesos paralelos si workers > 1) y retorna las filas
+    en el orden de entrada. El debug de cada PDF se escribe aquí, en orden.
+    Las páginas en disco (sin PAGES_IN_MEMORY) quedan bajo ri_root, que se
+    borra una sola vez al terminar la corrida. cache_dir=None desactiva la caché de OCR.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pdfs)))
+    ex = None
+    if workers > 1:
+        flush_debug()  # que los procesos hijos no hereden lo pendiente
+        # Hilos de OCR por proceso: los núcleos que sobran tras repartir procesos
+        ocr_threads = max(1, min(OCR_THREADS, (os.cpu_count() or 1) // workers))
+        ex = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(ocr_threads,))
+    if ex and verbose:
+        print(f"⚙️  Procesando con {workers} procesos en paralelo")
+    try:
+        args = (pdfs, repeat(ri_root), repeat(dpi), repeat(verbose), repeat(cache_dir))
+        results = ex.map(_process_one_pdf, *args) if ex else map(_process_one_pdf, *args)
+        all_rows = []
+        for row, lines in results:
+            if lines:
+                write_debug("\n".join(lines))
+                flush_debug()
+            if row:
+                all_rows.append(row)
+        return all_rows
+    finally:
+        if ex: ex.shutdown()
+        if not PAGES_IN_MEMORY:
+            try:
+                if ri_root.exists(): shutil.rmtree(ri_root)
+            except Exception as e:
+                write_debug(f"WARNING cleanup {ri_root}: {e}")
+
+# --------- Verificador ---------
+CRITICAL_FIELDS = ("OPERACION_1", "RUT", "DV", "NOMBRE", "COMUNA")
+
+# --------- Excel ---------
+def results_frame(rows):
+    """Filas unificadas -> DataFrame con columnas de texto (dtype string, sin inferir tipos)."""
+    return pd.DataFrame(rows, columns=UNIFIED_COLUMNS, dtype="string")
+
+def write_results_xlsx(df, path):
+    """
+    Guarda el DataFrame con un workbook write-only de openpyxl: las filas se
+    serializan a medida que se agregan, sin celdas con estilo en memoria.
+    Misma hoja y cabecera que df.to_excel(path, index=False).
+    """
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(list(df.columns))
+    for t in df.itertuples(index=False, name=None):
+        ws.append(list(t))
+    wb.save(str(path))
+
 # --------- Main ---------
 def main():
     parser = argparse.ArgumentParser(description="Procesar PDFs Santander (PP/CC) -> Excel")
-    parser.add_argument("--dpi", type=int, default=200, help="DPI para convertir PDF a imágenes")
+    parser.add_argument("--dpi", type=int, default=150,
+                        help=f"DPI para convertir PDF a imágenes (por defecto 150; reintenta a {FALLBACK_DPI} si el RUT no valida)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Procesos en paralelo (1 = secuencial; por defecto nº de CPUs)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Ignorar la caché de OCR ({OCR_CACHE_DIR}) y volver a procesar todos los PDFs")
     args = parser.parse_args()
 
     print("🚀 Inicio: proceso Santander UNIFICADO (PP/CC)")
     DEBUG_FILE.parent.mkdir(parents=True, exist_ok=True)
     DEBUG_FILE.unlink(missing_ok=True)
+    flush_debug()  # avisos de la carga del módulo
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
     if not TESSERACT_AVAILABLE:
@@ -656,59 +1190,29 @@ def main():
         return
     print(f"📁 Encontrados {len(pdfs)} PDFs para procesar")
 
-    all_rows = []
-    for pdf in pdfs:
-        print(f"🔄 Procesando PDF: {pdf.name}")
-        ri_folder = TEMP_RI_ROOT / pdf.stem
-        text_pages = []
-        try:
-            images = convert_pdf_to_images(pdf, ri_folder, POPPLER_BIN, dpi=args.dpi)
-            if not images:
-                print(f"  ❌ ERROR: no se generaron imágenes para {pdf.name}")
-                continue
-            print(f"  📄 Generadas {len(images)} páginas")
-            for img in images:
-                print(f"    🔍 OCR imagen: {img.name}")
-                txt = ocr_image_to_text(img)
-                write_debug(f"--- PAGE OCR: {img.name} ---")
-                write_debug(txt[:8000])
-                text_pages.append(txt)
-            doc_type = detect_document_type(text_pages)
-            print(f"  📋 Tipo detectado: {doc_type}")
-            row = process_document_unified(text_pages, doc_type, source_name=pdf.name)
-            all_rows.append(row)
-            print(f"  ✅ Extraído: RUT {row['RUT']}-{row['DV']}, {row['NOMBRE']} ({doc_type})")
-        except Exception as e:
-            print(f"  ❌ ERROR procesando {pdf.name}: {str(e)}")
-            write_debug(f"ERROR procesando {pdf.name}: {e}")
-        finally:
-            try:
-                if ri_folder.exists(): shutil.rmtree(ri_folder)
-            except Exception as e:
-                write_debug(f"WARNING cleanup {ri_folder}: {e}")
+    ri_root = TEMP_RI_ROOT / f"run_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    all_rows = process_pdfs(pdfs, ri_root, args.dpi, workers=args.workers, verbose=True,
+                            cache_dir=None if args.no_cache else OCR_CACHE_DIR)
 
     if all_rows:
-        df_new = pd.DataFrame(all_rows, columns=UNIFIED_COLUMNS)
+        df_new = results_frame(all_rows)
         if GEO_UTILS_AVAILABLE:
             print("📋 Aplicando correcciones de referencia...")
             df_new = apply_reference_corrections(df_new)
         # Verificador rápido
-        missing_counts = {k: 0 for k in ["OPERACION_1","RUT","DV","NOMBRE","COMUNA"]}
-        for _, row in df_new.iterrows():
-            for k in missing_counts:
-                if not str(row.get(k, "")).strip():
-                    missing_counts[k] += 1
+        missing_counts = count_missing(df_new, CRITICAL_FIELDS)
         write_debug("\n==== VERIFICADOR DE CAMPOS CRÍTICOS ====")
         for k, v in missing_counts.items():
             write_debug(f"Faltantes {k}: {v}")
         write_debug("=======================================\n")
+        flush_debug()
 
         try:
-            df_new.to_excel(OUT_XLSX, index=False)
+            write_results_xlsx(df_new, OUT_XLSX)
             print(f"✅ Guardado final en: {OUT_XLSX}")
         except PermissionError:
             alt = OUT_DIR / f"Santander_results_UNIFIED_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            df_new.to_excel(alt, index=False)
+            write_results_xlsx(df_new, alt)
             print(f"⚠️ Archivo Excel en uso. Guardado en: {alt}")
         print(f"📋 Debug info en: {DEBUG_FILE}")
         print(f"📊 Filas extraídas: {len(all_rows)}")
@@ -719,7 +1223,7 @@ if __name__ == "__main__":
     main()
 
 # --------------- Public API for Web use ---------------
-def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: str | None = None, fast: bool = False, dpi: int | None = None) -> tuple[str, str]:
+def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: str | None = None, fast: bool = False, dpi: int | None = None, workers: int | None = None) -> tuple[str, str]:
     """
     Procesa una lista de rutas de PDFs y genera un Excel con el resultado.
     Devuelve (excel_path, debug_file_path).
@@ -738,6 +1242,7 @@ def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: s
 
     # Redirigir temporalmente el debug global a este archivo
     global DEBUG_FILE
+    flush_debug()  # lo pendiente va al debug anterior
     prev_debug = DEBUG_FILE
     DEBUG_FILE = debug_path
     try:
@@ -750,53 +1255,28 @@ def process_pdf_files(pdf_paths: list[str], geocode: bool = False, output_dir: s
         if not TESSERACT_AVAILABLE:
             raise RuntimeError("Tesseract no disponible en el servidor")
 
-        all_rows = []
-        dpi_val = dpi if dpi is not None else (150 if fast else 200)
-        for pdf in pdf_paths:
-            pdf_path = Path(pdf)
-            if not pdf_path.exists():
-                write_debug(f"WARN: PDF no existe -> {pdf}")
-                continue
-            ri_folder = ri_root / pdf_path.stem
-            text_pages = []
-            try:
-                images = convert_pdf_to_images(pdf_path, ri_folder, POPPLER_BIN, dpi=dpi_val)
-                for img in images:
-                    txt = ocr_image_to_text(img)
-                    write_debug(f"--- PAGE OCR: {img.name} ---")
-                    write_debug(txt[:8000])
-                    text_pages.append(txt)
-                doc_type = detect_document_type(text_pages)
-                row = process_document_unified(text_pages, doc_type, source_name=pdf_path.name)
-                all_rows.append(row)
-            except Exception as e:
-                write_debug(f"ERROR procesando {pdf_path.name}: {e}")
-            finally:
-                try:
-                    if ri_folder.exists(): shutil.rmtree(ri_folder)
-                except Exception as e:
-                    write_debug(f"WARNING cleanup {ri_folder}: {e}")
+        dpi_val = dpi if dpi is not None else (120 if fast else 150)
+        # Sin caché de OCR: el texto de los documentos subidos no queda en disco
+        all_rows = process_pdfs([Path(pdf) for pdf in pdf_paths], ri_root, dpi_val, workers=workers,
+                                cache_dir=None)
 
         if not all_rows:
-            pd.DataFrame(columns=UNIFIED_COLUMNS).to_excel(xlsx_path, index=False)
+            write_results_xlsx(pd.DataFrame(columns=UNIFIED_COLUMNS), xlsx_path)
             return str(xlsx_path), str(debug_path)
 
-        df_new = pd.DataFrame(all_rows, columns=UNIFIED_COLUMNS)
+        df_new = results_frame(all_rows)
         if GEO_UTILS_AVAILABLE and geocode:
             df_new = apply_reference_corrections(df_new)
 
         # Verificador rápido de campos críticos (web)
-        missing_counts = {k: 0 for k in ["OPERACION_1","RUT","DV","NOMBRE","COMUNA"]}
-        for _, row in df_new.iterrows():
-            for k in missing_counts:
-                if not str(row.get(k, "")).strip():
-                    missing_counts[k] += 1
+        missing_counts = count_missing(df_new, CRITICAL_FIELDS)
         write_debug("\n==== VERIFICADOR DE CAMPOS CRÍTICOS (web) ====")
         for k, v in missing_counts.items():
             write_debug(f"Faltantes {k}: {v}")
         write_debug("==============================================\n")
 
-        df_new.to_excel(xlsx_path, index=False)
+        write_results_xlsx(df_new, xlsx_path)
         return str(xlsx_path), str(debug_path)
     finally:
+        flush_debug()
         DEBUG_FILE = prev_debug
@@ -5,23 +5,33 @@
 Script simple para probar el debug - solo genera debug.txt
 """
 
+import importlib
 import sys
-import os
 from pathlib import Path
 
 # Agregar directorio actual al path
 sys.path.insert(0, str(Path(__file__).parent))
 
+def run_stage(module_name, argv):
+    """Llama al main() de una etapa en este mismo intérprete; un sys.exit() no corta el resto."""
+    try:
+        # Import diferido: ocr_to_csv sale con sys.exit() si faltan dependencias
+        importlib.import_module(module_name).main(argv)
+    except SystemExit as e:
+        if e.code:
+            print(f"⚠️ La etapa terminó con código {e.code}")
+
+
 def main():
     """Ejecuta OCR con debug simple."""
     print("🔧 Iniciando debug simple...")
     
     try:
         # Ejecutar OCR con debug
-        os.system('python ocr_to_csv.py --client Itau --pdfs-dir pdfs/Itau --debug --verbose')
+        run_stage("ocr_to_csv", ["--client", "Itau", "--pdfs-dir", "pdfs/Itau", "--debug", "--verbose"])
         
         # Ejecutar procesamiento
-        os.system('python process_itau_auto_v2.py --input Itau_results_ALL.csv --format excel -vv')
+        run_stage("process_itau_auto_v2", ["--input", "Itau_results_ALL.csv", "--format", "excel", "-vv"])
         
         print("\n✅ Debug completado!")
         print("📂 Revisa la carpeta debug_output/ para el archivo debug_XXXXX.txt")
@@ -23,11 +23,11 @@ def verificar_procesamiento_multiple():
         print(f"✅ Coincidencia: {'SÍ' if len(df) == len(pdf_files) else 'NO'}")
         
         print("\n📋 RESUMEN POR FILA:")
-        for i, row in df.iterrows():
-            tipo_doc = row['PRODUCTO']
-            rut_completo = f"{row['RUT']}-{row['DV']}"
-            print(f"  Fila {i+1}: {row['NOMBRE'][:30]}... -> RUT: {rut_completo} [{tipo_doc}]")
-            print(f"           Dirección: {row['DIRECCION']}, {row['COMUNA']}")
+        for i, row in enumerate(df.itertuples(index=False), start=1):
+            tipo_doc = row.PRODUCTO
+            rut_completo = f"{row.RUT}-{row.DV}"
+            print(f"  Fila {i}: {row.NOMBRE[:30]}... -> RUT: {rut_completo} [{tipo_doc}]")
+            print(f"           Dirección: {row.DIRECCION}, {row.COMUNA}")
     else:
         print(f"\n❌ No se encontró archivo de resultados: {excel_file}")
     
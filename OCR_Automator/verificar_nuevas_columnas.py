@@ -39,20 +39,20 @@ def verificar_nuevas_columnas():
     
     print()
     print("📋 DATOS DETALLADOS POR FILA:")
-    for i, row in df.iterrows():
-        print(f"\n--- FILA {i+1}: {row['NOMBRE']} [{row['PRODUCTO']}] ---")
-        print(f"  RUT: {row['RUT']}-{row['DV']}")
-        print(f"  Operación: {row.get('OPERACION_1', 'N/A')}")
-        print(f"  Fecha Suscripción: {row.get('FECHA_SUSCRIPCION_1', 'N/A')}")
-        print(f"  Fecha Venc. 1ra Cuota: {row.get('FECHA_VENCIMIENTO_1_CUOTA_1', 'N/A')}")
-        print(f"  Fecha Venc. Última Cuota: {row.get('FECHA_VENCIMIENTO_ULTIMA_CUOTA_1', 'N/A')}")
-        print(f"  Dirección: {row['DIRECCION']}")
-        print(f"  Comuna: {row['COMUNA']}")
+    for i, row in enumerate(df.itertuples(index=False), start=1):
+        print(f"\n--- FILA {i}: {row.NOMBRE} [{row.PRODUCTO}] ---")
+        print(f"  RUT: {row.RUT}-{row.DV}")
+        print(f"  Operación: {getattr(row, 'OPERACION_1', 'N/A')}")
+        print(f"  Fecha Suscripción: {getattr(row, 'FECHA_SUSCRIPCION_1', 'N/A')}")
+        print(f"  Fecha Venc. 1ra Cuota: {getattr(row, 'FECHA_VENCIMIENTO_1_CUOTA_1', 'N/A')}")
+        print(f"  Fecha Venc. Última Cuota: {getattr(row, 'FECHA_VENCIMIENTO_ULTIMA_CUOTA_1', 'N/A')}")
+        print(f"  Dirección: {row.DIRECCION}")
+        print(f"  Comuna: {row.COMUNA}")
         
         # Verificar correcciones N->Ñ
-        nombre_tiene_ene = 'Ñ' in str(row['NOMBRE'])
-        direccion_tiene_ene = 'Ñ' in str(row['DIRECCION'])
-        comuna_tiene_ene = 'Ñ' in str(row['COMUNA'])
+        nombre_tiene_ene = 'Ñ' in str(row.NOMBRE)
+        direccion_tiene_ene = 'Ñ' in str(row.DIRECCION)
+        comuna_tiene_ene = 'Ñ' in str(row.COMUNA)
         
         if nombre_tiene_ene or direccion_tiene_ene or comuna_tiene_ene:
             print(f"  🔤 Correcciones N->Ñ aplicadas: ", end="")
@@ -6,11 +6,11 @@ print(f'Total filas: {len(df)}')
 print()
 
 print('RUTs VERIFICADOS:')
-for i, row in df.iterrows():
-    rut_completo = f"{row['RUT']}-{row['DV']}"
-    print(f'  Fila {i+1}: {row["NOMBRE"]} -> RUT: {rut_completo} [{row["PRODUCTO"]}]')
+for i, row in enumerate(df.itertuples(index=False), start=1):
+    rut_completo = f"{row.RUT}-{row.DV}"
+    print(f'  Fila {i}: {row.NOMBRE} -> RUT: {rut_completo} [{row.PRODUCTO}]')
 
 print()
 print('OPERACIONES:')
-for i, row in df.iterrows():
-    print(f'  PDF {i+1}: Operación {row["OPERACION_1"]} - {row["DIRECCION"]}, {row["COMUNA"]}')
\ No newline at end of file
+for i, row in enumerate(df.itertuples(index=False), start=1):
+    print(f'  PDF {i}: Operación {row.OPERACION_1} - {row.DIRECCION}, {row.COMUNA}')
\ No newline at end of file
@@ -1,6 +1,11 @@
+import hashlib
 import os
 import sys
 import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from flask import Flask, request, render_template, redirect, url_for, session, send_file, flash
@@ -20,18 +25,78 @@ app.secret_key = os.environ.get("OCR_AUTOMATOR_SECRET", "dev-secret-change-me")
 
 CONFIG_PATH = BASE_DIR / "config" / "web_config.json"
 
+@lru_cache(maxsize=8)
+def _load_credentials_cached(mtime: float):
+    # mtime en la clave: al editar web_config.json se relee sin reiniciar
+    data = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
+    return {u.get("username"): u.get("password") for u in data.get("users", [])}
+
+
 def load_credentials():
-    if CONFIG_PATH.exists():
-        try:
-            data = json.loads(CONFIG_PATH.read_text(encoding="utf-8"))
-            users = {u.get("username"): u.get("password") for u in data.get("users", [])}
-            return users
-        except Exception:
-            pass
+    try:
+        return _load_credentials_cached(CONFIG_PATH.stat().st_mtime)
+    except Exception:
+        pass
     # default creds (dev only)
     return {"admin": "change_me"}
 
-USERS = load_credentials()
+# Cola de trabajos OCR: /upload encola y /results consulta el estado.
+# Un solo worker: los process_pdf_files cambian DEBUG_FILE global de su módulo.
+JOB_WORKERS = int(os.environ.get("OCR_AUTOMATOR_JOB_WORKERS", "1"))
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ocr-job")
+JOBS = {}
+JOBS_LOCK = threading.Lock()
+# (banco, dpi, geocode, PDFs por nombre+SHA-1) -> (excel, debug) de un trabajo ya hecho.
+# Sólo en memoria: una subida repetida se reutiliza dentro del mismo proceso del
+# servidor; tras reiniciarlo se vuelve a procesar completa (la web no usa las
+# cachés de OCR/rasterizado de los scripts)
+RESULT_CACHE = {}
+
+BANK_PROCESSORS = {
+    "itau": (process_itau_files, "Itau"),
+    "santander": (process_santander_files, "Santander"),
+    "indisa": (process_indisa_files, "Indisa"),
+}
+
+
+def _update_job(job_id, **fields):
+    with JOBS_LOCK:
+        JOBS[job_id].update(fields)
+
+
+def job_cache_key(bank, pdf_paths, dpi_val, geocode_flag):
+    """Clave del resultado: mismo banco, calidad, geocode y mismos PDFs (nombre y contenido)."""
+    pdfs = tuple(sorted(
+        (Path(p).name, hashlib.sha1(Path(p).read_bytes()).hexdigest()) for p in pdf_paths
+    ))
+    return (bank, dpi_val, bool(geocode_flag), pdfs)
+
+
+def run_ocr_job(job_id, bank, pdf_paths, geocode_flag, dpi_val, tmp_dir):
+    """Ejecuta el pipeline del banco en segundo plano y registra el resultado en JOBS."""
+    process_files, bank_dir = BANK_PROCESSORS[bank]
+    _update_job(job_id, status="running")
+    try:
+        key = job_cache_key(bank, pdf_paths, dpi_val, geocode_flag)
+        with JOBS_LOCK:
+            cached = RESULT_CACHE.get(key)
+        # Reutiliza el Excel de una subida idéntica mientras siga en disco
+        if cached and all(Path(p).exists() for p in cached):
+            excel_path, debug_path = cached
+        else:
+            out_dir = BASE_DIR / "outputs" / bank_dir / "web"
+            excel_path, debug_path = process_files(pdf_paths, geocode=geocode_flag, output_dir=str(out_dir), dpi=dpi_val)
+            with JOBS_LOCK:
+                RESULT_CACHE[key] = (excel_path, debug_path)
+        _update_job(job_id, status="done", excel=excel_path, debug=debug_path)
+    except Exception as e:
+        _update_job(job_id, status="error", error=str(e))
+    finally:
+        # Limpiar subidas temporales
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            pass
 
 
 def login_required(view_func):
@@ -48,7 +113,7 @@ def login():
     if request.method == "POST":
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "").strip()
-        if USERS.get(username) == password:
+        if load_credentials().get(username) == password:
             session["user"] = username
             return redirect(url_for("upload"))
         flash("Credenciales inválidas", "error")
@@ -95,83 +160,73 @@ def upload():
         if not pdf_paths:
             flash("No se detectaron PDFs válidos", "error")
             return redirect(url_for("upload"))
-        try:
-            if bank == "santander":
-                out_dir = BASE_DIR / "outputs" / "Santander" / "web"
-                excel_path, debug_path = process_santander_files(pdf_paths, geocode=geocode_flag, output_dir=str(out_dir), dpi=dpi_val)
-            elif bank == "indisa":
-                out_dir = BASE_DIR / "outputs" / "Indisa" / "web"
-                excel_path, debug_path = process_indisa_files(pdf_paths, geocode=geocode_flag, output_dir=str(out_dir), dpi=dpi_val)
-            else:
-                out_dir = BASE_DIR / "outputs" / "Itau" / "web"
-                excel_path, debug_path = process_itau_files(pdf_paths, geocode=geocode_flag, output_dir=str(out_dir), dpi=dpi_val)
-            # Redirigir a resultados para ofrecer enlaces a Excel y Debug
-            session["last_result_excel"] = excel_path
-            session["last_result_debug"] = debug_path
-            session["last_result_bank"] = ("santander" if bank == "santander" else ("indisa" if bank == "indisa" else "itau"))
-            session["last_bank"] = session["last_result_bank"]
-            flash("Procesamiento completado. Descarga disponible abajo.", "info")
-            return redirect(url_for("results"))
-        except Exception as e:
-            flash(f"Error procesando PDFs: {e}", "error")
-            return redirect(url_for("upload"))
-        finally:
-            # Limpiar subidas temporales
-            try:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-            except Exception:
-                pass
+        if bank not in BANK_PROCESSORS:
+            bank = "itau"
+        job_id = uuid.uuid4().hex
+        with JOBS_LOCK:
+            JOBS[job_id] = {"status": "queued", "bank": bank, "user": session.get("user")}
+        JOB_EXECUTOR.submit(run_ocr_job, job_id, bank, pdf_paths, geocode_flag, dpi_val, tmp_dir)
+        session["last_bank"] = bank
+        flash(f"Procesando {len(pdf_paths)} PDF(s). Esta página se actualizará al terminar.", "info")
+        return redirect(url_for("results", job=job_id))
     return render_template("upload.html", user=session.get("user"), selected_bank=session.get("last_bank", "itau"))
 
 
-@app.route("/results", methods=["GET"]) 
-@login_required
-def results():
-    base_itau = BASE_DIR / "outputs" / "Itau" / "web"
-    base_sant = BASE_DIR / "outputs" / "Santander" / "web"
-    base_indisa = BASE_DIR / "outputs" / "Indisa" / "web"
-    base_itau.mkdir(parents=True, exist_ok=True)
-    base_sant.mkdir(parents=True, exist_ok=True)
-    base_indisa.mkdir(parents=True, exist_ok=True)
-
-    # Buscar archivos recientes Itau
-    excels_itau = sorted(base_itau.glob("Itau_results_UNIFIED_*.xlsx"), key=lambda p: p.stat().st_mtime, reverse=True)
-    items_itau = []
-    for x in excels_itau[:20]:
-        ts = x.stem.replace("Itau_results_UNIFIED_", "")
-        debug = base_itau / f"Itau_debug_unified_{ts}.txt"
-        items_itau.append({
+def list_recent_results(base: Path, bank_dir: str, limit: int = 20):
+    """
+    Últimos Excel web de un banco con su debug, en una sola pasada de os.scandir:
+    el mtime sale del stat de cada DirEntry y el debug se busca por nombre.
+    """
+    prefix = f"{bank_dir}_results_UNIFIED_"
+    with os.scandir(base) as it:
+        names = set()
+        excels = []
+        for e in it:
+            names.add(e.name)
+            if e.name.startswith(prefix) and e.name.endswith(".xlsx"):
+                excels.append((e.stat().st_mtime, e.name))
+    excels.sort(reverse=True)
+    items = []
+    for mtime, name in excels[:limit]:
+        ts = name[len(prefix):-len(".xlsx")]
+        debug = f"{bank_dir}_debug_unified_{ts}.txt"
+        items.append({
             "ts": ts,
-            "excel": x.name,
-            "debug": debug.name if debug.exists() else None,
-            "mtime": datetime.fromtimestamp(x.stat().st_mtime).strftime("%d-%m-%Y %H:%M")
+            "excel": name,
+            "debug": debug if debug in names else None,
+            "mtime": datetime.fromtimestamp(mtime).strftime("%d-%m-%Y %H:%M")
         })
+    return items
 
-    # Buscar archivos recientes Santander
-    excels_sant = sorted(base_sant.glob("Santander_results_UNIFIED_*.xlsx"), key=lambda p: p.stat().st_mtime, reverse=True)
-    items_sant = []
-    for x in excels_sant[:20]:
-        ts = x.stem.replace("Santander_results_UNIFIED_", "")
-        debug = base_sant / f"Santander_debug_unified_{ts}.txt"
-        items_sant.append({
-            "ts": ts,
-            "excel": x.name,
-            "debug": debug.name if debug.exists() else None,
-            "mtime": datetime.fromtimestamp(x.stat().st_mtime).strftime("%d-%m-%Y %H:%M")
-        })
 
-    # Buscar archivos recientes Indisa
-    excels_indisa = sorted(base_indisa.glob("Indisa_results_UNIFIED_*.xlsx"), key=lambda p: p.stat().st_mtime, reverse=True)
-    items_indisa = []
-    for x in excels_indisa[:20]:
-        ts = x.stem.replace("Indisa_results_UNIFIED_", "")
-        debug = base_indisa / f"Indisa_debug_unified_{ts}.txt"
-        items_indisa.append({
-            "ts": ts,
-            "excel": x.name,
-            "debug": debug.name if debug.exists() else None,
-            "mtime": datetime.fromtimestamp(x.stat().st_mtime).strftime("%d-%m-%Y %H:%M")
-        })
+@app.route("/results", methods=["GET"]) 
+@login_required
+def results():
+    job_id = request.args.get("job")
+    job_status = None
+    if job_id:
+        with JOBS_LOCK:
+            job = dict(JOBS.get(job_id) or {})
+        if not job or job.get("user") != session.get("user"):
+            flash("Trabajo no encontrado", "error")
+        elif job["status"] in ("queued", "running"):
+            job_status = job["status"]
+        else:
+            with JOBS_LOCK:
+                JOBS.pop(job_id, None)
+            if job["status"] == "done":
+                session["last_result_excel"] = job["excel"]
+                session["last_result_debug"] = job["debug"]
+                session["last_result_bank"] = job["bank"]
+                flash("Procesamiento completado. Descarga disponible abajo.", "info")
+            else:
+                flash(f"Error procesando PDFs: {job.get('error')}", "error")
+
+    items = {}
+    for bank, (_, bank_dir) in BANK_PROCESSORS.items():
+        base = BASE_DIR / "outputs" / bank_dir / "web"
+        base.mkdir(parents=True, exist_ok=True)
+        items[bank] = list_recent_results(base, bank_dir)
 
     last_excel = session.pop("last_result_excel", None)
     last_debug = session.pop("last_result_debug", None)
@@ -180,12 +235,14 @@ def results():
     last_debug_name = Path(last_debug).name if last_debug else None
     return render_template(
         "results.html",
-        items_itau=items_itau,
-        items_santander=items_sant,
-        items_indisa=items_indisa,
+        items_itau=items["itau"],
+        items_santander=items["santander"],
+        items_indisa=items["indisa"],
         last_excel=last_excel_name,
         last_debug=last_debug_name,
         last_bank=last_bank,
+        job_id=job_id if job_status else None,
+        job_status=job_status,
     )
 
 